@@ -0,0 +1,155 @@
+"""
+Measure the overhead of pypedream itself on synthetic pipelines: building the graph, ordering it, writing scripts
+and the jobdb, and optionally the runner loop end to end.
+
+    python benchmarks/bench.py --shapes chain,fanout,grid --sizes 1000,10000
+    python benchmarks/bench.py --shapes grid --sizes 200 --run slurm --queue-delay 0.5 --interval 1
+
+--run slurm uses the stand-in slurm commands in tests/fakeslurm, which simulate queueing delay and runtime without
+running the scripts, so Slurmrunner throughput can be measured without a cluster. --run shell runs the jobs for
+real with Shellrunner.
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+repodir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repodir)
+
+from benchmarks.synthetic import shapes
+from pypedream.jobdb import JsonJobdb, SqliteJobdb
+from pypedream.profiling import profiler
+from pypedream.pypedreamstatus import PypedreamStatus
+from pypedream.runners.eventrunner import Eventrunner, LocalBackend
+from pypedream.runners.shellrunner import Shellrunner
+from pypedream.runners.slurmrunner import Slurmrunner
+
+__author__ = 'dankle'
+
+fakeslurm_bin = os.path.join(repodir, "tests", "fakeslurm")
+
+
+def timed(results, name, f, *args):
+    start = time.time()
+    ret = f(*args)
+    results[name] = round(time.time() - start, 4)
+    return ret
+
+
+def bench_driver(shape, n_jobs):
+    """
+    Time the phases that run before any job starts
+    :rtype: dict
+    """
+    outdir = tempfile.mkdtemp(prefix="pypedream-bench-")
+    try:
+        results = {}
+        p = timed(results, 'construct', shapes[shape], outdir, n_jobs)
+        results['jobs'] = len(p.graph)
+        results['maxrss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        timed(results, 'add_edges', p._add_edges)
+
+        p._invalidate_order()
+        timed(results, 'order', p._get_ordered_jobs)
+        timed(results, 'write_scripts', p._write_scripts)
+
+        jobdbs = [('json', JsonJobdb(outdir + "/jobs.json")), ('sqlite', SqliteJobdb(outdir + "/jobs.sqlite"))]
+        for name, jobdb in jobdbs:
+            timed(results, 'jobdb_{}_first'.format(name), jobdb.update, p._get_jobdb_dict())
+            p._get_ordered_jobs()[0].status = PypedreamStatus.RUNNING
+            timed(results, 'jobdb_{}_change'.format(name), jobdb.update, p._get_jobdb_dict())
+            p._get_ordered_jobs()[0].status = PypedreamStatus.PENDING
+        return results
+    finally:
+        shutil.rmtree(outdir)
+
+
+def get_runner(args):
+    if args.run == "shell":
+        return Shellrunner(threads=args.threads)
+    elif args.run == "event":
+        return Eventrunner(LocalBackend(threads=args.threads))
+    else:
+        return Slurmrunner(interval=args.interval, job_arrays=args.job_arrays)
+
+
+def bench_run(shape, n_jobs, args):
+    """
+    Run a pipeline end to end and time it. The driver breakdown comes from the profiler.
+    :rtype: dict
+    """
+    outdir = tempfile.mkdtemp(prefix="pypedream-bench-")
+    old_env = dict(os.environ)
+    try:
+        if args.run == "slurm":
+            os.environ["PATH"] = fakeslurm_bin + os.pathsep + os.environ["PATH"]
+            os.environ["FAKESLURM_DIR"] = outdir + "/fakeslurm"
+            os.makedirs(os.environ["FAKESLURM_DIR"])
+            os.environ["FAKESLURM_QUEUE_DELAY"] = str(args.queue_delay)
+            os.environ["FAKESLURM_RUNTIME"] = str(args.runtime)
+
+        profiler.reset()
+        p = shapes[shape](outdir, n_jobs, runner=get_runner(args), jobdb=outdir + "/jobs.json", profile=True)
+        start = time.time()
+        p.start()
+        p.join()
+        wall = time.time() - start
+
+        with open(outdir + "/.pypedream/profile.json") as f:
+            profile = json.load(f)
+        results = {'run_exitcode': p.exitcode,
+                   'run_wall': round(wall, 3),
+                   'run_jobs_per_second': round(len(p.graph) / wall, 2)}
+        for name, t in profile['timers'].items():
+            results['run.' + name] = round(t['total'], 4)
+        for name, value in profile['counters'].items():
+            results['run.' + name] = value
+        return results
+    finally:
+        profiler.disable()
+        profiler.reset()
+        os.environ.clear()
+        os.environ.update(old_env)
+        shutil.rmtree(outdir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shapes", default="chain,fanout,grid", help="comma separated: " + ",".join(sorted(shapes)))
+    parser.add_argument("--sizes", default="1000,10000", help="comma separated numbers of jobs")
+    parser.add_argument("--run", choices=["none", "shell", "event", "slurm"], default="none",
+                        help="also run the pipelines end to end with this runner")
+    parser.add_argument("--threads", type=int, default=4, help="cores for the shell and event runners")
+    parser.add_argument("--interval", type=float, default=1, help="poll interval of the slurm runner")
+    parser.add_argument("--job-arrays", action="store_true", help="submit sibling jobs as slurm job arrays")
+    parser.add_argument("--queue-delay", type=float, default=0, help="seconds a fake slurm job waits in the queue")
+    parser.add_argument("--runtime", type=float, default=0, help="seconds a fake slurm job runs")
+    parser.add_argument("--output", help="also write the results as json to this file")
+    args = parser.parse_args()
+
+    all_results = []
+    for shape in args.shapes.split(","):
+        for n_jobs in [int(n) for n in args.sizes.split(",")]:
+            results = {'shape': shape, 'size': n_jobs}
+            results.update(bench_driver(shape, n_jobs))
+            if args.run != "none":
+                results.update(bench_run(shape, n_jobs, args))
+            all_results.append(results)
+
+            print("{} {}".format(shape, n_jobs))
+            for key in sorted(results):
+                if key not in ['shape', 'size']:
+                    print("  {:<40} {}".format(key, results[key]))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(all_results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
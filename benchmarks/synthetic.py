@@ -0,0 +1,90 @@
+"""
+Synthetic pipelines of a given shape and size, made of the tools in pypedream/tools/unix.py.
+
+* chain: urandom -> cat -> cat -> ... -> cat
+* fanout: urandom -> n x cat -> merge cats of at most 100 files -> one final cat
+* grid: per sample urandom -> k x cat, and per step a cat over all samples in groups of at most 100
+"""
+import math
+
+from pypedream.pipeline.pypedreampipeline import PypedreamPipeline
+from pypedream.tools.unix import Cat, Urandom
+
+__author__ = 'dankle'
+
+# max number of inputs of one cat, so that the command lines stay short
+max_fan_in = 100
+
+
+def urandom(outdir, name):
+    job = Urandom()
+    job.output = "{}/{}".format(outdir, name)
+    job.jobname = "urandom-" + name
+    return job
+
+
+def cat(outdir, name, inputs):
+    job = Cat()
+    job.input = inputs
+    job.output = "{}/{}".format(outdir, name)
+    job.jobname = "cat-" + name
+    return job
+
+
+def merge(pipeline, outdir, name, files):
+    """
+    Add cats that merge files in groups of max_fan_in, until one file is left
+    :return: the merged file
+    """
+    level = 0
+    while len(files) > 1:
+        merged = []
+        for i in range(0, len(files), max_fan_in):
+            job = cat(outdir, "{}-merge{}-{}".format(name, level, i // max_fan_in), files[i:i + max_fan_in])
+            pipeline.add(job)
+            merged.append(job.output)
+        files = merged
+        level += 1
+    return files[0]
+
+
+class ChainPipeline(PypedreamPipeline):
+    def __init__(self, outdir, n_jobs, **kwargs):
+        PypedreamPipeline.__init__(self, outdir, **kwargs)
+        job = urandom(outdir, "chain0")
+        self.add(job)
+        for i in range(1, n_jobs):
+            job = cat(outdir, "chain{}".format(i), [job.output])
+            self.add(job)
+
+
+class FanoutPipeline(PypedreamPipeline):
+    def __init__(self, outdir, n_jobs, **kwargs):
+        PypedreamPipeline.__init__(self, outdir, **kwargs)
+        root = urandom(outdir, "root")
+        self.add(root)
+        leaves = []
+        for i in range(max(1, n_jobs - 2 - n_jobs // max_fan_in)):
+            leaf = cat(outdir, "leaf{}".format(i), [root.output])
+            self.add(leaf)
+            leaves.append(leaf.output)
+        merge(self, outdir, "leaves", leaves)
+
+
+class GridPipeline(PypedreamPipeline):
+    def __init__(self, outdir, n_jobs, steps=10, **kwargs):
+        PypedreamPipeline.__init__(self, outdir, **kwargs)
+        n_samples = max(1, int(math.ceil(float(n_jobs) / (steps + 1))))
+        by_step = [[] for _ in range(steps)]
+        for sample in range(n_samples):
+            job = urandom(outdir, "s{}".format(sample))
+            self.add(job)
+            for step in range(steps):
+                job = cat(outdir, "s{}-step{}".format(sample, step), [job.output])
+                self.add(job)
+                by_step[step].append(job.output)
+        for step, files in enumerate(by_step):
+            merge(self, outdir, "step{}".format(step), files)
+
+
+shapes = {'chain': ChainPipeline, 'fanout': FanoutPipeline, 'grid': GridPipeline}
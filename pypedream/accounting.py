@@ -0,0 +1,96 @@
+"""
+Run a command and record the resources it used.
+
+    python accounting.py <stats.json> <command> [args...]
+
+The job scripts written by Job.write_script() run themselves through this wrapper, so the numbers are collected
+the same way by every runner. The stats file gets wall time, user and system CPU time and max RSS of the command
+and everything it waited for, from wait4(), and the bytes it read from and wrote to storage, from /proc/self/io
+(Linux only). The wrapper exits with the exit code of the command.
+
+This file is run by path on the nodes that run the jobs, so it only uses the standard library.
+"""
+import errno
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+__author__ = 'dankle'
+
+
+def read_proc_io():
+    """
+    Get the storage bytes read and written by this process and the children it has reaped, or None if
+    /proc/self/io can't be read
+    :rtype: dict[str, int]
+    """
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines())
+        return {'read_bytes': int(fields['read_bytes']), 'write_bytes': int(fields['write_bytes'])}
+    except (IOError, KeyError, ValueError):
+        return None
+
+
+def run(stats_file, cmd):
+    """
+    Run a command and write its resource usage to a json file
+    :return: the exit code of the command, 128 + the signal number if it was killed
+    """
+    io_before = read_proc_io()
+    start = time.time()
+    proc = subprocess.Popen(cmd)
+
+    # pass on signals sent to the wrapper only, the stats are written once the command has exited
+    def forward(signum, frame):
+        try:
+            os.kill(proc.pid, signum)
+        except OSError:
+            pass
+    for signum in [signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGUSR1, signal.SIGUSR2]:
+        signal.signal(signum, forward)
+
+    while True:
+        try:
+            _, status, rusage = os.wait4(proc.pid, 0)
+            break
+        except OSError as e:  # interrupted by a forwarded signal
+            if e.errno != errno.EINTR:
+                raise
+    walltime = time.time() - start
+    io_after = read_proc_io()
+
+    if os.WIFSIGNALED(status):
+        returncode = 128 + os.WTERMSIG(status)
+    else:
+        returncode = os.WEXITSTATUS(status)
+
+    stats = {'walltime': round(walltime, 3),
+             'user': round(rusage.ru_utime, 3),
+             'sys': round(rusage.ru_stime, 3),
+             'maxrss_kb': rusage.ru_maxrss,
+             'read_bytes': None,
+             'write_bytes': None,
+             'returncode': returncode}
+    if io_before and io_after:
+        stats['read_bytes'] = io_after['read_bytes'] - io_before['read_bytes']
+        stats['write_bytes'] = io_after['write_bytes'] - io_before['write_bytes']
+
+    tmp = "{}.{}.tmp".format(stats_file, os.getpid())
+    try:
+        with open(tmp, 'w') as f:
+            json.dump(stats, f)
+        os.rename(tmp, stats_file)
+    except (IOError, OSError) as e:
+        sys.stderr.write("pypedream: could not write resource usage to {}: {}\n".format(stats_file, e))
+    return returncode
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.stderr.write(__doc__)
+        sys.exit(2)
+    sys.exit(run(sys.argv[1], sys.argv[2:]))
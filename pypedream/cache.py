@@ -0,0 +1,153 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+from pypedream.checksum import file_digest
+
+logger = logging.getLogger(__name__)
+
+__author__ = 'dankle'
+
+
+def copy_file(src, dst):
+    """
+    Copy src to dst through a temporary file next to dst, so that dst is either the old or the whole new file. An
+    existing dst is replaced. The copy never shares an inode with src, so writing to one can't change the other.
+    """
+    tmp = "{}.tmp.{}".format(dst, os.getpid())
+    shutil.copy2(src, tmp)
+    os.rename(tmp, dst)
+
+
+class ResultCache(object):
+    """
+    Stores the outputs of completed jobs under a key made from the tool class, the command with input and output
+    paths normalized, and the contents of the inputs. A job with the same key, in another run or another output
+    directory, can then take its outputs from the cache instead of running.
+
+    Each entry is a directory <cachedir>/<key>/ with copies of the outputs stored as 0, 1, ... and an entry.json.
+    Outputs are copied in and out of the cache, so that a tool writing to an output later can't change an entry.
+    The mtime of
+    entry.json is the last time the entry was used, and the least recently used entries are evicted when the cache
+    grows over max_size bytes.
+
+    Tools whose results depend on the names of their inputs, and not only on their contents, should not be cached.
+    """
+
+    def __init__(self, cachedir, max_size=None, digest=file_digest):
+        """
+        :param cachedir: directory to keep the cache in
+        :param max_size: max total size of the cached outputs in bytes, or None for no limit
+        :param digest: function that gives the content digest of a file
+        """
+        self.cachedir = cachedir
+        self.max_size = max_size
+        self.digest = digest
+        if not os.path.isdir(cachedir):
+            os.makedirs(cachedir)
+
+    def key(self, job):
+        """
+        Get the cache key of a job
+        :type job: Job
+        :return: the key, or None if the job has no outputs or an input is not a regular file, such as a missing file
+        or a directory
+        """
+        inputs = sorted(set(filter(None, job.get_inputs())))
+        outputs = job.get_outputs()
+        if not outputs or not all(os.path.isfile(f) for f in inputs):
+            return None
+
+        digests = dict((f, self.digest(f)) for f in inputs)
+        placeholders = dict((f, "{{input:{}}}".format(digests[f])) for f in inputs)
+        for idx, fname in enumerate(outputs):
+            placeholders[fname] = "{{output{}}}".format(idx)
+
+        # replace longer paths first, so that a path that is a prefix of another doesn't break the longer one
+        command = job.command()
+        for fname in sorted(placeholders, key=len, reverse=True):
+            command = command.replace(fname, placeholders[fname])
+
+        h = hashlib.sha256()
+        h.update("{}.{}\n".format(job.__class__.__module__, job.__class__.__name__))
+        if isinstance(command, unicode):
+            command = command.encode('utf-8')
+        h.update(command + "\n")
+        for fname in inputs:
+            h.update(digests[fname] + "\n")
+        return h.hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.cachedir, key)
+
+    def restore(self, job, key):
+        """
+        Copy the cached outputs of a key into place
+        :return: True if the key was in the cache
+        """
+        entry = self._entry(key)
+        if not os.path.exists(os.path.join(entry, "entry.json")):
+            return False
+
+        for idx, fname in enumerate(job.get_outputs()):
+            odir = os.path.dirname(fname)
+            if odir and not os.path.isdir(odir):
+                os.makedirs(odir)
+            copy_file(os.path.join(entry, str(idx)), fname)
+        os.utime(os.path.join(entry, "entry.json"), None)
+        logger.info("Took outputs of {} from cache entry {}".format(job.get_name(), key))
+        return True
+
+    def store(self, job, key):
+        """
+        Add the outputs of a completed job to the cache, and evict old entries if the cache is too large. Only jobs
+        whose outputs are all regular files are stored.
+        """
+        entry = self._entry(key)
+        outputs = job.get_outputs()
+        if os.path.exists(entry) or not all(os.path.isfile(f) for f in outputs):
+            return
+
+        tmp = tempfile.mkdtemp(dir=self.cachedir, prefix=".tmp.")
+        size = 0
+        for idx, fname in enumerate(outputs):
+            copy_file(fname, os.path.join(tmp, str(idx)))
+            size += os.path.getsize(fname)
+        with open(os.path.join(tmp, "entry.json"), 'w') as f:
+            json.dump({'job': job.get_name(), 'size': size}, f)
+
+        try:
+            os.rename(tmp, entry)
+        except OSError:  # another pipeline stored the same key first
+            shutil.rmtree(tmp)
+            return
+        logger.debug("Stored outputs of {} in cache entry {}".format(job.get_name(), key))
+        self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits in max_size
+        """
+        if self.max_size is None:
+            return
+
+        entries = []
+        total = 0
+        for key in os.listdir(self.cachedir):
+            meta = os.path.join(self.cachedir, key, "entry.json")
+            if key.startswith(".") or not os.path.exists(meta):
+                continue
+            with open(meta) as f:
+                size = json.load(f)['size']
+            entries.append((os.path.getmtime(meta), size, key))
+            total += size
+
+        for mtime, size, key in sorted(entries):
+            if total <= self.max_size:
+                break
+            logger.debug("Evicting cache entry {}".format(key))
+            shutil.rmtree(self._entry(key))
+            total -= size
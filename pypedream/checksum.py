@@ -0,0 +1,120 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from multiprocessing.pool import ThreadPool
+
+from pypedream.jobdb import write_json_atomically
+
+logger = logging.getLogger(__name__)
+
+__author__ = 'dankle'
+
+
+def file_digest(path, blocksize=8 * 1024 * 1024):
+    """
+    Get the sha256 hex digest of the contents of a file. hashlib releases the GIL while hashing large blocks, so
+    several files can be hashed at once in threads.
+    """
+    h = hashlib.sha256()
+    with open(path, 'rb', 0) as f:
+        block = f.read(blocksize)
+        while block:
+            h.update(block)
+            block = f.read(blocksize)
+    return h.hexdigest()
+
+
+def stat_key(path):
+    """
+    Get what identifies a version of a file without reading it: device, inode, size and mtime
+    """
+    st = os.stat(path)
+    return [st.st_dev, st.st_ino, st.st_size, st.st_mtime]
+
+
+class ChecksumIndex(object):
+    """
+    Gives the sha256 of files, hashing each version of a file only once. Digests are kept in a json index by path,
+    together with the device, inode, size and mtime of the file they were computed for. A file whose stat still
+    matches is not read again, also in later runs when the index is saved to a path.
+    """
+
+    def __init__(self, path=None, threads=4):
+        """
+        :param path: json file to load the index from and save it to, or None to keep it in memory
+        :param threads: number of files to hash at once
+        """
+        self.path = path
+        self.threads = threads
+        self.hashed = 0  # number of files read, for tests and logging
+        self._index = {}  # abspath -> {'stat': stat_key(), 'sha256': digest}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self._index = json.load(f)
+            except ValueError:
+                logger.warning("Ignoring unreadable checksum index {}".format(path))
+
+    def _lookup(self, path):
+        entry = self._index.get(os.path.abspath(path))
+        if entry and entry['stat'] == stat_key(path):
+            return entry['sha256']
+        return None
+
+    def _hash(self, path):
+        key = stat_key(path)
+        digest = file_digest(path)
+        with self._lock:
+            self._index[os.path.abspath(path)] = {'stat': key, 'sha256': digest}
+            self.hashed += 1
+        return digest
+
+    def digest(self, path):
+        """
+        Get the sha256 hex digest of a file, from the index if the file has not changed
+        """
+        return self._lookup(path) or self._hash(path)
+
+    def digests(self, paths):
+        """
+        Get the digests of several files, hashing the ones that are not in the index in parallel
+        :rtype: dict[str, str]
+        """
+        paths = list(set(paths))
+        result = {}
+        missing = []
+        for path in paths:
+            digest = self._lookup(path)
+            if digest:
+                result[path] = digest
+            else:
+                missing.append(path)
+
+        if len(missing) > 1 and self.threads > 1:
+            pool = ThreadPool(min(self.threads, len(missing)))
+            try:
+                result.update(zip(missing, pool.map(self._hash, missing)))
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            result.update((path, self._hash(path)) for path in missing)
+        if missing:
+            logger.debug("Hashed {} of {} files".format(len(missing), len(paths)))
+        return result
+
+    def save(self):
+        """
+        Write the index to its path, leaving out files that no longer exist
+        """
+        if not self.path:
+            return
+        with self._lock:
+            index = dict((path, entry) for path, entry in self._index.items() if os.path.exists(path))
+        odir = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.isdir(odir):
+            os.makedirs(odir)
+        write_json_atomically(index, self.path)
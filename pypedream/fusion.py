@@ -0,0 +1,313 @@
+import logging
+import os
+
+from pypedream.job import Job
+from pypedream.pypedreamstatus import PypedreamStatus
+
+logger = logging.getLogger(__name__)
+
+__author__ = 'dankle'
+
+
+def resource_key(job):
+    """
+    Jobs can be fused if they request the same cores, memory and local disk
+    """
+    return job.threads, job.memory, job.disk
+
+
+def find_chains(pipeline, jobs):
+    """
+    Find linear chains among the jobs to run: each job in a chain is the only consumer of the outputs of the job
+    before it, and has no other dependency that will run. All jobs in a chain are fusable and have the same resource
+    requests.
+    :param jobs: the jobs to run, in topological order
+    :return: chains of two or more jobs, in topological order
+    :rtype: list[list[Job]]
+    """
+    jobs_to_run = set(jobs)
+
+    def next_in_chain(job):
+        consumers = set(c for fname in job.get_outputs() for c in pipeline._get_nodes_with_input(fname))
+        if len(consumers) != 1:
+            return None
+        consumer = consumers.pop()
+        if consumer not in jobs_to_run or not consumer.fusable or resource_key(consumer) != resource_key(job):
+            return None
+        if [j for j in pipeline._get_dependencies(consumer) if j in jobs_to_run] != [job]:
+            return None
+        return consumer
+
+    chains = []
+    in_chain = set()
+    for job in jobs:
+        if job in in_chain or not job.fusable:
+            continue
+        chain = [job]
+        consumer = next_in_chain(job)
+        while consumer is not None:
+            chain.append(consumer)
+            consumer = next_in_chain(consumer)
+        if len(chain) > 1:
+            chains.append(chain)
+            in_chain.update(chain)
+    return chains
+
+
+def find_stream_groups(pipeline, jobs, streams):
+    """
+    Find the groups of jobs to run that are connected by streamed files. Streams with a producer or consumer that
+    doesn't run are ignored, the file is then written to disk as usual.
+    :param jobs: the jobs to run, in topological order
+    :param streams: streamed files, each with one producer and one consumer
+    :return: groups of two or more jobs, in topological order
+    :rtype: list[list[Job]]
+    """
+    jobs_to_run = set(jobs)
+    groups = {}  # job -> set of the jobs in its group
+    for fname in streams:
+        producer = pipeline._get_nodes_with_output(fname)[0]
+        consumer = pipeline._get_nodes_with_input(fname)[0]
+        if producer not in jobs_to_run or consumer not in jobs_to_run:
+            continue
+        group = groups.get(producer, set([producer])) | groups.get(consumer, set([consumer]))
+        for job in group:
+            groups[job] = group
+
+    result = []
+    for job in jobs:
+        group = groups.get(job)
+        if group is not None and job is min(group, key=pipeline._get_job_index):
+            result.append(sorted(group, key=pipeline._get_job_index))
+    return result
+
+
+class FusedJob(Job):
+    """
+    A chain of jobs that is scheduled as one job. Its script runs the scripts of the members one after the other,
+    each with its own log, and writes the done or fail files of each member as it finishes, so a fused job that
+    fails half way leaves the members before it completed. The job id, start and end time, status and retry attempts
+    of the fused job are passed on to the members, so they show up in the jobdb as usual. Completed and failed are
+    not passed on, since not every member of a failed chain failed: complete() and fail() set those per member.
+    """
+    accounting = False  # the scripts of the members are accounted one by one
+    propagated = ['jobid', 'starttime', 'endtime', 'status', 'attempts']
+
+    def __init__(self, members):
+        """
+        :param members: jobs in a chain, see find_chains()
+        :type members: list[Job]
+        """
+        Job.__init__(self)
+        self.members = members
+        internal = set(f for job in members for f in job.get_outputs())
+        self.input = [f for job in members for f in filter(None, job.get_inputs()) if f not in internal]
+        for idx, fname in enumerate(f for job in members for f in job.get_outputs()):
+            setattr(self, "output_{}".format(idx), fname)
+
+        names = [job.get_name() for job in members]
+        self.jobname = "+".join(names) if len(names) <= 3 else "{}+..+{}".format(names[0], names[-1])
+        self.threads, self.memory, self.disk = resource_key(members[0])
+        walltimes = [walltime_seconds(job.walltime) for job in members]
+        if None not in walltimes:
+            self.walltime = format_walltime(sum(walltimes))
+        self.log = members[-1].log + ".fused"
+        self.retry_policy = members[0].retry_policy
+
+    def __setattr__(self, name, value):
+        Job.__setattr__(self, name, value)
+        # the members don't exist yet while the class defaults are set up in __init__
+        if name in self.propagated and 'members' in self.__dict__:
+            finished = [PypedreamStatus.COMPLETED, PypedreamStatus.FAILED]
+            if name == 'status' and value in finished:
+                return
+            for job in self.members:
+                if name != 'status' or job.status not in finished:
+                    setattr(job, name, value)
+
+    def command(self):
+        return "\n".join(job.command() for job in self.members)
+
+    def write_script(self, script_dir, pipeline):
+        for job in self.members:
+            job.write_script(script_dir, pipeline)
+
+        logging.debug("Writing script for fused task " + self.get_name())
+        self.script = self.get_script_path(script_dir, pipeline)
+        with open(self.script, 'w') as f:
+            f.write("#!/usr/bin/env bash\n")
+            f.write("# fused job: {}\n".format(", ".join(job.get_name() for job in self.members)))
+            f.write("\n")
+            for job in self.members:
+                f.write(self.member_bash(job) + "\n")
+
+    @staticmethod
+    def member_bash(job):
+        """
+        Get the lines that run one member, unless it is already done, and write its done or fail files
+        """
+        name = job.get_name()
+        return "\n".join([
+            "if [ ! -f {} ]; then".format(job.donefiles()[0]),
+            '  echo "### {} started $(date)"'.format(name),
+            "  bash {} > {} 2>&1".format(job.script, job.log),
+            "  rc=$?",
+            "  if [ $rc -ne 0 ]; then",
+            "    rm -f {}".format(" ".join(job.donefiles())),
+            "    touch {}".format(" ".join(job.failfiles())),
+            '    echo "### {} failed with exit code $rc"'.format(name),
+            "    exit $rc",
+            "  fi",
+            "  rm -f {}".format(" ".join(job.failfiles())),
+            "  touch {}".format(" ".join(job.donefiles())),
+            '  echo "### {} completed $(date)"'.format(name),
+            "fi"])
+
+    def complete(self):
+        for job in self.members:
+            if job.status != PypedreamStatus.COMPLETED:
+                job.complete()
+        self.status = PypedreamStatus.COMPLETED
+
+    def fail(self):
+        """
+        Complete the members that finished before the failure, fail the one that failed and cancel the rest
+        """
+        for job in self.members:
+            if job.status in [PypedreamStatus.COMPLETED, PypedreamStatus.FAILED]:
+                continue
+            if job.all_donefiles_exists():
+                job.complete()
+            elif any(os.path.exists(f) for f in job.failfiles()):
+                job.fail()
+            else:
+                job.status = PypedreamStatus.CANCELLED
+        self.status = PypedreamStatus.FAILED
+
+    def load_resources(self):
+        self.resources = None
+
+
+class StreamJob(FusedJob):
+    """
+    Jobs connected by streamed files, scheduled as one job. The streamed files are replaced by named pipes and all
+    members run at the same time, so a consumer starts reading while its producer is writing and the file never
+    reaches the disk. The members only get their done files if all of them succeed, since a consumer that finishes
+    after its producer failed has read a truncated stream, and the output of a producer is gone once it has been
+    read. Members that fail get their fail files, the others get neither.
+    """
+    fusable = False
+
+    def __init__(self, members, streams):
+        """
+        :param members: jobs connected by streams, see find_stream_groups()
+        :param streams: the streamed files between the members
+        """
+        FusedJob.__init__(self, members)
+        self.streams = streams
+        self.threads = sum(job.threads for job in members)
+        if None not in [job.memory for job in members]:
+            self.memory = sum(job.memory for job in members)
+        if None not in [job.disk for job in members]:
+            self.disk = sum(job.disk for job in members)
+        walltimes = [walltime_seconds(job.walltime) for job in members]
+        if None not in walltimes:
+            self.walltime = format_walltime(max(walltimes))
+        self.log = members[-1].log + ".streamed"
+        for job in members:
+            job.stage = False  # the staged copy of a named pipe would be a regular file
+
+    def write_script(self, script_dir, pipeline):
+        for job in self.members:
+            job.write_script(script_dir, pipeline)
+
+        logging.debug("Writing script for streamed task " + self.get_name())
+        self.script = self.get_script_path(script_dir, pipeline)
+        s = ["#!/usr/bin/env bash",
+             "# streamed job: {}".format(", ".join(job.get_name() for job in self.members)),
+             ""]
+        for fname in self.streams:
+            s.append("mkdir -p {}".format(os.path.dirname(fname)))
+            s.append("rm -f {0}".format(fname))
+            s.append("mkfifo {}".format(fname))
+        s.append("")
+
+        for idx, job in enumerate(self.members):
+            s.append('echo "### {} started $(date)"'.format(job.get_name()))
+            s.append("bash {} > {} 2>&1 &".format(job.script, job.log))
+            s.append("pid_{}=$!".format(idx))
+        s.append("")
+
+        # while any member runs, open and close the pipes of the members that have exited, for reading and writing,
+        # which doesn't block. A member at the other end that opens a pipe after it has exited then gets an end of
+        # file or a broken pipe instead of waiting forever.
+        running = " || ".join("kill -0 $pid_{} 2>/dev/null".format(idx) for idx in range(len(self.members)))
+        s.append("while {}; do".format(running))
+        for idx, job in enumerate(self.members):
+            pipes = [f for f in self.streams if f in job.get_inputs() or f in job.get_outputs()]
+            s.append("  if ! kill -0 $pid_{} 2>/dev/null; then".format(idx))
+            for fname in pipes:
+                s.append("    [ -p {0} ] && : <> {0}".format(fname))
+            s.append("  fi")
+        s.append("  sleep 0.1")
+        s.append("done")
+        for idx in range(len(self.members)):
+            s.append("wait $pid_{0}; rc_{0}=$?".format(idx))
+        s.append("")
+
+        for fname in self.streams:
+            idx = self.members.index(pipeline._get_nodes_with_output(fname)[0])
+            s.append("if [ ! -p {} ]; then".format(fname))
+            s.append('  echo "### {} was replaced by a regular file, it can not be streamed"'.format(fname))
+            s.append("  [ $rc_{0} -eq 0 ] && rc_{0}=1".format(idx))
+            s.append("fi")
+            s.append("rm -f {}".format(fname))
+
+        s.append("rc=0")
+        for idx, job in enumerate(self.members):
+            s.append("if [ $rc_{} -ne 0 ]; then".format(idx))
+            s.append("  rm -f {}".format(" ".join(job.donefiles())))
+            s.append("  touch {}".format(" ".join(job.failfiles())))
+            s.append('  echo "### {0} failed with exit code $rc_{1}"'.format(job.get_name(), idx))
+            s.append("  [ $rc -eq 0 ] && rc=$rc_{}".format(idx))
+            s.append("fi")
+        s.append("[ $rc -ne 0 ] && exit $rc")
+        for job in self.members:
+            s.append("rm -f {}".format(" ".join(job.failfiles())))
+            s.append("touch {}".format(" ".join(job.donefiles())))
+        s.append('echo "### all completed $(date)"')
+        with open(self.script, 'w') as f:
+            f.write("\n".join(s) + "\n")
+
+
+def walltime_seconds(walltime):
+    """
+    Get the seconds of a slurm walltime, or None. All formats of sbatch -t are understood: "minutes",
+    "minutes:seconds", "hours:minutes:seconds", "days-hours", "days-hours:minutes" and "days-hours:minutes:seconds".
+    :raises ValueError: for other formats, such as "infinite"
+    """
+    if not walltime:
+        return None
+    try:
+        if "-" in walltime:
+            days, rest = walltime.split("-")
+            parts = [int(days)] + [int(part) for part in rest.split(":")]
+            if len(parts) > 4:
+                raise ValueError
+            # days-hours[:minutes[:seconds]]
+            parts += [0] * (4 - len(parts))
+            return ((parts[0] * 24 + parts[1]) * 60 + parts[2]) * 60 + parts[3]
+        parts = [int(part) for part in walltime.split(":")]
+        if len(parts) == 1:  # minutes
+            return parts[0] * 60
+        if len(parts) == 2:  # minutes:seconds
+            return parts[0] * 60 + parts[1]
+        if len(parts) == 3:  # hours:minutes:seconds
+            return (parts[0] * 60 + parts[1]) * 60 + parts[2]
+    except ValueError:
+        pass
+    raise ValueError("Unsupported walltime {!r}, see the --time option of sbatch".format(walltime))
+
+
+def format_walltime(seconds):
+    return "{}:{:02d}:{:02d}".format(seconds // 3600, seconds % 3600 // 60, seconds % 60)
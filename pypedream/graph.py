@@ -0,0 +1,134 @@
+import collections
+from array import array
+
+__author__ = 'dankle'
+
+
+class Graph(object):
+    """
+    A small directed multigraph for the pipeline DAG. Nodes get integer ids in the order they are added, and the
+    edges are kept as arrays of ids: one array of successors and one of predecessors per node, with edge attributes
+    only stored when given. This uses far less memory per node than a networkx graph, and keeps networkx out of
+    the import path. Use to_networkx() for anything else, like writing dot files.
+    """
+
+    def __init__(self):
+        self._nodes = []  # id -> node
+        self._ids = {}  # node -> id
+        self._succ = []  # id -> array of successor ids, one per edge
+        self._pred = []  # id -> array of predecessor ids, one per edge
+        self._edge_attrs = {}  # (source id, target id) -> list of attribute dicts of the parallel edges
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, node):
+        return node in self._ids
+
+    def __iter__(self):
+        return iter(self._nodes)
+
+    def number_of_nodes(self):
+        return len(self._nodes)
+
+    def number_of_edges(self):
+        return sum(len(s) for s in self._succ)
+
+    def add_node(self, node):
+        """
+        Add a node, if it isn't in the graph already
+        :return: the id of the node
+        """
+        nid = self._ids.get(node)
+        if nid is None:
+            nid = len(self._nodes)
+            self._ids[node] = nid
+            self._nodes.append(node)
+            self._succ.append(array('l'))
+            self._pred.append(array('l'))
+        return nid
+
+    def add_edge(self, source, target, **attrs):
+        """
+        Add an edge, adding the nodes if needed. Adding the same edge again gives a parallel edge.
+        """
+        s = self.add_node(source)
+        t = self.add_node(target)
+        self._succ[s].append(t)
+        self._pred[t].append(s)
+        if attrs:
+            self._edge_attrs.setdefault((s, t), []).append(attrs)
+
+    def add_edges_from(self, edges, **attrs):
+        for source, target in edges:
+            self.add_edge(source, target, **attrs)
+
+    def nodes(self):
+        return list(self._nodes)
+
+    def edges(self, data=False):
+        """
+        :return: list of (source, target), or (source, target, attrs) if data is True, with one item per edge
+        """
+        result = []
+        for s, succ in enumerate(self._succ):
+            seen = collections.defaultdict(int)  # target id -> number of parallel edges seen so far
+            for t in succ:
+                if data:
+                    attrs = self._edge_attrs.get((s, t), [])
+                    result.append((self._nodes[s], self._nodes[t],
+                                   dict(attrs[seen[t]]) if seen[t] < len(attrs) else {}))
+                    seen[t] += 1
+                else:
+                    result.append((self._nodes[s], self._nodes[t]))
+        return result
+
+    def successors(self, node):
+        return [self._nodes[t] for t in _uniq(self._succ[self._ids[node]])]
+
+    def predecessors(self, node):
+        return [self._nodes[s] for s in _uniq(self._pred[self._ids[node]])]
+
+    def topological_sort(self):
+        """
+        Sort the nodes so that every node comes after its predecessors. The order only depends on the order the
+        nodes and edges were added in, so it is the same on every run.
+        :raises ValueError: if the graph has a cycle
+        """
+        indegree = array('l', (len(p) for p in self._pred))
+        ready = collections.deque(nid for nid, n in enumerate(indegree) if n == 0)
+        order = []
+        while ready:
+            nid = ready.popleft()
+            order.append(self._nodes[nid])
+            for t in self._succ[nid]:
+                indegree[t] -= 1
+                if indegree[t] == 0:
+                    ready.append(t)
+        if len(order) != len(self._nodes):
+            raise ValueError("The graph has a cycle")
+        return order
+
+    def is_directed_acyclic_graph(self):
+        try:
+            self.topological_sort()
+            return True
+        except ValueError:
+            return False
+
+    def to_networkx(self):
+        """
+        Get a copy of the graph as a networkx MultiDiGraph. networkx is imported here, and is only needed when this
+        is called.
+        """
+        import networkx as nx
+        g = nx.MultiDiGraph()
+        g.add_nodes_from(self._nodes)
+        for source, target, attrs in self.edges(data=True):
+            g.add_edge(source, target, **attrs)
+        return g
+
+
+def _uniq(ids):
+    seen = set()
+    return [i for i in ids if not (i in seen or seen.add(i))]
@@ -1,14 +1,23 @@
+import collections
+import hashlib
+import json
 import logging
 import os
+import sys
 import uuid
 
 import datetime
 
+import pypedream.accounting
 from pypedream import constants
 from pypedream.pypedreamstatus import PypedreamStatus
 
 __author__ = 'dankle'
 
+# cached view of the input and output attributes of a job, see Job._get_ports()
+Ports = collections.namedtuple("Ports", ["input_dict", "output_dict", "inputs", "outputs",
+                                         "donefiles", "failfiles", "hash"])
+
 
 class Job(object):
     """ A abstract class of a tool
@@ -18,15 +27,73 @@ class Job(object):
     starttime = None
     endtime = None
     threads = 1
+    memory = None  # MB of memory the job needs, or None if unknown
+    walltime = None  # max run time as "[days-]hours:minutes:seconds", or None for the runner's default
+    disk = None  # MB of local scratch disk the job needs, or None if unknown
     scratch = "/tmp"
+    stage = None  # run on copies of the inputs and outputs in the scratch dir, None to follow the pipeline
+    stage_keep = 60  # minutes to keep staged copies that no job has used in the scratch dir
     log = None
     script = None
     is_intermediate = False
+    streamed = ()  # outputs that are streamed to their consumer through a named pipe, see PypedreamPipeline.stream()
+    accounting = True  # run the script through pypedream/accounting.py to record resource usage
+    fusable = True  # can be fused with the jobs before and after it in a chain, see pypedream.fusion
+    resources = None  # resource usage recorded by the last run, see accounting.run()
+    retry_policy = None  # when to submit the job again if it fails in slurm, None to follow the pipeline
+    attempts = None  # earlier attempts that failed and were retried, as dicts with jobid, state, starttime, endtime
     status = PypedreamStatus.PENDING
+    _ports = None
 
     def __init__(self):
         self.data = {}  # any additional data that the runner needs a job to keep track of
 
+    def __setattr__(self, name, value):
+        # assigning an input or output invalidates the cached ports
+        if name.startswith(constants.INPUT) or name.startswith(constants.OUTPUT):
+            object.__setattr__(self, '_ports', None)
+        object.__setattr__(self, name, value)
+
+    def _get_ports(self):
+        """
+        Get the inputs, outputs, done and fail files and hash of this job. They are computed once and cached until
+        an input or output attribute is assigned. Lists that are modified in place must be reassigned (or
+        _invalidate_ports() called) for the change to be picked up.
+        :rtype: Ports
+        """
+        if self._ports is None:
+            input_dict = {}
+            output_dict = {}
+            inputs = []
+            outputs = []
+            for varname in self.__dict__:
+                obj = self.__dict__[varname]  # can be a list or a string
+                if varname.startswith(constants.INPUT):
+                    input_dict[varname] = obj
+                    if obj.__class__.__name__ == "str":
+                        inputs.append(obj)
+                    elif obj.__class__.__name__ == "list":
+                        inputs += obj
+                elif varname.startswith(constants.OUTPUT):
+                    output_dict[varname] = obj
+                    outputs.append(obj)  # a output_nn cannot be a list
+
+            donefiles = []
+            failfiles = []
+            for fname in outputs:
+                odir = os.path.dirname(fname)
+                obase = os.path.basename(fname)
+                donefiles.append("{}/.{}.done".format(odir, obase))
+                failfiles.append("{}/.{}.fail".format(odir, obase))
+
+            # What makes a job unique is it's inputs and outputs, so hash a list of that.
+            self._ports = Ports(input_dict, output_dict, inputs, outputs, donefiles, failfiles,
+                                hash(str([inputs, outputs])))
+        return self._ports
+
+    def _invalidate_ports(self):
+        self._ports = None
+
     def command(self):
         raise NotImplementedError("Class %s doesn't implement run()" % self.__class__.__name__)
 
@@ -47,36 +114,35 @@ class Job(object):
         get a list of all input files for this job
         :return: list[str]
         """
-        inputs = []
-        for varname in self.__dict__:
-            if varname.startswith(constants.INPUT):
-                obj = self.__dict__[varname]  # can be a list or a string
-                if obj.__class__.__name__ == "str":
-                    inputs.append(obj)
-                elif obj.__class__.__name__ == "list":
-                    inputs += obj
-
-        return inputs
+        return list(self._get_ports().inputs)
 
     def get_outputs(self):
         """
         get a list of all output files for this job
         :return: list[str]
         """
-        outputs = []
-        for varname in self.__dict__:
-            if varname.startswith(constants.OUTPUT):
-                fname = self.__dict__[varname]  # type: str
-                outputs.append(fname)
+        return list(self._get_ports().outputs)
+
+    def get_input_dict(self):
+        """
+        get the input attributes of this job by name
+        :return: dict[str, str|list[str]]
+        """
+        return dict(self._get_ports().input_dict)
 
-        return outputs
+    def get_output_dict(self):
+        """
+        get the output attributes of this job by name
+        :return: dict[str, str]
+        """
+        return dict(self._get_ports().output_dict)
 
     def __hash__(self):
         """
         What makes a job unique is it's inputs and outputs, so hash a list of that.
         :return: hash of object
         """
-        return hash(str([self.get_inputs(), self.get_outputs()]))
+        return self._get_ports().hash
 
     def __str__(self):
         return self.get_name()
@@ -92,66 +158,132 @@ class Job(object):
         for f in files:
             touch(f)
 
+    def stats_file(self):
+        """
+        Get the file that the resource usage of the job is written to, next to the done files
+        """
+        fname = self.get_outputs()[0]
+        return "{}/.{}.stats.json".format(os.path.dirname(fname), os.path.basename(fname))
+
+    def load_resources(self):
+        """
+        Read the resource usage written by the job script, if any
+        """
+        try:
+            with open(self.stats_file()) as f:
+                self.resources = json.load(f)
+        except (IOError, ValueError):
+            self.resources = None
+
     def complete(self):
         self.status = PypedreamStatus.COMPLETED
+        self.load_resources()
         self.try_remove_files(self.failfiles())
-        self.touch_files(self.donefiles())
+        signature = json.dumps(self.signature())
+        for fname in self.donefiles():
+            with open(fname, 'w') as f:
+                f.write(signature)
 
     def fail(self):
         self.status = PypedreamStatus.FAILED
+        self.load_resources()
         self.try_remove_files(self.donefiles())
         self.touch_files(self.failfiles())
 
     def donefiles(self):
-        donefiles = []
-        for varname in self.__dict__:
-            if varname.startswith(constants.OUTPUT):
-                fname = self.__dict__[varname]  # a output_nn cannot be a list
-                odir = os.path.dirname(fname)
-                obase = os.path.basename(fname)
-                donefiles.append("{}/.{}.done".format(odir, obase))
-        return donefiles
+        return list(self._get_ports().donefiles)
 
     def failfiles(self):
-        failfiles = []
-        for varname in self.__dict__:
-            if varname.startswith(constants.OUTPUT):
-                fname = self.__dict__[varname]  # a output_nn cannot be a list
-                odir = os.path.dirname(fname)
-                obase = os.path.basename(fname)
-                failfiles.append("{}/.{}.fail".format(odir, obase))
-        return failfiles
+        return list(self._get_ports().failfiles)
 
     def all_donefiles_exists(self):
         return all([os.path.exists(f) for f in self.donefiles()])
 
-    def write_script(self, script_dir, pipeline):
-        logging.debug("Writing script for task " + self.get_name())
-        hashes = [hash(job) for job in pipeline._get_ordered_jobs()]
-        idx = hashes.index(hash(self))
+    def signature(self):
+        """
+        Get what the done files of this job record about how the outputs were made: a hash of the command and the
+        sizes of the outputs
+        :rtype: dict
+        """
+        command = self.command()
+        if isinstance(command, unicode):
+            command = command.encode('utf-8')
+        return {'command': hashlib.sha256(command).hexdigest(),
+                'sizes': dict((f, os.path.getsize(f)) for f in self.get_outputs() if os.path.exists(f))}
 
+    def is_stale(self):
+        """
+        Check if the outputs of a completed job are out of date: a done file or output is missing, an output changed
+        size, the command differs from the one that made the outputs, or an input is newer than the done files.
+        Missing outputs of intermediate jobs and streamed outputs are expected, the pipeline decides if they have to
+        be made again.
+        Done files written before signatures were recorded are empty, then the command is not checked.
+        :rtype: bool
+        """
+        donefiles = self.donefiles()
+        if not all(os.path.exists(f) for f in donefiles):
+            return True
+
+        with open(donefiles[0]) as f:
+            content = f.read()
+        recorded = json.loads(content) if content else {}
+        if 'command' in recorded and recorded['command'] != self.signature()['command']:
+            logging.debug("Command of {} has changed".format(self.get_name()))
+            return True
+
+        for fname in self.get_outputs():
+            if not os.path.exists(fname):
+                if not self.is_intermediate and fname not in self.streamed:
+                    return True
+            elif fname in recorded.get('sizes', {}) and recorded['sizes'][fname] != os.path.getsize(fname):
+                logging.debug("Output {} of {} has changed size".format(fname, self.get_name()))
+                return True
+
+        donetime = min(os.path.getmtime(f) for f in donefiles)
+        for fname in filter(None, self.get_inputs()):
+            if os.path.exists(fname) and os.path.getmtime(fname) > donetime:
+                logging.debug("Input {} of {} is newer than its outputs".format(fname, self.get_name()))
+                return True
+        return False
+
+    def get_script_path(self, script_dir, pipeline):
+        """
+        Get a new, unique path for the script of this job
+        """
+        idx = pipeline._get_job_index(self)
         logging.debug("Task index is " + str(idx))
-        self.script = "{dir}/{name}__{idx}__{uuid}.sh".format(dir=script_dir,
-                                                              name=self.get_name().replace("/", "_"),
-                                                              idx=idx,
-                                                              uuid=uuid.uuid4())
+        return "{dir}/{name}__{idx}__{uuid}.sh".format(dir=script_dir,
+                                                       name=self.get_name().replace("/", "_"),
+                                                       idx=idx,
+                                                       uuid=uuid.uuid4())
+
+    def write_script(self, script_dir, pipeline):
+        logging.debug("Writing script for task " + self.get_name())
+        self.script = self.get_script_path(script_dir, pipeline)
 
         f = open(self.script, 'w')
         f.write("#!/usr/bin/env bash\n")
+        if self.accounting:
+            self.try_remove_files([self.stats_file()])
+            f.write(self.accounting_bash() + "\n")
         f.write("set -eo pipefail\n")
         # f.write("set -eu\n")
         f.write("\n")
 
         # create directories for output files
-        for varname in self.__dict__:
-            if varname.startswith(constants.OUTPUT):
-                fname = self.__dict__[varname]  # a output_nn cannot be a list
-                odir = os.path.dirname(fname)
-                f.write("mkdir -p " + odir + "\n")
+        for fname in self.get_outputs():
+            odir = os.path.dirname(fname)
+            f.write("mkdir -p " + odir + "\n")
 
         f.write("\n")
-        f.write(self.command())
-        f.write("\n")
+        if self.stage:
+            f.write(self.stage_in_bash() + "\n")
+            f.write(self.staged_command())
+            f.write("\n")
+            f.write(self.stage_out_bash() + "\n")
+        else:
+            f.write(self.command())
+            f.write("\n")
         # f.write("OUT=$?\n")
         # f.write("\n")
         # f.write("if [ $OUT -eq 0 ];then\n")  # success
@@ -163,6 +295,85 @@ class Job(object):
         # f.write("exit $OUT\n")
         f.close()
 
+    def accounting_bash(self):
+        """
+        Get the lines that make the script run itself through the accounting wrapper, if the python that runs the
+        pipeline can be found where the script runs
+        """
+        wrapper = os.path.splitext(os.path.abspath(pypedream.accounting.__file__))[0] + ".py"
+        return "\n".join([
+            'if [ "$PYPEDREAM_ACCOUNTING" != "$0" ] && [ -x {} ] && [ -f {} ]; then'.format(sys.executable, wrapper),
+            '  export PYPEDREAM_ACCOUNTING="$0"',
+            '  exec {} {} {} bash "$0" "$@"'.format(sys.executable, wrapper, self.stats_file()),
+            'fi'])
+
+    def staged_path(self, fname):
+        """
+        Get the path of the copy of a file in the scratch dir. All jobs on a node share the copies, so an input that
+        is already there from an earlier job is not copied again.
+        """
+        return os.path.join(self.scratch, "pypedream-staging", os.path.abspath(fname).lstrip("/"))
+
+    def staged_command(self):
+        """
+        Get the command with the inputs and outputs replaced by their copies in the scratch dir. Only declared inputs
+        and outputs are replaced, files that a tool finds next to them (such as indexes) must be declared too.
+        """
+        ports = dict(self.get_input_dict(), **self.get_output_dict())
+        try:
+            for name, value in ports.items():
+                if isinstance(value, list):
+                    setattr(self, name, [self.staged_path(fname) if fname else fname for fname in value])
+                elif value:
+                    setattr(self, name, self.staged_path(value))
+            return self.command()
+        finally:
+            for name, value in ports.items():
+                setattr(self, name, value)
+
+    def stage_in_bash(self):
+        """
+        Get the lines that copy the inputs to the scratch dir, unless a copy with the same size and modification
+        time is already there. Copies are written to a temporary file and renamed, so that jobs that stage the same
+        input at the same time don't see a partial copy. Inputs that are not files, such as directories, are linked.
+        Old copies of the outputs are removed, so that a tool that appends to an output starts from scratch.
+        Copies that no job has used for stage_keep minutes are removed first. A copy that is reused is touched with
+        the modification time it already has, which only updates its change time, so the change time tells when a
+        copy was last used.
+        """
+        s = ['pypedream_stage_in() {',
+             '  mkdir -p "$(dirname "$2")"',
+             '  if [ ! -f "$1" ]; then',
+             '    ln -sfn "$1" "$2"',
+             '  elif [ ! -f "$2" ] || [ "$(stat -c %s:%Y "$1")" != "$(stat -c %s:%Y "$2")" ]; then',
+             '    cp -p "$1" "$2.$$"',
+             '    mv -f "$2.$$" "$2"',
+             '  else',
+             '    touch -c -r "$2" "$2"',
+             '  fi',
+             '}',
+             "find {} -mindepth 1 ! -type d -cmin +{} -delete 2>/dev/null || true".format(
+                 os.path.join(self.scratch, "pypedream-staging"), self.stage_keep)]
+        for fname in filter(None, self.get_inputs()):
+            s.append("pypedream_stage_in {} {}".format(fname, self.staged_path(fname)))
+        for fname in self.get_outputs():
+            s.append("rm -rf " + self.staged_path(fname))
+            s.append("mkdir -p " + os.path.dirname(self.staged_path(fname)))
+        return "\n".join(s)
+
+    def stage_out_bash(self):
+        """
+        Get the lines that move the outputs back from the scratch dir. Each output is moved next to its final path
+        and renamed, so that it appears at once. No copies of the outputs are left in the scratch dir.
+        """
+        s = []
+        for fname in self.get_outputs():
+            s.append("rm -rf {}.staging".format(fname))
+            s.append("mv {} {}.staging".format(self.staged_path(fname), fname))
+            s.append("rm -rf {}".format(fname))
+            s.append("mv {0}.staging {0}".format(fname))
+        return "\n".join(s)
+
     def complete_bash(self):
         s = []
         for f in self.failfiles():
@@ -0,0 +1,182 @@
+import json
+import logging
+import os
+import sqlite3
+import stat
+import tempfile
+
+from pypedream.profiling import profiler
+
+logger = logging.getLogger(__name__)
+
+__author__ = 'dankle'
+
+
+def open_jobdb(path):
+    """
+    Get the jobdb backend for a path. Files ending with .sqlite or .sqlite3 are SQLite databases, anything else is
+    a json file.
+    """
+    if os.path.splitext(path)[1] in [".sqlite", ".sqlite3"]:
+        return SqliteJobdb(path)
+    else:
+        return JsonJobdb(path)
+
+
+def write_json_atomically(d, path):
+    """
+    Write a dict as json to a temporary file next to path, then rename it into place, so that readers never see a
+    half written file. The file keeps the mode of the file it replaces, or gets the mode of a new file under the umask,
+    rather than the 0600 of the temporary file.
+    :return: number of bytes written
+    """
+    data = json.dumps(d, indent=4)
+    if os.path.exists(path):
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    else:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".{}.".format(os.path.basename(path)))
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+        os.chmod(tmp, mode)
+        os.rename(tmp, path)
+    except:
+        os.remove(tmp)
+        raise
+    return len(data)
+
+
+class JsonJobdb(object):
+    """
+    Keeps the jobdb as one json file. The file is rewritten atomically, and only when something changed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._last = None
+
+    def update(self, d):
+        """
+        :param d: the jobdb dict of a pipeline, see PypedreamPipeline._get_jobdb_dict()
+        """
+        if d == self._last:
+            return
+        profiler.count("jobdb.bytes_written", write_json_atomically(d, self.path))
+        profiler.count("jobdb.writes")
+        self._last = d
+
+    def load(self):
+        """
+        :return: the jobdb dict, or None if there is no jobdb
+        """
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path) as f:
+            return json.load(f)
+
+
+class SqliteJobdb(object):
+    """
+    Keeps the jobdb in an SQLite database. The jobs are inserted once, after that only changed statuses, job ids and
+    times are written. Dashboards can query the jobs table, which is indexed on status, or the status_summary view.
+    """
+    job_columns = ['jobname', 'status', 'jobid', 'inputs', 'outputs', 'starttime', 'endtime', 'threads', 'memory',
+                   'walltime', 'disk', 'log', 'resources', 'attempts']
+    mutable_columns = ['status', 'jobid', 'starttime', 'endtime', 'memory', 'walltime', 'resources', 'attempts']
+    json_columns = ['inputs', 'outputs', 'resources', 'attempts']
+    pipeline_keys = ['starttime', 'endtime', 'exitcode', 'status']
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = None  # opened on first use, in the process that runs the pipeline
+        self._written_jobs = None  # last written mutable columns of each job, by index
+        self._written_pipeline = None
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path)
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (idx INTEGER PRIMARY KEY, jobname TEXT, status TEXT, jobid TEXT,
+                                                 inputs TEXT, outputs TEXT, starttime TEXT, endtime TEXT,
+                                                 threads INTEGER, memory INTEGER, walltime TEXT, disk INTEGER,
+                                                 log TEXT, resources TEXT, attempts TEXT);
+                CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+                CREATE TABLE IF NOT EXISTS pipeline (key TEXT PRIMARY KEY, value TEXT);
+                CREATE VIEW IF NOT EXISTS status_summary AS SELECT status, COUNT(*) AS n FROM jobs GROUP BY status;
+                """)
+            # databases written by earlier versions lack some columns
+            existing = [row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")]
+            for col in self.job_columns:
+                if col not in existing:
+                    self._conn.execute("ALTER TABLE jobs ADD COLUMN {} TEXT".format(col))
+        return self._conn
+
+    def update(self, d):
+        """
+        :param d: the jobdb dict of a pipeline, see PypedreamPipeline._get_jobdb_dict()
+        """
+        conn = self._connect()
+        with conn:
+            if self._written_jobs is None or len(self._written_jobs) != len(d['jobs']):
+                conn.execute("DELETE FROM jobs")
+                insert = "INSERT INTO jobs (idx, {}) VALUES (?{})".format(", ".join(self.job_columns),
+                                                                           ", ?" * len(self.job_columns))
+                conn.executemany(insert,
+                                 [[idx] + [self._to_sql(job[col]) for col in self.job_columns]
+                                  for idx, job in enumerate(d['jobs'])])
+                profiler.count("jobdb.rows_written", len(d['jobs']))
+                self._written_jobs = [None] * len(d['jobs'])
+                for idx, job in enumerate(d['jobs']):
+                    self._written_jobs[idx] = [job[col] for col in self.mutable_columns]
+            else:
+                changes = []
+                for idx, job in enumerate(d['jobs']):
+                    values = [job[col] for col in self.mutable_columns]
+                    if values != self._written_jobs[idx]:
+                        changes.append([self._to_sql(v) for v in values] + [idx])
+                        self._written_jobs[idx] = values
+                if changes:
+                    profiler.count("jobdb.rows_written", len(changes))
+                    conn.executemany("UPDATE jobs SET {} WHERE idx=?".format(", ".join(
+                        "{}=?".format(col) for col in self.mutable_columns)), changes)
+
+            pipeline_values = [d[key] for key in self.pipeline_keys]
+            if pipeline_values != self._written_pipeline:
+                conn.executemany("INSERT OR REPLACE INTO pipeline VALUES (?, ?)",
+                                 [(key, json.dumps(d[key])) for key in self.pipeline_keys])
+                self._written_pipeline = pipeline_values
+
+    def summary(self):
+        """
+        :return: number of jobs for each status
+        :rtype: dict[str, int]
+        """
+        return dict(self._connect().execute("SELECT status, n FROM status_summary").fetchall())
+
+    def load(self):
+        """
+        :return: the jobdb dict, or None if there is no jobdb
+        """
+        if not os.path.exists(self.path):
+            return None
+        conn = self._connect()
+        jobs = []
+        for row in conn.execute("SELECT {} FROM jobs ORDER BY idx".format(", ".join(self.job_columns))):
+            job = dict(zip(self.job_columns, row))
+            for col in self.json_columns:
+                job[col] = json.loads(job[col]) if job[col] is not None else None
+            jobs.append(job)
+        d = dict((key, None) for key in self.pipeline_keys)
+        for key, value in conn.execute("SELECT key, value FROM pipeline"):
+            d[key] = json.loads(value)
+        d['jobs'] = jobs
+        return d
+
+    @staticmethod
+    def _to_sql(value):
+        if isinstance(value, (dict, list)):
+            return json.dumps(value)
+        return value
@@ -1,5 +1,4 @@
 import inspect
-import json
 import logging
 import multiprocessing
 import os
@@ -7,12 +6,15 @@ import sys
 from multiprocessing import Process
 
 import datetime
-import networkx as nx
-from networkx.drawing.nx_pydot import write_dot
 from pypedream.runners import slurmrunner
 
-import pypedream.constants
+from pypedream.cache import ResultCache
+from pypedream.checksum import ChecksumIndex
+from pypedream.fusion import FusedJob, StreamJob, find_chains, find_stream_groups
+from pypedream.graph import Graph
 from pypedream.job import Job
+from pypedream.jobdb import open_jobdb, write_json_atomically
+from pypedream.profiling import profiler, timed
 from pypedream.pypedreamstatus import PypedreamStatus
 from pypedream.runners.shellrunner import Shellrunner
 
@@ -32,15 +34,63 @@ class PypedreamPipeline(Process):
     status = None
     runner_returncode = None
 
-    def __init__(self, outdir, scriptdir=None, dot_file=None, runner=Shellrunner(), jobdb=None, scratch="/tmp"):
+    def __init__(self, outdir, scriptdir=None, dot_file=None, runner=Shellrunner(), jobdb=None, scratch="/tmp",
+                 cache_dir=None, cache_size=None, incremental=False, targets=None, profile=False, fuse=False,
+                 stage=False, retry_policy=None):
+        """
+        :param retry_policy: when to submit jobs that fail in slurm again, for jobs that don't set Job.retry_policy.
+        See RetryPolicy. By default jobs are not retried.
+        :param scratch: node local scratch dir of jobs that don't set their own
+        :param stage: run jobs on copies of their inputs and outputs in the scratch dir, to keep I/O off the shared
+        file system. Outputs are copied back before the job is done. Jobs can set Job.stage themselves.
+        :param fuse: run linear chains of jobs with the same resource requests as one job each, so that they are
+        submitted and polled once. Each job in a chain keeps its own log and done and fail files. See
+        pypedream.fusion.
+        :param profile: time the phases of run() and the runner, and write a summary to the log and to
+        <outdir>/.pypedream/profile.json when the pipeline ends. The profiler is only on while run() runs, other
+        pipelines in the same process are not profiled. See pypedream.profiling.
+        :param targets: output files to make. Only the jobs needed for them are run, see set_targets(). By default
+        all jobs are run.
+        :param incremental: rerun completed jobs whose outputs are out of date, and everything downstream of them.
+        See Job.is_stale(). Otherwise a job is done as soon as its done files exist.
+        :param cache_dir: directory of a result cache shared between runs. Jobs whose tool, command and input contents
+        match a cached job get their outputs from the cache instead of running. See ResultCache.
+        :param cache_size: max size of the result cache in bytes, least recently used entries are evicted
+        """
         Process.__init__(self)
+        self.profile = profile
         self.status = PypedreamStatus.PENDING
-        self.graph = nx.MultiDiGraph()
+        self.graph = Graph()
+        self._edges = set()  # (producer, consumer, filename) of the edges in the graph
+        self._producers = {}  # filename -> jobs that have the file as an output
+        self._consumers = {}  # filename -> jobs that have the file as an input
+        self._jobs_by_id = {}
+        self._ordered_jobs = None  # cached topological order, reset whenever the graph changes
+        self._unfinished_consumers = {}  # intermediate file -> number of its consumers that have not completed
+        self._completed_jobs = set()  # jobs that _on_job_completed has been called for
+        self._runtime_history = {}  # sorted outputs of a job -> runtime in seconds in the previous run, from the jobdb
+        self._previous_jobids = {}  # sorted outputs of a job -> its job id, if it had not finished when the previous run ended
+        self._job_index = None
         self.dot_file = dot_file
         self.runner = runner
         self.outdir = outdir
         self.jobdb = jobdb
+        self._jobdb = open_jobdb(jobdb) if jobdb else None
         self.scratch = scratch
+        self.stage = stage
+        self.retry_policy = retry_policy
+        # digests of input files for the cache keys, kept between runs so that unchanged files are not hashed again
+        self.checksums = None
+        self.cache = None
+        if cache_dir:
+            self.checksums = ChecksumIndex("{}/.pypedream/checksums.json".format(self.outdir))
+            self.cache = ResultCache(cache_dir, cache_size, digest=self.checksums.digest)
+        self.incremental = incremental
+        self.targets = targets
+        self._needed_jobs = None  # jobs needed for the targets, or None to run everything
+        self.fuse = fuse
+        self._units = {}  # job in a fused chain or stream group -> the FusedJob that runs it
+        self._streams = []  # files that are streamed from their producer to their consumer, see stream()
         self.exit = multiprocessing.Event()
 
         if not scriptdir:
@@ -51,23 +101,14 @@ class PypedreamPipeline(Process):
                                                                                  'runner': self.runner.__class__,
                                                                                  'dot_file': self.dot_file}))
 
+    @timed("pipeline.add")
     def add(self, job):
         """
         :type job:Job
         """
         logger.debug("Added step {}".format(job.get_name()))
-        inputs = []
-        outputs = []
-        for varname in job.__dict__:
-            if varname.startswith(pypedream.constants.INPUT):
-                inputs.append(varname)
-
-        for varname in job.__dict__:
-            if varname.startswith(pypedream.constants.OUTPUT):
-                outputs.append(varname)
-
-        logger.debug("  inputs: " + str(inputs))
-        logger.debug("  outputs: " + str(outputs))
+        logger.debug("  inputs: " + str(job.get_input_dict().keys()))
+        logger.debug("  outputs: " + str(job.get_output_dict().keys()))
         job.set_log()
         logger.debug("Will write log to {}".format(job.log))
         logger.debug("inputs are: {}".format(job.get_inputs()))
@@ -80,99 +121,112 @@ class PypedreamPipeline(Process):
 
         self.graph.add_node(job)
         job.name = job.get_name()
+        self._index_job(job)
+        self._invalidate_order()
 
+    def _index_job(self, job):
+        """
+        Register the inputs and outputs of a job in the producer/consumer index, so that file to job lookups
+        don't have to scan the graph. Inputs and outputs must be set on the job before it is added.
+        :type job: Job
+        """
+        for fname in filter(None, job.get_inputs()):
+            consumers = self._consumers.setdefault(fname, [])
+            if job not in consumers:
+                consumers.append(job)
+        for fname in filter(None, job.get_outputs()):
+            producers = self._producers.setdefault(fname, [])
+            if job not in producers:
+                producers.append(job)
+
+    @timed("pipeline.add_edges")
     def _add_edges(self):
-        filenames = self._get_all_files()
-        for fname in filenames:
+        for fname in self._consumers:
             inputs = self._get_nodes_with_input(fname)
             outputs = self._get_nodes_with_output(fname)
-            if inputs and outputs:
-                for i in inputs:
-                    for o in outputs:
-                        if i not in self.graph.nodes():
-                            raise ValueError("input node {} is not in graph".format(i))
-                        if o not in self.graph.nodes():
-                            raise ValueError("output node {} is not in graph".format(o))
-                        logger.debug(
-                            "Adding edge from " + o.get_name() + " to " + i.get_name() + " with name " + fname)
+            for i in inputs:
+                for o in outputs:
+                    if (o, i, fname) in self._edges:
+                        continue
+                    self._edges.add((o, i, fname))
+                    logger.debug(
+                        "Adding edge from " + o.get_name() + " to " + i.get_name() + " with name " + fname)
 
-                        self.graph.add_edges_from([(o, i)], filename=fname)
+                    self.graph.add_edges_from([(o, i)], filename=fname)
 
-        self._write_scripts()
+        self._invalidate_order()
 
     def _get_all_files(self):
         """
         Get names of all files added as inputs or outputs
         :return:
         """
-        files = []
-        for tool in self.graph.nodes():
-            for varname in tool.__dict__:
-                if varname.startswith(pypedream.constants.INPUT) or \
-                        varname.startswith(pypedream.constants.OUTPUT):  # input and outputs are files
-                    obj = tool.__dict__[varname]  # can be a list or a string
-                    if obj.__class__.__name__ == "str":
-                        files.append(obj)
-                    elif obj.__class__.__name__ == "list":
-                        for item in obj:
-                            files.append(item)
-        return list(set(filter(None, files)))  # filter removes empties, list(set()) uniquifies the list.
+        return list(set(self._consumers) | set(self._producers))
 
     def _get_nodes_with_input(self, filename):
         """ Get list of nodes (tools) that has "filename" as an input
         :param filename: name of file to search for
         :return: list of tools
         """
-        tools = []
-        for tool in self.graph.nodes():
-            for varname in tool.__dict__:
-                if varname.startswith(pypedream.constants.INPUT):
-                    obj = tool.__dict__[varname]  # can be a list or a string
-                    if obj.__class__.__name__ == "str" and obj == filename:
-                        tools.append(tool)
-                    elif obj.__class__.__name__ == "list" and filename in obj:
-                        tools.append(tool)
-        return tools
+        return list(self._consumers.get(filename, []))
 
     def _get_dependencies(self, job):
         """
-        Get dependencies
+        Get dependencies. Jobs in a fused chain are replaced by the fused job.
         :type job: job.Job
         :rtype: list[job.job]
         """
         depjobs = []
         for inf in job.get_inputs():
             depjobs += self._get_nodes_with_output(inf)
-        return uniq(depjobs)
+        return uniq([self._units.get(j, j) for j in depjobs])
+
+    def _get_dependents(self, job):
+        """
+        Get the jobs that have an output of the job as an input. Jobs in a fused chain are replaced by the fused job.
+        :type job: job.Job
+        :rtype: list[job.job]
+        """
+        dependents = [self._units.get(j, j) for fname in job.get_outputs() for j in self._get_nodes_with_input(fname)]
+        return uniq([j for j in dependents if j is not job])
+
+    def _get_downstream_jobs(self, job, jobs):
+        """
+        Get the jobs among `jobs` that depend on a job, directly or through other jobs
+        :param jobs: jobs in topological order
+        :rtype: list[job.Job]
+        """
+        jobs_to_search = set(jobs)
+        downstream = set()
+        work = [job]
+        while work:
+            for dependent in self._get_dependents(work.pop()):
+                if dependent in jobs_to_search and dependent not in downstream:
+                    downstream.add(dependent)
+                    work.append(dependent)
+        return [j for j in jobs if j in downstream]
 
     def _get_job_with_id(self, jobid):
         if jobid is None:
             return None
-        for job in self.graph.nodes():
-            if 'jobid' in job.__dict__:
-                if job.jobid == jobid:
-                    return job
-        return None
+        job = self._jobs_by_id.get(jobid)
+        if job is None or job.jobid != jobid:
+            # job ids are assigned by the runners after the jobs are added, so (re)build the index on a miss
+            # fused jobs share their job id with their members, and take precedence
+            jobs = self.graph.nodes() + uniq(self._units.values())
+            self._jobs_by_id = dict((j.jobid, j) for j in jobs if j.jobid is not None)
+            job = self._jobs_by_id.get(jobid)
+        return job
 
     def _get_outputs(self):
-        outputs = []
-        for job in self.graph.nodes():
-            outputs += job.get_outputs()
-        return outputs
+        return list(self._producers)
 
     def _get_nodes_with_output(self, filename):
         """ Get list of nodes (tools) that has "filename" as an output
         :param filename: name of file to search for
         :return: list of tools
         """
-        tools = []
-        for tool in self.graph.nodes():
-            for varname in tool.__dict__:
-                if varname.startswith(pypedream.constants.OUTPUT):
-                    obj = tool.__dict__[varname]  # can be a list or a string
-                    if obj == filename:
-                        tools.append(tool)
-        return tools
+        return list(self._producers.get(filename, []))
 
     def _write_dot(self):
         """ Write a dot file with the pipeline graph
@@ -180,41 +234,117 @@ class PypedreamPipeline(Process):
         :return: None
         """
         if self.dot_file:
-            write_dot(self.graph, self.dot_file)
+            # networkx and pydot are only needed for dot files, so import them here
+            from networkx.drawing.nx_pydot import write_dot
+            write_dot(self.graph.to_networkx(), self.dot_file)
 
+    @timed("pipeline.write_scripts")
     def _write_scripts(self):
         """
-        Write scripts for all steps in pipeline
-        :param scriptdir: dir to write scripts
-        :return:
+        Write scripts for all steps in the pipeline that will run
         """
         logger.debug("Writing scripts.")
         if not os.path.exists(self.scriptdir):
             logger.debug("Output directory " + self.scriptdir + " does not exist. Creating. ")
             os.makedirs(self.scriptdir)
 
-        for job in self._get_ordered_jobs():
+        for job in self._get_ordered_jobs_to_run():
             job.write_script(self.scriptdir, self)
 
     def _get_ordered_jobs(self):
-        """ Method to order the tasks in the pipeline
+        """ Method to order the tasks in the pipeline. The order is computed once and reused until the graph changes.
         :return: An array of paths for the runner to run
         """
-        if not nx.is_directed_acyclic_graph(self.graph):
-            raise ValueError("ERROR: The submitted pipeline is not a DAG. Check the pipeline for loops.")
+        if self._ordered_jobs is None:
+            try:
+                with profiler.timer("pipeline.topological_sort"):
+                    self._ordered_jobs = self.graph.topological_sort()
+            except ValueError:
+                raise ValueError("ERROR: The submitted pipeline is not a DAG. Check the pipeline for loops.")
+            self._job_index = dict((job, idx) for idx, job in enumerate(self._ordered_jobs))
+        return list(self._ordered_jobs)
+
+    def _get_job_index(self, job):
+        """
+        Get the position of a job in the topological order of the pipeline
+        :type job: Job
+        :rtype: int
+        """
+        if self._job_index is None:
+            self._get_ordered_jobs()
+        if isinstance(job, FusedJob):
+            job = job.members[0]
+        return self._job_index[job]
 
-        ordered_jobs = nx.topological_sort(self.graph)
-        return ordered_jobs
+    def _invalidate_order(self):
+        self._ordered_jobs = None
+        self._job_index = None
 
     def _get_ordered_jobs_to_run(self):
+        """
+        Get the jobs to run in topological order. A fused chain takes the place of its first job.
+        """
         all_jobs = self._get_ordered_jobs()
         jobs_to_run = []
         for job in all_jobs:
-            if job.status != PypedreamStatus.COMPLETED:
-                jobs_to_run.append(job)
+            if job.status != PypedreamStatus.COMPLETED and (self._needed_jobs is None or job in self._needed_jobs):
+                unit = self._units.get(job, job)
+                if unit is job or unit.members[0] is job:
+                    jobs_to_run.append(unit)
 
         return jobs_to_run
 
+    def stream(self, filename):
+        """
+        Stream a file from the job that writes it to the job that reads it through a named pipe, instead of writing
+        it to disk. Both jobs are then run at the same time as one job, see StreamJob. The file must have one
+        producer and one consumer that write and read it from start to end, and it does not exist after the run.
+        :param filename: an output of an added job
+        """
+        producers = self._get_nodes_with_output(filename)
+        consumers = self._get_nodes_with_input(filename)
+        if len(producers) != 1 or len(consumers) != 1:
+            raise ValueError("Only a file with one producer and one consumer can be streamed, {} has {} and {}".format(
+                filename, len(producers), len(consumers)))
+        producer = producers[0]
+        if filename not in producer.streamed:
+            producer.streamed = tuple(producer.streamed) + (filename,)
+        if filename not in self._streams:
+            self._streams.append(filename)
+
+    def set_targets(self, targets):
+        """
+        Only run what is needed to make some outputs: the jobs that make them and their ancestors, but not past jobs
+        that are completed and whose outputs still exist. Completed jobs whose deleted intermediate outputs are
+        needed are run again.
+        :param targets: output files, or None to run all jobs
+        """
+        self.targets = targets
+
+    def _find_needed_jobs(self):
+        if self.targets is None:
+            self._needed_jobs = None
+            return
+
+        unknown = [fname for fname in self.targets if fname not in self._producers]
+        if unknown:
+            raise ValueError("No job in the pipeline makes the target(s) {}".format(", ".join(unknown)))
+
+        needed = set()
+        work = [job for fname in self.targets for job in self._producers[fname]]
+        while work:
+            job = work.pop()
+            if job in needed:
+                continue
+            if job.status == PypedreamStatus.COMPLETED:
+                if all(os.path.exists(f) for f in job.get_outputs()):
+                    continue
+                job.status = PypedreamStatus.PENDING
+            needed.add(job)
+            work += self._get_dependencies(job)
+        self._needed_jobs = needed
+
+    @timed("pipeline.cleanup")
     def _cleanup(self):
         for output_file in self._get_outputs():
             keep_file = False
@@ -234,41 +364,241 @@ class PypedreamPipeline(Process):
                 logger.debug("Removing intermediate file {}".format(output_file))
                 os.remove(output_file)
 
+    def _count_unfinished_consumers(self):
+        """
+        Count the consumers that have not completed for every intermediate file, that is every file whose producers
+        are all marked is_intermediate.
+        """
+        self._unfinished_consumers = {}
+        for fname, producers in self._producers.items():
+            if not all(job.is_intermediate for job in producers):
+                continue
+            n = len([job for job in self._consumers.get(fname, []) if job.status != PypedreamStatus.COMPLETED])
+            if n > 0:
+                self._unfinished_consumers[fname] = n
+
+    @timed("pipeline.on_job_completed")
+    def _on_job_completed(self, job):
+        """
+        To be called by the runners when a job has completed. Intermediate inputs of the job that have no other
+        unfinished consumers are deleted right away.
+        :type job: Job
+        """
+        if isinstance(job, FusedJob):
+            for member in job.members:
+                self._on_job_completed(member)
+            return
+        if job in self._completed_jobs:
+            return
+        self._completed_jobs.add(job)
+        if job.resources:
+            profiler.count("jobs.walltime_seconds", job.resources['walltime'])
+
+        # store the outputs before any intermediate inputs are deleted, the cache key needs them
+        if self.cache:
+            key = self.cache.key(job)
+            if key:
+                self.cache.store(job, key)
+
+        for fname in set(job.get_inputs()):
+            if fname not in self._unfinished_consumers:
+                continue
+            self._unfinished_consumers[fname] -= 1
+            if self._unfinished_consumers[fname] == 0:
+                del self._unfinished_consumers[fname]
+                if os.path.exists(fname):
+                    logger.debug("Removing intermediate file {}".format(fname))
+                    os.remove(fname)
+
+    @timed("pipeline.restore_from_cache")
+    def _restore_from_cache(self):
+        """
+        Complete jobs whose outputs are in the result cache, in topological order, so that restored outputs can be
+        inputs of the next lookup. Restored intermediate files that no job will read are removed again.
+        """
+        # hash the inputs that exist up front, in parallel
+        jobs_to_run = self._get_ordered_jobs_to_run()
+        restored = []
+        self.checksums.digests([fname for job in jobs_to_run
+                                for fname in filter(None, job.get_inputs()) if os.path.isfile(fname)])
+        for job in jobs_to_run:
+            if all(j.status == PypedreamStatus.COMPLETED for j in self._get_dependencies(job)):
+                key = self.cache.key(job)
+                if key and self.cache.restore(job, key):
+                    job.complete()
+                    restored.append(job)
+
+        for fname in set(fname for job in restored for fname in job.get_outputs()):
+            if not all(job.is_intermediate for job in self._producers[fname]):
+                continue
+            consumers = self._consumers.get(fname, [])
+            if consumers and all(job.status == PypedreamStatus.COMPLETED for job in consumers) and \
+                    os.path.exists(fname):
+                logger.debug("Removing intermediate file {}".format(fname))
+                os.remove(fname)
+
+    @timed("pipeline.mark_stale_jobs")
+    def _mark_stale_jobs(self, dry_run=False):
+        """
+        Reschedule completed jobs that are stale, jobs downstream of a job that will run, and jobs whose deleted
+        intermediate outputs are needed again by a job that will run.
+        :param dry_run: only change the status of the jobs, keep their done files
+        :return: the rescheduled jobs
+        """
+        stale = set()
+        for job in self._get_ordered_jobs():
+            if job.status != PypedreamStatus.COMPLETED:
+                continue
+            if job.is_stale() or any(dep.status != PypedreamStatus.COMPLETED or dep in stale
+                                     for dep in self._get_dependencies(job)):
+                stale.add(job)
+
+        # rerunning a producer of deleted intermediates makes its other consumers stale too, so repeat until stable
+        work = list(stale)
+        while work:
+            job = work.pop()
+            related = self._get_dependencies(job)
+            related = [dep for dep in related if not all(os.path.exists(f) for f in dep.get_outputs())]
+            for fname in job.get_outputs():
+                related += self._consumers.get(fname, [])
+            for other in related:
+                if other.status == PypedreamStatus.COMPLETED and other not in stale:
+                    stale.add(other)
+                    work.append(other)
+
+        for job in stale:
+            logger.info("Rescheduling {}, its outputs are out of date".format(job.get_name()))
+            job.status = PypedreamStatus.PENDING
+            if not dry_run:
+                job.try_remove_files(job.donefiles())
+        return stale
+
+    @timed("pipeline.fuse")
+    def _fuse(self):
+        """
+        Replace jobs connected by streamed files by stream jobs, and linear chains among the other jobs to run by
+        fused jobs if fusion is on. See find_stream_groups() and find_chains().
+        """
+        self._units = {}
+        for group in find_stream_groups(self, self._get_ordered_jobs_to_run(), self._streams):
+            logger.debug("Streaming between {}".format(", ".join(job.get_name() for job in group)))
+            streams = [fname for fname in self._streams
+                       if self._producers[fname][0] in group and self._consumers[fname][0] in group]
+            unit = StreamJob(group, streams)
+            for job in group:
+                self._units[job] = unit
+
+        if not self.fuse:
+            return
+        for chain in find_chains(self, self._get_ordered_jobs_to_run()):
+            logger.debug("Fusing {}".format(", ".join(job.get_name() for job in chain)))
+            unit = FusedJob(chain)
+            for job in chain:
+                self._units[job] = unit
+
     def _set_scratch(self, global_scratch, override=False):
         """
         Set the scratch dir of every added job, while not overriding any manually set scratch dir (default).
         If 'override' is set, it will ignore a previously set scratch dir.
         """
         for job in self.graph.nodes():
-            if not job.scratch or override:
+            if 'scratch' not in job.__dict__ or not job.scratch or override:
                 job.scratch = global_scratch
 
-    def run(self):
+    def _set_stage(self, stage):
+        """
+        Turn staging on or off for every added job that doesn't set it itself
+        """
+        for job in self.graph.nodes():
+            if job.stage is None:
+                job.stage = stage
+
+    def _set_retry_policy(self, retry_policy):
+        """
+        Set the retry policy of every added job that doesn't set it itself
+        """
+        for job in self.graph.nodes():
+            if job.retry_policy is None:
+                job.retry_policy = retry_policy
+
+    def _prepare(self, dry_run=False):
+        self._units = {}
         self._set_scratch(self.scratch)
-        self.starttime = datetime.datetime.now().isoformat()
-        self.status = PypedreamStatus.RUNNING
+        self._set_stage(self.stage)
+        self._set_retry_policy(self.retry_policy)
         self._add_edges()
+        if self.incremental:
+            self._mark_stale_jobs(dry_run)
+        self._find_needed_jobs()
 
-        if self.dot_file:
-            self._write_dot()
-
-        self._write_jobdb_json()
-        self.runner_returncode = self.runner.run(self)
-        self.endtime = datetime.datetime.now().isoformat()
-
-        if self.runner_returncode == 0:
-            logger.info("Pipeline finished successfully. ")
-            self.status = PypedreamStatus.COMPLETED
-        else:
-            if self.runner_returncode == slurmrunner.exitcode_cancelled:
-                self.status = PypedreamStatus.CANCELLED
-            elif self.runner_returncode == slurmrunner.exitcode_failed:
-                self.status = PypedreamStatus.FAILED
-            else:
-                self.status = PypedreamStatus.FAILED
-                logger.info("Pipeline failed with exit code {}.".format(self.runner_returncode))
+    def plan(self):
+        """
+        Get the jobs that run() would run, in order, without running or writing anything. Jobs whose outputs are in
+        the result cache are included. The jobs, and the fused jobs and targets of the pipeline, are left as they
+        were, so a run() that follows does the same as without the plan.
+        :rtype: list[Job]
+        """
+        attributes = dict((job, dict(job.__dict__)) for job in self.graph.nodes())
+        units, needed_jobs = self._units, self._needed_jobs
+        try:
+            self._prepare(dry_run=True)
+            self._fuse()
+            jobs = self._get_ordered_jobs_to_run()
+            for job in jobs:
+                logger.info("Would run {}: {}".format(job.get_name(), ", ".join(job.get_outputs())))
+            logger.info("{} of {} jobs would run".format(len(jobs), len(self._get_ordered_jobs())))
+            return jobs
+        finally:
+            for job, attrs in attributes.items():
+                job.__dict__.clear()
+                job.__dict__.update(attrs)
+            self._units, self._needed_jobs = units, needed_jobs
 
-        self._write_jobdb_json()
+    def run(self):
+        # profile this run on its own, unless the profiler is on for the whole process
+        profiling = self.profile and not profiler.enabled
+        if profiling:
+            profiler.reset()
+            profiler.enable()
+        try:
+            self.starttime = datetime.datetime.now().isoformat()
+            self.status = PypedreamStatus.RUNNING
+            self._load_previous_run()
+            self._prepare()
+            if self.cache:
+                self._restore_from_cache()
+            self._fuse()
+            self._write_scripts()
+            self._count_unfinished_consumers()
+
+            if self.dot_file:
+                self._write_dot()
+
+            self._write_jobdb()
+            with profiler.timer("pipeline.runner"):
+                self.runner_returncode = self.runner.run(self)
+            if self.cache:
+                self.checksums.save()
+            self.endtime = datetime.datetime.now().isoformat()
+
+            if self.runner_returncode == 0:
+                logger.info("Pipeline finished successfully. ")
+                self.status = PypedreamStatus.COMPLETED
+            else:
+                if self.runner_returncode == slurmrunner.exitcode_cancelled:
+                    self.status = PypedreamStatus.CANCELLED
+                elif self.runner_returncode == slurmrunner.exitcode_failed:
+                    self.status = PypedreamStatus.FAILED
+                else:
+                    self.status = PypedreamStatus.FAILED
+                    logger.info("Pipeline failed with exit code {}.".format(self.runner_returncode))
+
+            self._write_jobdb()
+            if profiler.enabled:
+                self._write_profile()
+        finally:
+            if profiling:
+                profiler.disable()
         sys.exit(self.runner_returncode)
 
     def stop(self):
@@ -277,41 +607,117 @@ class PypedreamPipeline(Process):
     def _stop_all_jobs(self):
         self.runner.stop_all_jobs()
 
-    def _write_jobdb_json(self):
-        if self.jobdb:
-            with open(self.jobdb, 'w') as f:
-                jobs = []
-                for j in self._get_ordered_jobs():
-                    inputs = {}
-                    outputs = {}
-
-                    for varname in j.__dict__:
-                        obj = j.__dict__[varname]  # can be a list or a string
-                        if varname.startswith(pypedream.constants.INPUT):
-                            inputs[varname] = obj
-
-                        if varname.startswith(pypedream.constants.OUTPUT):
-                            outputs[varname] = obj
-
-                    jobs.append({'jobname': j.jobname,
-                                 'status': j.status,
-                                 'jobid': j.jobid,
-                                 'inputs': inputs,
-                                 'outputs': outputs,
-                                 'starttime': j.starttime,
-                                 'endtime': j.endtime,
-                                 'threads': j.threads,
-                                 'log': j.log
-                                 })
-
-                d = {'jobs': jobs,
-                     'starttime': self.starttime,
-                     'endtime': self.endtime,
-                     'exitcode': self.runner_returncode,
-                     'status': self.status
-                     }
-
-                json.dump(d, f, indent=4)
+    def _load_previous_run(self):
+        """
+        Read the runtimes of the jobs that completed in the previous run, and the job ids of the jobs that were
+        still queued or running when it ended, from the jobdb, before it is overwritten
+        """
+        self._runtime_history = {}
+        self._previous_jobids = {}
+        d = self._jobdb.load() if self._jobdb else None
+        if not d:
+            return
+        for job in d['jobs']:
+            if job['status'] in [PypedreamStatus.PENDING, PypedreamStatus.RUNNING, PypedreamStatus.NOT_FOUND] and \
+                    job.get('jobid') is not None:
+                self._previous_jobids[tuple(sorted(job['outputs'].values()))] = job['jobid']
+            if job['status'] != PypedreamStatus.COMPLETED:
+                continue
+            runtime = (job.get('resources') or {}).get('walltime')
+            if runtime is None:
+                runtime = seconds_between(job['starttime'], job['endtime'])
+            if runtime is not None:
+                self._runtime_history[tuple(sorted(job['outputs'].values()))] = runtime
+
+    def _get_expected_runtime(self, job):
+        """
+        Get the runtime of a job in the previous run, if it completed then
+        :return: seconds, or None
+        """
+        if isinstance(job, FusedJob):
+            runtimes = [self._get_expected_runtime(member) for member in job.members]
+            return None if None in runtimes else sum(runtimes)
+        return self._runtime_history.get(tuple(sorted(job.get_output_dict().values())))
+
+    def _get_previous_jobid(self, job):
+        """
+        Get the job id of a job in the previous run, if it had not finished when that run ended. A fused job has the
+        job id of its members if they all had the same.
+        :return: a job id, or None
+        """
+        if isinstance(job, FusedJob):
+            jobids = set(self._get_previous_jobid(member) for member in job.members)
+            return jobids.pop() if len(jobids) == 1 else None
+        return self._previous_jobids.get(tuple(sorted(job.get_output_dict().values())))
+
+    def _write_profile(self):
+        """
+        Log the profiling summary and write it to <outdir>/.pypedream/profile.json
+        """
+        for line in profiler.format_summary():
+            logger.info(line)
+        profile_dir = "{}/.pypedream".format(self.outdir)
+        if not os.path.isdir(profile_dir):
+            os.makedirs(profile_dir)
+        write_json_atomically(profiler.summary(), profile_dir + "/profile.json")
+
+    @timed("pipeline.write_jobdb")
+    def _write_jobdb(self):
+        """
+        Write the current state of the pipeline to the jobdb, if one was given. Only changes are written.
+        """
+        if self._jobdb:
+            self._jobdb.update(self._get_jobdb_dict())
+
+    def export_jobdb_json(self, path):
+        """
+        Write the current state of the pipeline as json to a file, atomically.
+        """
+        write_json_atomically(self._get_jobdb_dict(), path)
+
+    def _get_jobdb_dict(self):
+        jobs = []
+        for j in self._get_ordered_jobs():
+            jobs.append({'jobname': j.jobname,
+                         'status': j.status,
+                         'jobid': j.jobid,
+                         'inputs': j.get_input_dict(),
+                         'outputs': j.get_output_dict(),
+                         'starttime': j.starttime,
+                         'endtime': j.endtime,
+                         'threads': j.threads,
+                         'memory': j.memory,
+                         'walltime': j.walltime,
+                         'disk': j.disk,
+                         'log': j.log,
+                         'resources': j.resources,
+                         'attempts': list(j.attempts) if j.attempts else None
+                         })
+
+        return {'jobs': jobs,
+                'starttime': self.starttime,
+                'endtime': self.endtime,
+                'exitcode': self.runner_returncode,
+                'status': self.status
+                }
+
+
+def seconds_between(starttime, endtime):
+    """
+    Get the seconds between two times written by the runners, which are isoformat() times with or without
+    microseconds, or None if either can't be parsed
+    """
+    times = []
+    for t in [starttime, endtime]:
+        for fmt in ["%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S"]:
+            try:
+                times.append(datetime.datetime.strptime(t, fmt))
+                break
+            except (TypeError, ValueError):
+                pass
+    if len(times) != 2:
+        return None
+    return (times[1] - times[0]).total_seconds()
 
 
 # http://stackoverflow.com/questions/480214
@@ -0,0 +1,131 @@
+import functools
+import os
+import threading
+import time
+
+__author__ = 'dankle'
+
+
+class _NullTimer(object):
+    """
+    What Profiler.timer() returns when profiling is off
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_null_timer = _NullTimer()
+
+
+class _Timer(object):
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.add_time(self.name, time.time() - self.start)
+        return False
+
+
+class Profiler(object):
+    """
+    Named timers and counters for the time the driver spends outside of jobs: building the graph, writing scripts
+    and the jobdb, and polling. Off by default, and then a timer or count costs one attribute check. Turn it on with
+    enable(), PypedreamPipeline(profile=True) or PYPEDREAM_PROFILE=1 in the environment.
+
+        with profiler.timer("slurm.poll"):
+            ...
+        profiler.count("slurm.subprocess_calls")
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._timers = {}  # name -> [calls, total seconds, max seconds]
+        self._counters = {}  # name -> value
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._timers = {}
+            self._counters = {}
+
+    def timer(self, name):
+        """
+        Get a context manager that adds the time spent in it to the timer `name`
+        """
+        if not self.enabled:
+            return _null_timer
+        return _Timer(self, name)
+
+    def add_time(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            t = self._timers.setdefault(name, [0, 0.0, 0.0])
+            t[0] += 1
+            t[1] += seconds
+            t[2] = max(t[2], seconds)
+
+    def count(self, name, n=1):
+        """
+        Add n to the counter `name`
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def summary(self):
+        """
+        :return: {'timers': {name: {'calls': int, 'total': seconds, 'max': seconds}}, 'counters': {name: value}}
+        """
+        with self._lock:
+            return {'timers': dict((name, {'calls': t[0], 'total': round(t[1], 6), 'max': round(t[2], 6)})
+                                   for name, t in self._timers.items()),
+                    'counters': dict(self._counters)}
+
+    def format_summary(self):
+        """
+        :return: the summary as lines of text, timers with the most total time first
+        """
+        d = self.summary()
+        lines = ["{:<40} {:>8} {:>12} {:>12}".format("timer", "calls", "total (s)", "max (s)")]
+        for name, t in sorted(d['timers'].items(), key=lambda item: -item[1]['total']):
+            lines.append("{:<40} {:>8} {:>12.3f} {:>12.3f}".format(name, t['calls'], t['total'], t['max']))
+        lines.append("{:<40} {:>8}".format("counter", "value"))
+        for name, value in sorted(d['counters'].items()):
+            lines.append("{:<40} {:>8}".format(name, value))
+        return lines
+
+
+profiler = Profiler(enabled=os.environ.get("PYPEDREAM_PROFILE", "0") not in ["", "0"])
+
+
+def timed(name):
+    """
+    Decorator that times every call of a function with the timer `name`
+    """
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return f(*args, **kwargs)
+            with profiler.timer(name):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -45,6 +45,8 @@ class PypedreamStatus:
         Job has an allocation, but execution has been suspended and CPUs have been released for other jobs.
         TO TIMEOUT
         Job terminated upon reaching its time limit.
+
+        Newer Slurm versions also report OUT_OF_MEMORY, DEADLINE, REVOKED, REQUEUED and RESIZING, mostly from sacct.
          """
         slurm2pypedream = {"PENDING": PypedreamStatus.PENDING,
                            "RUNNING": PypedreamStatus.RUNNING,
@@ -59,6 +61,11 @@ class PypedreamStatus:
                            "PREEMPTED": PypedreamStatus.FAILED,
                            "BOOT_FAIL": PypedreamStatus.FAILED,
                            "NODE_FAIL": PypedreamStatus.FAILED,
+                           "OUT_OF_MEMORY": PypedreamStatus.FAILED,
+                           "DEADLINE": PypedreamStatus.FAILED,
+                           "REVOKED": PypedreamStatus.CANCELLED,
+                           "REQUEUED": PypedreamStatus.PENDING,
+                           "RESIZING": PypedreamStatus.RUNNING,
                            "SPECIAL_EXIT": PypedreamStatus.PENDING
                            }
 
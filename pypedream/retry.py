@@ -0,0 +1,64 @@
+from pypedream.fusion import FusedJob, format_walltime, walltime_seconds
+
+__author__ = 'dankle'
+
+
+class RetryPolicy(object):
+    """
+    When and how a job that failed in slurm is submitted again. Jobs that failed for reasons outside the job, such as
+    a node failure or preemption, are retried as they are. Jobs that ran out of time or memory are only retried if
+    the walltime or memory is to be raised, since they would fail the same way again. Jobs that failed with an error
+    of their own are never retried.
+    """
+    transient_states = ['NODE_FAIL', 'PREEMPTED', 'BOOT_FAIL']
+
+    def __init__(self, max_attempts=3, backoff=60, backoff_factor=2, walltime_factor=None, memory_factor=None):
+        """
+        :param max_attempts: max number of times a job is submitted, including the first
+        :param backoff: seconds to hold a job before its first retry
+        :param backoff_factor: the hold is multiplied by this for every retry after that
+        :param walltime_factor: retry jobs that reach their time limit with the walltime multiplied by this
+        :param memory_factor: retry jobs that run out of memory with the memory multiplied by this. Jobs without
+        Job.memory are not retried.
+        """
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.backoff_factor = backoff_factor
+        self.walltime_factor = walltime_factor
+        self.memory_factor = memory_factor
+
+    def retries(self, job, state, attempt):
+        """
+        Check if a job should be submitted again
+        :param state: the slurm state the job ended in, such as NODE_FAIL
+        :param attempt: the number of the attempt that ended, starting at 1
+        :rtype: bool
+        """
+        if attempt >= self.max_attempts:
+            return False
+        if state == 'TIMEOUT':
+            return self.walltime_factor is not None
+        if state == 'OUT_OF_MEMORY':
+            return self.memory_factor is not None and job.memory is not None
+        return state in self.transient_states
+
+    def delay(self, attempt):
+        """
+        Get the seconds to hold a job before it starts again after the given attempt
+        """
+        return self.backoff * self.backoff_factor ** (attempt - 1)
+
+    def escalate(self, job, state, default_walltime):
+        """
+        Raise the walltime or memory of a job that ran out of it. The members of a fused job are raised too, since
+        they are what the jobdb records.
+        :param default_walltime: the walltime of jobs that don't set one
+        """
+        if isinstance(job, FusedJob):
+            for member in job.members:
+                self.escalate(member, state, default_walltime)
+        if state == 'TIMEOUT' and self.walltime_factor:
+            seconds = walltime_seconds(job.walltime or default_walltime)
+            job.walltime = format_walltime(int(seconds * self.walltime_factor))
+        elif state == 'OUT_OF_MEMORY' and self.memory_factor and job.memory:
+            job.memory = int(job.memory * self.memory_factor)
@@ -3,3 +3,4 @@ __author__ = 'dankle'
 import slurmrunner
 import shellrunner
 import localqrunner
+import eventrunner
@@ -0,0 +1,271 @@
+import Queue
+import datetime
+import logging
+import os
+import signal
+import subprocess
+import threading
+
+import runner
+import slurmrunner
+from pypedream.profiling import profiler
+from pypedream.pypedreamstatus import PypedreamStatus
+from pypedream.runners.scheduler import JobScheduler
+
+logger = logging.getLogger(__name__)
+
+__author__ = 'dankle'
+
+STOP = "STOP"
+
+
+class Eventrunner(runner.Runner):
+    """
+    A runner that reacts to events instead of sleeping between polls. A backend starts the jobs and reports every
+    status change through a callback. Dependents of a job are released as soon as it completes, and
+    PypedreamPipeline.stop() cancels the running jobs right away.
+
+    Backends implement:
+    * threads: number of cores to schedule on, or None if the backend has its own queue
+    * memory: MB of memory to schedule on, or None
+    * start(notify): called once before any job is submitted. notify(job, status, returncode) is thread safe.
+    * submit(job): start a job, and later call notify with RUNNING and then COMPLETED, FAILED or CANCELLED
+    * notify(None, FAILED) if the backend can't report on its jobs any more, which stops the run
+    * stop_all_jobs(): cancel all jobs that have not finished
+    * close(): called once when the run is over
+    """
+
+    def __init__(self, backend=None, keep_going=False):
+        """
+        :param keep_going: when a job fails, keep starting all jobs that don't depend on it. By default no more jobs
+        are started, and the jobs that are running are waited for.
+        """
+        self.pipeline = None
+        self.keep_going = keep_going
+        self.backend = backend or LocalBackend()
+        self.ordered_jobs = None
+        self._events = Queue.Queue()  # (job, status, returncode), or STOP
+
+    def run(self, pipeline):
+        self.pipeline = pipeline
+        self.ordered_jobs = self.pipeline._get_ordered_jobs_to_run()
+        scheduler = JobScheduler(self.pipeline, self.ordered_jobs, self.backend.threads, self.backend.memory)
+
+        watcher = threading.Thread(target=self._wait_for_stop)
+        watcher.daemon = True
+        watcher.start()
+        self.backend.start(self._notify)
+
+        returncode = 0
+        stopped = False
+        try:
+            while scheduler.has_ready_jobs() or scheduler.running:
+                job = scheduler.next_job() if returncode == 0 or self.keep_going else None
+                while job is not None:
+                    self.backend.submit(job)
+                    job = scheduler.next_job()
+
+                if not scheduler.running:
+                    break
+
+                # wait with a timeout, a blocking get can't be interrupted by Ctrl-C on python 2
+                try:
+                    event = self._events.get(timeout=1)
+                except Queue.Empty:
+                    continue
+                profiler.count("eventrunner.events")
+                if event == STOP:
+                    logger.info("Pipeline stopped, cancelling running jobs.")
+                    self.stop_all_jobs()
+                    stopped = True
+                    break
+
+                job, status, job_returncode = event
+                if job is None:
+                    logger.error("The backend failed, cancelling running jobs.")
+                    self.stop_all_jobs()
+                    returncode = returncode or slurmrunner.exitcode_failed
+                    break
+
+                if status == PypedreamStatus.RUNNING:
+                    job.status = status
+                    if job.starttime is None:
+                        job.starttime = datetime.datetime.now().isoformat()
+                    continue
+
+                if job.endtime is None:
+                    job.endtime = datetime.datetime.now().isoformat()
+                scheduler.job_finished(job, status == PypedreamStatus.COMPLETED)
+                if status == PypedreamStatus.COMPLETED:
+                    job.complete()
+                    self.pipeline._on_job_completed(job)
+                else:
+                    logger.warning("Task {} finished with status {}".format(job.get_name(), status))
+                    job.fail()
+                    job.status = status
+                    if returncode == 0:
+                        returncode = job_returncode or slurmrunner.exitcode_failed
+                    if self.keep_going:
+                        self.cancel_downstream(job, self.ordered_jobs)
+                self.pipeline._write_jobdb()
+        finally:
+            self.backend.close()
+
+        self.pipeline._cleanup()
+        self.pipeline._write_jobdb()
+        if stopped:
+            return slurmrunner.exitcode_cancelled
+        return returncode
+
+    def _notify(self, job, status, returncode=None):
+        self._events.put((job, status, returncode))
+
+    def _wait_for_stop(self):
+        self.pipeline.exit.wait()
+        self._events.put(STOP)
+
+    def stop_all_jobs(self):
+        self.backend.stop_all_jobs()
+        for job in self.ordered_jobs:
+            if job.status in [PypedreamStatus.PENDING, PypedreamStatus.RUNNING]:
+                job.status = PypedreamStatus.CANCELLED
+        self.pipeline._write_jobdb()
+
+    def get_job_status(self, jobid):
+        return self.pipeline._get_job_with_id(jobid).status
+
+
+class LocalBackend(object):
+    """
+    Run jobs as local shell scripts, on at most `threads` cores and `memory` MB. Each job has a thread waiting for
+    its exit.
+    """
+
+    def __init__(self, threads=1, memory=None):
+        self.threads = threads
+        self.memory = memory
+        self.notify = None
+        self.procs = {}
+        self._lock = threading.Lock()
+
+    def start(self, notify):
+        self.notify = notify
+
+    def submit(self, job):
+        logger.debug("Running {} with script {}".format(job.get_name(), job.script))
+        logfile = open(job.log, 'w')
+        # run each job in its own process group, so that stopping it also stops the commands it started
+        proc = subprocess.Popen(["bash", job.script], stdout=logfile, stderr=logfile, preexec_fn=os.setsid)
+        with self._lock:
+            self.procs[job] = proc
+        self.notify(job, PypedreamStatus.RUNNING)
+
+        def wait():
+            returncode = proc.wait()
+            logfile.close()
+            with self._lock:
+                del self.procs[job]
+            if returncode == 0:
+                self.notify(job, PypedreamStatus.COMPLETED, 0)
+            else:
+                self.notify(job, PypedreamStatus.FAILED, returncode)
+
+        waiter = threading.Thread(target=wait)
+        waiter.daemon = True
+        waiter.start()
+
+    def stop_all_jobs(self):
+        with self._lock:
+            procs = self.procs.values()
+        for proc in procs:
+            try:
+                os.killpg(proc.pid, signal.SIGTERM)
+            except OSError:  # already exited
+                pass
+
+    def close(self):
+        pass
+
+
+class SlurmBackend(object):
+    """
+    Submit jobs to slurm when they become ready, and report status changes found by a background thread that polls
+    all unfinished jobs with one squeue/sacct call every `interval` seconds. A poll that fails is tried again at the
+    next interval, and the run is stopped after `max_poll_errors` failed polls in a row.
+    """
+    threads = None  # slurm has its own queue
+    memory = None
+
+    def __init__(self, interval=30, max_poll_errors=3):
+        self.interval = interval
+        self.max_poll_errors = max_poll_errors
+        self.notify = None
+        self.poller = slurmrunner.SlurmPoller()
+        self.jobs = {}  # jobid -> job, for jobs that have not finished
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+
+    def start(self, notify):
+        self.notify = notify
+        slurmrunner.Slurmrunner.check_slurm_version()
+        poll_thread = threading.Thread(target=self._poll_loop)
+        poll_thread.daemon = True
+        poll_thread.start()
+
+    def submit(self, job):
+        cmd = ["sbatch", "--parsable", "-J", job.get_name()] + slurmrunner.resource_options(job) + \
+              ["-o", job.log, job.script]
+        job.jobid = slurmrunner.Slurmrunner._sbatch(cmd)
+        logger.info("Submitted job {} with id {} ".format(job.get_name(), job.jobid))
+        with self._lock:
+            self.jobs[job.jobid] = job
+
+    def _poll_loop(self):
+        errors = 0
+        while not self._closed.wait(self.interval):
+            try:
+                self._poll()
+                errors = 0
+            except Exception:
+                errors += 1
+                logger.exception("Polling slurm failed ({} of {} times in a row)".format(errors, self.max_poll_errors))
+                if errors >= self.max_poll_errors:
+                    self.notify(None, PypedreamStatus.FAILED)
+                    return
+
+    def _poll(self):
+        """
+        Poll the unfinished jobs once and report their status changes
+        """
+        with self._lock:
+            jobs = dict(self.jobs)
+        self.poller.poll(jobs.keys())
+        for jobid, job in jobs.items():
+            d = self.poller.get(jobid)
+            if not d['status']:
+                continue  # not visible in the queue yet
+            status = PypedreamStatus.from_slurm(d['status'])
+            if d['starttime']:
+                job.starttime = d['starttime']
+            if d['endtime']:
+                job.endtime = d['endtime']
+
+            if status == PypedreamStatus.RUNNING and job.status != PypedreamStatus.RUNNING:
+                self.notify(job, status)
+            elif status in [PypedreamStatus.COMPLETED, PypedreamStatus.FAILED, PypedreamStatus.CANCELLED]:
+                with self._lock:
+                    del self.jobs[jobid]
+                self.notify(job, status)
+
+    def stop_all_jobs(self):
+        with self._lock:
+            jobids = self.jobs.keys()
+        if jobids:
+            profiler.count("slurm.subprocess_calls")
+            try:
+                subprocess.check_output(['scancel'] + [str(jobid) for jobid in jobids])
+            except (OSError, subprocess.CalledProcessError):
+                logger.exception("Could not cancel jobs {}".format(", ".join(str(jobid) for jobid in jobids)))
+
+    def close(self):
+        self._closed.set()
@@ -2,11 +2,10 @@ import datetime
 import logging
 import time
 
-from localq.localQ_server import LocalQServer
-from localq.status import Status
-
+from pypedream.profiling import timed
 from pypedream.pypedreamstatus import PypedreamStatus
 from pypedream.runners.runner import Runner
+from pypedream.runners.scheduler import prioritized_order
 
 __author__ = 'dankle'
 
@@ -22,11 +21,17 @@ def check_completed_jobs(jobs):
 
 
 class Localqrunner(Runner):
-    def __init__(self, threads=1):
+    def __init__(self, threads=1, keep_going=True):
+        """
+        :param keep_going: when a job fails, let all jobs that don't depend on it run, which localq does by itself,
+        and mark the ones that do as cancelled. Otherwise all jobs are stopped when a job fails.
+        """
         self.pipeline = None
+        self.keep_going = keep_going
         self.threads = threads
         self.server = None
         self.ordered_jobs = None
+        self._jobs_to_run = None
 
     def run(self, pipeline):
         """
@@ -35,9 +40,14 @@ class Localqrunner(Runner):
         :return:
         """
 
+        # localq depends on networkx, so it's only imported when a pipeline is run with it
+        from localq.localQ_server import LocalQServer
+
         self.pipeline = pipeline
         self.server = LocalQServer(num_cores_available=self.threads, interval=0.1)
-        ordered_jobs_to_run = self.pipeline._get_ordered_jobs_to_run()
+        # localq starts ready jobs in the order they were added, so add the longest critical paths first
+        ordered_jobs_to_run = prioritized_order(self.pipeline, self.pipeline._get_ordered_jobs_to_run())
+        self._jobs_to_run = ordered_jobs_to_run
         self.ordered_jobs = self.pipeline._get_ordered_jobs()
         logging.info("Starting")
         time.sleep(2)
@@ -53,7 +63,7 @@ class Localqrunner(Runner):
                     "Job {} could not be submitted with {} requested cores. {} cores available on the localq server.".format(
                         job.get_name(), job.threads, self.server.num_cores_available))
 
-        self.pipeline._write_jobdb_json()
+        self.pipeline._write_jobdb()
 
         n_pending = len([j for j in self.ordered_jobs if j.status == PypedreamStatus.PENDING])
         n_done = len([j for j in self.ordered_jobs if j.status == PypedreamStatus.COMPLETED])
@@ -101,6 +111,8 @@ class Localqrunner(Runner):
         :param server:
         :return:
         """
+        from localq.status import Status
+
         if self.server.get_runnable_jobs():
             # if there are still jobs that can run, we're not done
             return False
@@ -111,26 +123,40 @@ class Localqrunner(Runner):
             # otherwise, we're done!
             return True
 
+    @timed("localq.update_job_status")
     def update_job_status(self):
+        """
+        Update the jobs from the localq server. Jobs are only completed or failed when their status changes, not
+        again on every poll. Jobs that were cancelled because a job they depend on failed stay cancelled, although
+        localq keeps them pending.
+        """
         for localqjob in self.server.get_ordered_jobs():
             pypedreamjob = self.pipeline._get_job_with_id(localqjob.jobid)
-            pypedreamjob.status = localqjob.status()
-
             if pypedreamjob.starttime is None:
                 pypedreamjob.starttime = localqjob.start_time
             if pypedreamjob.endtime is None:
                 pypedreamjob.endtime = localqjob.end_time
 
+            status = localqjob.status()
+            if status == pypedreamjob.status or pypedreamjob.status == PypedreamStatus.CANCELLED:
+                continue
+            pypedreamjob.status = status
+
             if pypedreamjob.status == PypedreamStatus.COMPLETED:
                 # pypedreamjob.try_remove_files(pypedreamjob.failfiles())
                 # pypedreamjob.touch_files(pypedreamjob.donefiles())
                 pypedreamjob.complete()
+                self.pipeline._on_job_completed(pypedreamjob)
             elif pypedreamjob.status == PypedreamStatus.FAILED:
                 # pypedreamjob.try_remove_files(pypedreamjob.donefiles())
                 # pypedreamjob.touch_files(pypedreamjob.failfiles())
                 pypedreamjob.fail()
+                if self.keep_going:
+                    self.cancel_downstream(pypedreamjob, self._jobs_to_run)
+                else:
+                    self.stop_all_jobs()
 
-        self.pipeline._write_jobdb_json()
+        self.pipeline._write_jobdb()
 
     def get_job_stats(self):
         return [j.info_dict() for j in self.server.graph.nodes()]
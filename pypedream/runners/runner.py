@@ -1,5 +1,8 @@
 import abc
 import json
+import logging
+
+from pypedream.pypedreamstatus import PypedreamStatus
 
 __author__ = 'dankle'
 
@@ -23,3 +26,18 @@ class Runner(object):
     def get_job_status(self, jobid):
         pass
 
+    def cancel_downstream(self, job, jobs):
+        """
+        Mark the pending jobs that depend on a failed job, directly or through other jobs, as cancelled. They can't
+        run in this run, but all other jobs can.
+        :param jobs: the jobs to run
+        :return: the cancelled jobs
+        """
+        cancelled = [j for j in self.pipeline._get_downstream_jobs(job, jobs) if j.status == PypedreamStatus.PENDING]
+        if cancelled:
+            logging.warning("Not running {} job(s) that depend on {}: {}".format(
+                len(cancelled), job.get_name(), ", ".join(j.get_name() for j in cancelled)))
+        for j in cancelled:
+            j.status = PypedreamStatus.CANCELLED
+        return cancelled
+
@@ -0,0 +1,137 @@
+import heapq
+
+__author__ = 'dankle'
+
+
+def critical_path_lengths(pipeline, jobs):
+    """
+    Get the remaining critical path length of each job: its expected runtime plus the longest path of expected
+    runtimes through its dependents among `jobs`. Runtimes come from the previous run in the jobdb, see
+    PypedreamPipeline._get_expected_runtime(). Jobs without history count as the mean known runtime, or 1 if there
+    is none, so that without history the length is the depth of the remaining chain.
+    :param jobs: jobs in topological order
+    :rtype: dict[Job, float]
+    """
+    runtimes = dict((job, pipeline._get_expected_runtime(job)) for job in jobs)
+    known = [r for r in runtimes.values() if r is not None]
+    default = float(sum(known)) / len(known) if known else 1.0
+
+    jobs_to_run = set(jobs)
+    lengths = {}
+    for job in reversed(jobs):
+        dependents = [j for j in pipeline._get_dependents(job) if j in jobs_to_run]
+        runtime = runtimes[job] if runtimes[job] is not None else default
+        lengths[job] = runtime + max([lengths[j] for j in dependents] or [0])
+    return lengths
+
+
+def prioritized_order(pipeline, jobs):
+    """
+    Get a topological order of jobs where, whenever there is a choice, the job with the longest remaining critical
+    path comes first. For runners that hand all jobs to a queue that starts them in submission order.
+    """
+    scheduler = JobScheduler(pipeline, jobs)
+    order = []
+    while scheduler.has_ready_jobs():
+        job = scheduler.next_job()
+        order.append(job)
+        scheduler.job_finished(job, True)
+    return order
+
+
+class JobScheduler(object):
+    """
+    Keeps track of which jobs of a pipeline are ready to run, for runners that decide themselves when to start a job.
+    A job is ready when all its dependencies among the jobs to run have completed. Ready jobs are handed out longest
+    remaining critical path first, then in topological order, as long as their threads and memory fit in what is
+    left of the core and memory budgets. This keeps the longest chain moving instead of finishing the short branches
+    first. When the first job in line doesn't fit, a later ready job that does fit is started instead, so that the
+    budgets stay used, but only max_skips times: after that nothing else starts until the first job fits, so that a
+    large job on the critical path isn't held back for as long as small jobs keep coming.
+    """
+
+    def __init__(self, pipeline, jobs, threads=None, memory=None, max_skips=10):
+        """
+        :param pipeline: the pipeline the jobs belong to
+        :param jobs: the jobs to run, in topological order
+        :param threads: number of cores available, or None for no limit
+        :param memory: MB of memory available, or None for no limit. Jobs without Job.memory count as 0.
+        :param max_skips: how many later jobs may be started ahead of a first job in line that doesn't fit
+        """
+        self.pipeline = pipeline
+        self.threads = threads
+        self.memory = memory
+        self.max_skips = max_skips
+        self._skips = {}  # first job in line -> number of jobs started ahead of it
+        self.cores_used = 0
+        self.memory_used = 0
+        self.running = set()
+        self._n_deps = {}  # job -> number of dependencies that have not completed yet
+        self._dependents = {}
+        self._ready = []  # heap of (-critical path length, topological index, job)
+        self._priority = critical_path_lengths(pipeline, jobs)
+
+        jobs_to_run = set(jobs)
+        for job in jobs:
+            depjobs = [j for j in pipeline._get_dependencies(job) if j in jobs_to_run]
+            self._n_deps[job] = len(depjobs)
+            for depjob in depjobs:
+                self._dependents.setdefault(depjob, []).append(job)
+            if not depjobs:
+                self._push(job)
+
+    def _push(self, job):
+        heapq.heappush(self._ready, (-self._priority[job], self.pipeline._get_job_index(job), job))
+
+    def has_ready_jobs(self):
+        return len(self._ready) > 0
+
+    def _fits(self, job):
+        if self.threads is not None and self.cores_used + job.threads > self.threads:
+            return False
+        if self.memory is not None and self.memory_used + (job.memory or 0) > self.memory:
+            return False
+        return True
+
+    def next_job(self):
+        """
+        Get the ready job with the highest priority that fits in the cores and memory that are left, and mark it as
+        running. A job that needs more than all cores or memory is only handed out when nothing is running.
+        :return: a job, or None if no job can start right now
+        """
+        if not self._ready:
+            return None
+        head = self._ready[0][-1]
+        if self.running and not self._fits(head):
+            if self._skips.get(head, 0) >= self.max_skips:
+                return None
+            fitting = [item for item in self._ready if self._fits(item[-1])]
+            if not fitting:
+                return None
+            item = min(fitting)
+            self._ready.remove(item)
+            heapq.heapify(self._ready)
+            self._skips[head] = self._skips.get(head, 0) + 1
+            job = item[-1]
+        else:
+            job = heapq.heappop(self._ready)[-1]
+            self._skips.pop(job, None)
+        self.running.add(job)
+        self.cores_used += job.threads
+        self.memory_used += job.memory or 0
+        return job
+
+    def job_finished(self, job, completed):
+        """
+        Release the cores and memory of a job. If it completed, dependents that have no other unfinished dependencies become
+        ready.
+        :param completed: True if the job completed, False if it failed or was cancelled
+        """
+        self.running.discard(job)
+        self.cores_used -= job.threads
+        self.memory_used -= job.memory or 0
+        if completed:
+            for dependent in self._dependents.get(job, []):
+                self._n_deps[dependent] -= 1
+                if self._n_deps[dependent] == 0:
+                    self._push(dependent)
@@ -1,5 +1,7 @@
+import Queue
 import logging
 import subprocess
+import threading
 
 import sys
 
@@ -7,7 +9,9 @@ import datetime
 from click import progressbar
 
 import runner
+from pypedream.profiling import timed
 from pypedream.pypedreamstatus import PypedreamStatus
+from pypedream.runners.scheduler import JobScheduler
 
 __author__ = 'dankle'
 
@@ -20,49 +24,91 @@ def get_job_name(job):
 
 
 class Shellrunner(runner.Runner):
-    def __init__(self):
+    def __init__(self, threads=1, memory=None, keep_going=False):
+        """
+        Run jobs as local shell scripts.
+        :param threads: number of cores to use. Jobs whose dependencies are done are started as long as the sum of
+        their Job.threads fits. A job that needs more than all cores runs when nothing else is running.
+        :param memory: MB of memory to use, or None for no limit. Jobs are only started if the sum of their
+        Job.memory fits as well.
+        :param keep_going: when a job fails, keep starting all jobs that don't depend on it. By default no more jobs
+        are started, and the jobs that are running are waited for.
+        """
         self.pipeline = None
+        self.threads = threads
+        self.memory = memory
+        self.keep_going = keep_going
 
     def run(self, pipeline):
         """
         Run the submitted pipeline
         :param pipeline:
-        :return: True if no errors occurred, False otherwise
+        :return: 0 if no errors occurred, the exit code of the first failed job otherwise
         """
         self.pipeline = pipeline
         ordered_jobs = self.pipeline._get_ordered_jobs_to_run()
+        scheduler = JobScheduler(self.pipeline, ordered_jobs, self.threads, self.memory)
+
+        running = {}  # job -> logfile
+        finished = Queue.Queue()  # (job, returncode) of jobs that exited
+        returncode = 0
+
+        with progressbar(length=len(ordered_jobs), item_show_func=get_job_name) as bar:
+            while scheduler.has_ready_jobs() or running:
+                # start as many ready jobs as fit. Stop starting jobs after a failure, unless keeping going.
+                job = scheduler.next_job() if returncode == 0 or self.keep_going else None
+                while job is not None:
+                    running[job] = self._start(job, finished)
+                    job = scheduler.next_job()
+
+                if not running:
+                    break
+
+                job, job_returncode = finished.get()
+                logfile = running.pop(job)
+                logfile.close()
+                job.endtime = datetime.datetime.now().isoformat()
+                scheduler.job_finished(job, job_returncode == 0)
 
-        # ordered_jobs = pipeline._get_ordered_jobs()
-        with progressbar(ordered_jobs, item_show_func=get_job_name) as bar:
-            for job in bar:
-                logging.debug("Running {} with script {}".format(job.get_name(), job.script))
-                cmd = ["bash", job.script]
-                logfile = open(job.log, 'w')
-                logging.debug("writing to log {}".format(job.log))
-                job.status = PypedreamStatus.RUNNING
-                job.starttime = datetime.datetime.now().isoformat()
-                proc = None
-                try:
-                    proc = subprocess.check_call(cmd, stdout=logfile, stderr=logfile)
-                    job.endtime = datetime.datetime.now().isoformat()
+                if job_returncode == 0:
                     job.complete()
-                except subprocess.CalledProcessError as err:
-                    job.endtime = datetime.datetime.now().isoformat()
+                    self.pipeline._on_job_completed(job)
+                else:
                     job.fail()
-                    self.pipeline._write_jobdb_json()
-                    logfile.flush()
                     with open(job.log, 'r') as logf:
-                        logging.warning("Task {} failed with exit code {}".format(job.get_name(),
-                                                                                  err.returncode))
+                        logging.warning("Task {} failed with exit code {}".format(job.get_name(), job_returncode))
                         logging.warning("Contents of " + job.log + ":")
                         logging.warning(logf.read())
-                    return err.returncode
+                    if returncode == 0:
+                        returncode = job_returncode
+                    if self.keep_going:
+                        bar.update(len(self.cancel_downstream(job, ordered_jobs)))
 
-                self.pipeline._cleanup()
-                self.pipeline._write_jobdb_json()
-                logfile.close()
+                self.pipeline._write_jobdb()
+                bar.current_item = job
+                bar.update(1)
+
+        return returncode
+
+    @staticmethod
+    @timed("shellrunner.start_job")
+    def _start(job, finished):
+        """
+        Start the script of a job and put (job, returncode) on the finished queue when it exits
+        :return: the open log file of the job
+        """
+        logging.debug("Running {} with script {}".format(job.get_name(), job.script))
+        cmd = ["bash", job.script]
+        logfile = open(job.log, 'w')
+        logging.debug("writing to log {}".format(job.log))
+        job.status = PypedreamStatus.RUNNING
+        job.starttime = datetime.datetime.now().isoformat()
+        proc = subprocess.Popen(cmd, stdout=logfile, stderr=logfile)
 
-        return 0
+        waiter = threading.Thread(target=lambda: finished.put((job, proc.wait())))
+        waiter.daemon = True
+        waiter.start()
+        return logfile
 
     def get_job_status(self, jobid):
         return self.pipeline._get_job_with_id(jobid).status
@@ -1,8 +1,11 @@
-import re
+import os
 import subprocess
 import time
+import uuid
 
 import runner
+from pypedream.fusion import FusedJob
+from pypedream.profiling import profiler, timed
 from pypedream.pypedreamstatus import PypedreamStatus
 
 import logging
@@ -18,80 +21,76 @@ exitcode_failed = 100002
 exitcode_completed = 0
 
 
+def resource_options(job):
+    """
+    Get the sbatch options that request the cores, walltime, memory and local disk of a job
+    :type job: Job
+    :rtype: list[str]
+    """
+    options = ["-t", job.walltime or walltime, "-n", str(job.threads)]
+    if job.memory:
+        options += ["--mem={}M".format(int(job.memory))]
+    if job.disk:
+        options += ["--tmp={}M".format(int(job.disk))]
+    return options
+
+
 class Slurmrunner(runner.Runner):
-    def __init__(self, interval=30):
+    def __init__(self, interval=30, job_arrays=False, reattach=True, keep_going=True):
         """
         Run jobs on a slurm cluster.
+        :param interval: seconds between polls of the slurm queue
+        :param job_arrays: submit jobs of the same tool, with the same resource requests and the same dependencies,
+        as one slurm job array
+        :param reattach: take over the jobs of a previous run of the pipeline that ended without cancelling them,
+        such as when the driver was killed, if they are still queued or running or have completed since, instead of
+        submitting them again. The job ids come from the jobdb, so this needs one.
+        :param keep_going: when a job fails, let all jobs that don't depend on it run. The jobs that depend on it are
+        cancelled right away. All jobs are submitted up front, so this is the default. Otherwise all jobs that have
+        not finished are cancelled when a job fails.
         """
         self.pipeline = None
         self.ordered_jobs = None
         self.interval = interval
+        self.job_arrays = job_arrays
+        self.reattach = reattach
+        self.keep_going = keep_going
+        self.poller = SlurmPoller()
 
     def run(self, pipeline):
         self.pipeline = pipeline
         self.check_slurm_version()
         self.ordered_jobs = pipeline._get_ordered_jobs_to_run()
+        self._jobs_to_run = set(self.ordered_jobs)
+        adopted = self._reattach() if self.reattach else set()
+        jobs_to_submit = [job for job in self.ordered_jobs if job not in adopted]
 
-        # try:
-        for job in self.ordered_jobs:
-            depjobs = self.pipeline._get_dependencies(job)
-            depjobids = [j.jobid for j in depjobs if j in self.ordered_jobs]
-            if depjobids and depjobids is not []:
-                depstring = "--dependency=afterok:" + ":".join(
-                    str(j) for j in depjobids)  # join job ids and stringify
+        if self.job_arrays:
+            groups = self._get_array_groups(jobs_to_submit)
+        else:
+            groups = dict((job, [job]) for job in jobs_to_submit)
+
+        # jobs in a group share their dependencies, so the whole group can be submitted when its first job comes up
+        submitted = set()
+        for job in jobs_to_submit:
+            if job in submitted:
+                continue
+            group = groups[job]
+            if len(group) > 1:
+                self.submit_array(group)
             else:
-                depstring = ""
-            cmd = ["sbatch"]
-            cmd = cmd + ["-J", job.get_name()]
-            cmd = cmd + ["-t", walltime]
-            cmd = cmd + ["-n", str(job.threads)]
-            cmd = cmd + ["-o", job.log]
-            cmd = cmd + [depstring]
-            cmd = cmd + [job.script]
-            cmd = filter(None, cmd)  # removes empty elements from the list
-
-            logger.debug("Submitting job with command: {}".format(cmd))
-            p = subprocess.Popen(cmd, stdout=subprocess.PIPE)
-            msg = p.stdout.read()
-            m = re.search("\d+", msg)
-            jobid = m.group()
-            logger.info("Submitted job {} with id {} ".format(job.get_name(), jobid))
-            job.jobid = jobid
-
-        self.pipeline._write_jobdb_json()
+                self.submit(job)
+            submitted.update(group)
+
+        self.pipeline._write_jobdb()
+        self.poll()
 
         while not self.is_done() and not self.pipeline.exit.is_set():
             logger.debug("Sleeping for {} seconds".format(self.interval))
             time.sleep(self.interval)
-
-            for job in self.ordered_jobs:
-
-                # Get start and end time for the job from slurm
-                if job.starttime is None or job.endtime is None:
-                    logger.debug("Getting start and end time from slurm accounting for job with id {}".format(job.jobid))
-                    d = Slurmrunner._get_start_and_endtime(job.jobid)
-                    if d['starttime'] or d['endtime']:
-                        logger.debug(
-                            "Success. Setting start and times to {} and {}".format(
-                                d['starttime'], d['endtime']
-                            ))
-                        if d['starttime']:
-                            job.starttime = d['starttime']
-                        if d['endtime']:
-                            job.endtime = d['endtime']
-                    else:
-                        logger.debug("Failed to get start and end times from slurm accounting.")
-
-                if job.status != PypedreamStatus.COMPLETED and job.status != PypedreamStatus.FAILED:
-                    job.status = self.get_job_status(job.jobid)
-                    if job.status == PypedreamStatus.COMPLETED:
-                        logger.debug("Setting status for job {} to COMPLETED".format(job.jobid))
-                        job.complete()
-                    elif job.status == PypedreamStatus.FAILED:
-                        logger.debug("Setting status for job {} to FAILED".format(job.jobid))
-                        job.fail()
-
-            self.pipeline._write_jobdb_json()
+            self.poll()
+            self._update_statuses()
+            self.pipeline._write_jobdb()
 
             # self.pipeline._cleanup()
 
@@ -107,9 +106,244 @@ class Slurmrunner(runner.Runner):
         elif d[PypedreamStatus.FAILED] > 0:
             exitcode = exitcode_cancelled
 
-        self.pipeline._write_jobdb_json()
+        self.pipeline._write_jobdb()
         return exitcode
 
+    @timed("slurm.reattach")
+    def _reattach(self):
+        """
+        Take over the jobs of the previous run that are still pending or running in slurm, or that have completed
+        and whose outputs exist. All job ids from the previous run are queried with one poll. A pending job that
+        depends on a job that is submitted again would wait forever, so it is cancelled and submitted again too.
+        :return: the adopted jobs
+        :rtype: set[Job]
+        """
+        previous = [(job, self.pipeline._get_previous_jobid(job)) for job in self.ordered_jobs]
+        previous = dict((job, jobid) for job, jobid in previous if jobid is not None)
+        if not previous:
+            return set()
+        self.poller.poll(previous.values())
+
+        adopted = set()
+        jobs_to_cancel = []
+        for job in self.ordered_jobs:  # in topological order, so dependencies are decided first
+            jobid = previous.get(job)
+            if jobid is None:
+                continue
+            status = self.get_job_status(jobid)
+            if status == PypedreamStatus.COMPLETED:
+                adopt = all(os.path.exists(f) for f in job.get_outputs())
+            elif status == PypedreamStatus.RUNNING:
+                adopt = True
+            elif status == PypedreamStatus.PENDING:
+                depjobs = [j for j in self.pipeline._get_dependencies(job) if j in self._jobs_to_run]
+                adopt = all(j in adopted for j in depjobs)
+                if not adopt:
+                    jobs_to_cancel.append(str(jobid))
+            else:
+                adopt = False
+
+            if adopt:
+                logger.info("Reattaching to job {} with id {}, it is {}".format(job.get_name(), jobid, status))
+                job.jobid = jobid
+                adopted.add(job)
+
+        if jobs_to_cancel:
+            profiler.count("slurm.subprocess_calls")
+            subprocess.check_output(['scancel'] + jobs_to_cancel)
+        return adopted
+
+    @timed("slurm.update_statuses")
+    def _update_statuses(self):
+        """
+        Update the status and times of the jobs from the status cache, and complete or fail jobs that finished
+        """
+        for job in self.ordered_jobs:
+            # Get start and end time for the job from the status cache
+            if job.starttime is None or job.endtime is None:
+                d = self.poller.get(job.jobid)
+                if d['starttime']:
+                    job.starttime = d['starttime']
+                if d['endtime']:
+                    job.endtime = d['endtime']
+
+            if job.status not in [PypedreamStatus.COMPLETED, PypedreamStatus.FAILED, PypedreamStatus.CANCELLED]:
+                job.status = self.get_job_status(job.jobid)
+                if job.status == PypedreamStatus.COMPLETED:
+                    logger.debug("Setting status for job {} to COMPLETED".format(job.jobid))
+                    job.complete()
+                    self.pipeline._on_job_completed(job)
+                elif job.status == PypedreamStatus.FAILED:
+                    if self._retry(job):
+                        continue
+                    logger.debug("Setting status for job {} to FAILED".format(job.jobid))
+                    job.fail()
+                    self._on_job_failed(job)
+
+    def _on_job_failed(self, job):
+        """
+        Cancel the jobs that depend on a failed job, or all jobs that have not finished unless keeping going
+        """
+        if not self.keep_going:
+            logger.info("Job {} failed, cancelling all jobs that have not finished".format(job.get_name()))
+            self.stop_all_jobs()
+            return
+        jobids = [str(j.jobid) for j in self.cancel_downstream(job, self.ordered_jobs) if j.jobid is not None]
+        if jobids:
+            profiler.count("slurm.subprocess_calls")
+            subprocess.check_output(['scancel'] + jobids)
+
+    def _retry(self, job):
+        """
+        Submit a failed job again if its retry policy allows it, held for the backoff delay of the policy
+        :return: True if the job was submitted again
+        """
+        policy = job.retry_policy
+        if policy is None:
+            return False
+        state = (self.poller.get(job.jobid)['status'] or "").split(" ")[0]
+        attempt = len(job.attempts or []) + 1
+        if not policy.retries(job, state, attempt):
+            return False
+
+        job.attempts = (job.attempts or []) + [{'jobid': job.jobid, 'state': state,
+                                                'starttime': job.starttime, 'endtime': job.endtime}]
+        policy.escalate(job, state, walltime)
+        delay = policy.delay(attempt)
+        logger.warning("Job {} with id {} ended in {}, submitting it again in {} seconds (attempt {} of {})".format(
+            job.get_name(), job.jobid, state, delay, attempt + 1, policy.max_attempts))
+        profiler.count("slurm.retries")
+        self._resubmit(job, delay)
+        return True
+
+    def _resubmit(self, job, delay=None):
+        """
+        Submit a job again, and point the jobs that depend on it at the new job id. Dependents that are still
+        pending are updated with scontrol. Dependents that slurm has cancelled because the dependency failed are
+        submitted again themselves.
+        :param delay: seconds to hold the job before it can start
+        """
+        job.status = PypedreamStatus.PENDING
+        if isinstance(job, FusedJob):
+            # the fused job skips members that completed, the others run again
+            for member in job.members:
+                if member.status != PypedreamStatus.COMPLETED:
+                    member.status = PypedreamStatus.PENDING
+        job.starttime = None
+        job.endtime = None
+        self.submit(job, begin=delay)
+        self.poller.submitted(job.jobid)
+
+        for dependent in self.pipeline._get_dependents(job):
+            if dependent not in self._jobs_to_run:
+                continue
+            status = self.get_job_status(dependent.jobid)
+            if status == PypedreamStatus.PENDING:
+                cmd = ["scontrol", "update", "JobId={}".format(dependent.jobid),
+                       "Dependency=afterok:" + ":".join(str(j) for j in self._get_dependency_ids(dependent))]
+                logger.debug("Updating dependencies with command: {}".format(cmd))
+                profiler.count("slurm.subprocess_calls")
+                subprocess.check_output(cmd)
+            elif status in [PypedreamStatus.CANCELLED, PypedreamStatus.NOT_FOUND]:
+                self._resubmit(dependent)
+
+    def submit(self, job, begin=None):
+        """
+        Submit a single job with sbatch
+        :type job: Job
+        :param begin: seconds to hold the job before it can start, or None
+        """
+        cmd = ["sbatch", "--parsable"]
+        cmd = cmd + ["-J", job.get_name()]
+        cmd = cmd + resource_options(job)
+        cmd = cmd + ["-o", job.log]
+        cmd = cmd + [self._get_dependency_string(job)]
+        if begin:
+            cmd = cmd + ["--begin=now+{}".format(int(begin))]
+        cmd = cmd + [job.script]
+
+        jobid = self._sbatch(cmd)
+        logger.info("Submitted job {} with id {} ".format(job.get_name(), jobid))
+        job.jobid = jobid
+
+    def submit_array(self, jobs):
+        """
+        Submit jobs with the same tool, resource requests and dependencies as one job array. Task i of the array runs the script
+        of jobs[i] and writes to its log, and jobs[i] gets the job id <array job id>_<i>.
+        :type jobs: list[Job]
+        """
+        first = jobs[0]
+        script = "{dir}/{name}__array__{uuid}.sh".format(dir=self.pipeline.scriptdir,
+                                                         name=first.get_name().replace("/", "_"),
+                                                         uuid=uuid.uuid4())
+        with open(script, 'w') as f:
+            f.write("#!/usr/bin/env bash\n")
+            f.write("\n")
+            f.write("case $SLURM_ARRAY_TASK_ID in\n")
+            for idx, job in enumerate(jobs):
+                f.write("    {}) exec bash {} > {} 2>&1 ;;\n".format(idx, job.script, job.log))
+            f.write("    *) echo \"Unknown array task id $SLURM_ARRAY_TASK_ID\" >&2; exit 1 ;;\n")
+            f.write("esac\n")
+
+        cmd = ["sbatch", "--parsable"]
+        cmd = cmd + ["-J", first.get_name()]
+        cmd = cmd + resource_options(first)
+        cmd = cmd + ["-o", "/dev/null"]
+        cmd = cmd + ["--array=0-{}".format(len(jobs) - 1)]
+        cmd = cmd + [self._get_dependency_string(first)]
+        cmd = cmd + [script]
+
+        arrayid = self._sbatch(cmd)
+        logger.info("Submitted {} jobs as job array {} ".format(len(jobs), arrayid))
+        for idx, job in enumerate(jobs):
+            job.jobid = "{}_{}".format(arrayid, idx)
+
+    def _get_dependency_ids(self, job):
+        """
+        Get the job ids of the dependencies of a job that have not completed
+        """
+        depjobs = self.pipeline._get_dependencies(job)
+        # adopted jobs that have completed may be gone from slurm, and then can't be depended on
+        return [j.jobid for j in depjobs if j in self._jobs_to_run and
+                self.get_job_status(j.jobid) != PypedreamStatus.COMPLETED]
+
+    def _get_dependency_string(self, job):
+        depjobids = self._get_dependency_ids(job)
+        if depjobids:
+            return "--dependency=afterok:" + ":".join(str(j) for j in depjobids)  # join job ids and stringify
+        else:
+            return ""
+
+    @staticmethod
+    def _sbatch(cmd):
+        """
+        Run sbatch --parsable and return the job id. The output is "<jobid>" or "<jobid>;<cluster>".
+        """
+        cmd = filter(None, cmd)  # removes empty elements from the list
+        logger.debug("Submitting job with command: {}".format(cmd))
+        profiler.count("slurm.subprocess_calls")
+        msg = subprocess.check_output(cmd)
+        return msg.strip().split(";")[0]
+
+    def _get_array_groups(self, jobs=None):
+        """
+        Group the jobs to run by tool, resource requests and dependencies. Jobs in the same group can run as one job array.
+        :param jobs: the jobs to group, in topological order, by default all jobs to run
+        :return: dict mapping each job to the list of jobs in its group, in topological order
+        :rtype: dict[Job, list[Job]]
+        """
+        groups = {}
+        for job in self.ordered_jobs if jobs is None else jobs:
+            depjobs = frozenset(j for j in self.pipeline._get_dependencies(job) if j in self._jobs_to_run)
+            key = (job.__class__, tuple(resource_options(job)), depjobs)
+            groups.setdefault(key, []).append(job)
+
+        job_to_group = {}
+        for group in groups.values():
+            for job in group:
+                job_to_group[job] = group
+        return job_to_group
+
     def get_job_status_dict(self, fractions=False):
         """
         Get a dictionary with number or fraction of jobs for each status
@@ -129,32 +363,36 @@ class Slurmrunner(runner.Runner):
                     d[st] = 0
         return d
 
+    def poll(self):
+        """
+        Refresh the status cache for all jobs that are not yet finished, or that are still missing a start or end
+        time, with a single squeue (and sacct) call.
+        """
+        jobids = [job.jobid for job in self.ordered_jobs
+                  if job.status not in [PypedreamStatus.COMPLETED, PypedreamStatus.FAILED] or
+                  job.starttime is None or job.endtime is None]
+        self.poller.poll(jobids)
+
     def stop_all_jobs(self):
+        jobs_to_cancel = []
         for job in self.ordered_jobs:
             if self.get_job_status(job.jobid) == PypedreamStatus.RUNNING or \
                             self.get_job_status(job.jobid) == PypedreamStatus.PENDING:
                 job.fail()
                 job.status = PypedreamStatus.CANCELLED
-                subprocess.check_output(['scancel', str(job.jobid)])
-        self.pipeline._write_jobdb_json()
+                jobs_to_cancel.append(str(job.jobid))
+        if jobs_to_cancel:
+            profiler.count("slurm.subprocess_calls")
+            subprocess.check_output(['scancel'] + jobs_to_cancel)
+        self.pipeline._write_jobdb()
 
     def get_job_status(self, jobid):
         """
-        Get the status of a job.
-
-        Notes
-        * Jobs might not be in accounting when they are pending
-        * Jobs might be PENDING in accounting while they are RUNNING in the queue
-
-        therefore, first check the queue. If the job is there, use its status.
-        If it's not, check in accounting
+        Get the status of a job from the status cache, as of the last poll.
         """
+        status_str = self.poller.get(jobid)['status']
 
-        status_str = Slurmrunner._get_job_status_from_squeue(jobid)
-        if not status_str:
-            status_str = Slurmrunner._get_job_status_from_sacct(jobid)
-
-        # if we still don't have a status, use NOT_FOUND
+        # if we don't have a status, use NOT_FOUND
         if not status_str:
             return PypedreamStatus.NOT_FOUND
 
@@ -172,7 +410,7 @@ class Slurmrunner(runner.Runner):
         ready_jobs = []
         for job in pending_jobs:
             depjobs = self.pipeline._get_dependencies(job)
-            depjobids = [j.jobid for j in depjobs if j in self.ordered_jobs]
+            depjobids = [j.jobid for j in depjobs if j in self._jobs_to_run]
 
             # if there are no dependencies, the job is always ready
             if not depjobids:
@@ -203,103 +441,116 @@ class Slurmrunner(runner.Runner):
             return True
 
     @staticmethod
-    def _get_job_status_from_squeue(jobid):
-        """
-        Try to get job status string from the queue. If it's not found, return None
-        """
-        # '(null)|(null)|1|0|2016-04-11T07:50:01|(null)|vagrant|unknwn|43|sleep.sh|(null)|UNLIMITED|0||/vagrant/sleep.sh|0.99998473585583|(null)|None||CD|vagrant|(null)|(null)||0|*:*:*|43 |fairbanksdev |1 |1 | |43 |1000 |* |* |* |N/A |UNLIMITED |0:05 |fairbanksdev |0 |core |4294901736 |fairbanksdev |2016-04-11T07:49:56 |COMPLETED |1000 |2016-04-11T07:49:56 |(null) |N/A |(null) |/home/vagrant \n'
-        # squeue -j 42 --noheader -t all -o %all
-        status = None
-
-        short2long = {"PD": "PENDING",
-                      "R": "RUNNING",
-                      "S": "SUSPENDED",
-                      "ST": "STOPPED",
-                      "CG": "COMPLETING",
-                      "CD": "COMPLETED",
-                      "CF": "CONFIGURING",
-                      "CA": "CANCELLED",
-                      "F": "FAILED",
-                      "TO": "TIMEOUT",
-                      "PR": "PREEMPTED",
-                      "BF": "BOOT_FAIL",
-                      "NF": "NODE_FAIL",
-                      "SE": "SPECIAL_EXIT"
-                      }
-
+    def check_slurm_version():
+        cmd = ["sbatch", "--version"]
+        profiler.count("slurm.subprocess_calls")
         try:
-            cmd = ['squeue', '-j', str(jobid), '--noheader', '-t', 'all', '-o', '%t']
-            stdout = subprocess.check_output(cmd, stderr=open("/dev/null", "w"))
-            short_status = stdout.strip()
-            if short_status in short2long:
-                status = short2long[short_status]
+            p = subprocess.Popen(cmd, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
+            msg = p.communicate()
+            logging.debug("Found Slurm: {}".format(msg))
+        except OSError:
+            raise OSError("SLURM (sbatch) not found in system path. Quitting")
 
-        except subprocess.CalledProcessError:
-            pass
 
-        return status
+class SlurmPoller(object):
+    """
+    Keeps the state, start time and end time of slurm jobs. The cache is refreshed by poll(), which queries all given
+    job ids with one squeue call, and one sacct call for the jobs that are no longer in the queue.
 
-    @staticmethod
-    def _get_job_status_from_sacct(jobid):
+    Notes
+    * Jobs might not be in accounting when they are pending
+    * Jobs might be PENDING in accounting while they are RUNNING in the queue
+
+    therefore, the queue is checked first. If a job is not there, accounting is used.
+    """
+
+    invalid_times = ['Unknown', 'N/A', 'NONE', 'None', '']
+
+    def __init__(self):
+        self.cache = {}  # jobid -> {'status': <slurm state> or None, 'starttime': str or None, 'endtime': str or None}
+
+    def get(self, jobid):
         """
-        Get job status string from accounting
+        Get the cached state of a job, {'status': <slurm state string> or None, 'starttime': str or None,
+        'endtime': str or None}
         """
-        cmd = ['sacct', '-j', str(jobid), '-b', '-P', '--noheader']
-        try:
-            stdout = subprocess.check_output(cmd)
-        except subprocess.CalledProcessError:
-            return None
-        status = None
-        if stdout != '':
-            jobid_ret, status, exitcode = stdout.strip().split("|")
+        return self.cache.get(str(jobid), {'status': None, 'starttime': None, 'endtime': None})
 
-        return status
+    def submitted(self, jobid):
+        """
+        Record a job that was just submitted as pending, until the next poll
+        """
+        self.cache[str(jobid)] = {'status': "PENDING", 'starttime': None, 'endtime': None}
 
-    @staticmethod
-    def _get_start_and_endtime(jobid):
-        """Get start and end times from accounting, returns a dict
-        {'jobid': jobid or none if not found in accounting,
-         'starttime': <datetime obj> or None,
-         'endtime': <datetime obj> or None}
+    @timed("slurm.poll")
+    def poll(self, jobids):
         """
-        cmd = ['sacct', '-j', str(jobid), '-P', '--noheader', '-o', "JobID,Start,End"]
-        try:
-            stdout = subprocess.check_output(cmd).strip()
-        except subprocess.CalledProcessError:
-            logger.error("Error running command: {}".format(" ".join(cmd)))
+        Refresh the cache for the given job ids
+        """
+        # imported here, the pipeline module imports this one
+        from pypedream.pipeline.pypedreampipeline import uniq
 
-        d = {'jobid': jobid,
-             'starttime': None,
-             'endtime': None}
-
-        if stdout == '':
-            try:
-                # squeue -j 633 -t all -o '%A|%S|%e'
-                squeue_cmd = ['squeue', '-j', str(jobid), '-t', 'all', '--noheader', '-o', "'%A|%S|%e'"]
-                stdout = subprocess.check_output(squeue_cmd).strip()
-                logger.debug("Squeue command was: {}".format(" ".join(squeue_cmd)))
-                logger.debug("data from squeue: {}".format(stdout))
-            except subprocess.CalledProcessError:
-                logger.error("Error running command: {}".format(" ".join(squeue_cmd)))
-
-        jobid_ret, starttime_str, endtime_str = stdout.strip().split("|")
-        invalid_times = ['Unknown', 'N/A', 'NONE']
-        if starttime_str in invalid_times:
-            starttime_str = None
-        if endtime_str in invalid_times:
-            endtime_str = None
-        d['starttime'] = starttime_str
-        d['endtime'] = endtime_str
+        jobids = uniq([str(jobid) for jobid in jobids if jobid is not None])
+        if not jobids:
+            return
 
-        return d
+        found = self._poll_squeue(jobids)
+        missing = [jobid for jobid in jobids if jobid not in found]
+        if missing:
+            found.update(self._poll_sacct(missing))
 
-    @staticmethod
-    def check_slurm_version():
-        cmd = ["sbatch", "--version"]
+        self.cache.update(found)
+
+    def _poll_squeue(self, jobids):
+        # squeue -j 633,634 -t all -r --noheader -o '%i|%T|%S|%e'
+        cmd = ['squeue', '-j', ",".join(jobids), '--noheader', '-t', 'all', '-r', '-o', '%i|%T|%S|%e']
+        profiler.count("slurm.subprocess_calls")
         try:
-            p = subprocess.Popen(cmd, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
-            msg = p.communicate()
-            logging.debug("Found Slurm: {}".format(msg))
-        except OSError:
-            raise OSError("SLURM (sbatch) not found in system path. Quitting")
+            stdout = subprocess.check_output(cmd, stderr=open("/dev/null", "w"))
+        except subprocess.CalledProcessError:
+            logger.debug("Error running command: {}".format(" ".join(cmd)))
+            return {}
+
+        found = {}
+        for line in stdout.splitlines():
+            fields = line.strip().split("|")
+            if len(fields) != 4:
+                continue
+            jobid, status, starttime, endtime = fields
+            pypedream_status = PypedreamStatus.from_slurm(status)
+            # squeue reports the expected start time for pending jobs and the time limit for running ones
+            if pypedream_status == PypedreamStatus.PENDING:
+                starttime = None
+            if pypedream_status in [PypedreamStatus.PENDING, PypedreamStatus.RUNNING]:
+                endtime = None
+            found[jobid] = {'status': status,
+                            'starttime': self._parse_time(starttime),
+                            'endtime': self._parse_time(endtime)}
+        return found
+
+    def _poll_sacct(self, jobids):
+        # sacct -j 633,634 -X -P --noheader -o JobID,State,Start,End
+        cmd = ['sacct', '-j', ",".join(jobids), '-X', '-P', '--noheader', '-o', "JobID,State,Start,End"]
+        profiler.count("slurm.subprocess_calls")
+        try:
+            stdout = subprocess.check_output(cmd)
+        except subprocess.CalledProcessError:
+            logger.error("Error running command: {}".format(" ".join(cmd)))
+            return {}
+
+        found = {}
+        for line in stdout.splitlines():
+            fields = line.strip().split("|")
+            if len(fields) != 4:
+                continue
+            jobid, status, starttime, endtime = fields
+            found[jobid] = {'status': status.split(" ")[0],  # e.g. "CANCELLED by 1000"
+                            'starttime': self._parse_time(starttime),
+                            'endtime': self._parse_time(endtime)}
+        return found
 
+    @staticmethod
+    def _parse_time(time_str):
+        if time_str is None or time_str.strip() in SlurmPoller.invalid_times:
+            return None
+        return time_str.strip()
@@ -0,0 +1,213 @@
+"""
+A local stand-in for the slurm command line tools, used by the tests and benchmarks.
+
+Jobs are kept in $FAKESLURM_DIR/jobs.json as
+{"<jobid>": {"state": "RUNNING", "start": "2016-04-11T07:49:56", "end": "Unknown", "in_queue": true}}
+and every call is appended to $FAKESLURM_DIR/calls.log, one line per call.
+
+By default jobs stay in the state they were given, and tests change jobs.json themselves. If
+$FAKESLURM_QUEUE_DELAY or $FAKESLURM_RUNTIME is set (in seconds), submitted jobs are simulated instead: a job starts
+running when it has been queued for the delay, any --begin hold has passed and its dependencies have completed, and
+completes after the runtime. The scripts are not run.
+
+Calls that change jobs.json hold a lock on $FAKESLURM_DIR/lock, so that calls made at the same time don't lose each
+other's updates.
+"""
+import contextlib
+import fcntl
+import json
+import os
+import sys
+import time
+
+
+def state_dir():
+    return os.environ["FAKESLURM_DIR"]
+
+
+def load_jobs():
+    path = os.path.join(state_dir(), "jobs.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_jobs(jobs):
+    path = os.path.join(state_dir(), "jobs.json")
+    with open(path + ".tmp", 'w') as f:
+        json.dump(jobs, f)
+    os.rename(path + ".tmp", path)
+
+
+@contextlib.contextmanager
+def locked_jobs():
+    """
+    Load the jobs, and save them again at the end of the with block, holding the lock for the whole update. Nothing
+    is saved if the block raises.
+    """
+    with open(os.path.join(state_dir(), "lock"), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            jobs = load_jobs()
+            yield jobs
+            save_jobs(jobs)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def log_call(argv):
+    with open(os.path.join(state_dir(), "calls.log"), 'a') as f:
+        f.write(" ".join(argv) + "\n")
+
+
+def get_opt(argv, names, default=None):
+    for i, arg in enumerate(argv):
+        if arg in names and i + 1 < len(argv):
+            return argv[i + 1]
+        for name in names:
+            if name.startswith("--") and arg.startswith(name + "="):
+                return arg[len(name) + 1:]
+    return default
+
+
+def simulation():
+    """
+    :return: (queue delay, runtime) in seconds, or None if jobs are not simulated
+    """
+    delay = os.environ.get("FAKESLURM_QUEUE_DELAY")
+    runtime = os.environ.get("FAKESLURM_RUNTIME")
+    if delay is None and runtime is None:
+        return None
+    return float(delay or 0), float(runtime or 0)
+
+
+def format_time(t):
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(t))
+
+
+def simulate(jobs):
+    """
+    Move simulated jobs along to where they would be now. Jobs are visited in submission order, so dependencies
+    are updated before the jobs that depend on them.
+    """
+    sim = simulation()
+    if sim is None:
+        return
+    delay, runtime = sim
+    now = time.time()
+    for jobid in sorted((j for j in jobs if "submitted" in jobs[j]), key=lambda j: jobs[j]["submitted"]):
+        job = jobs[jobid]
+        if job["state"] == "PENDING":
+            deps = [d for d in job.get("dependency", "").replace("afterok:", "").split(":") if d]
+            if any(jobs.get(d, {}).get("state") != "COMPLETED" for d in deps):
+                continue
+            ready = max([job["submitted"] + delay, job.get("begin", 0)] + [jobs[d]["ended"] for d in deps])
+            if now < ready:
+                continue
+            job.update({"state": "RUNNING", "started": ready, "start": format_time(ready)})
+        if job["state"] == "RUNNING" and now >= job["started"] + runtime:
+            end = job["started"] + runtime
+            job.update({"state": "COMPLETED", "ended": end, "end": format_time(end), "in_queue": False})
+
+
+def squeue(argv):
+    log_call(["squeue"] + argv)
+    with locked_jobs() as jobs:
+        simulate(jobs)
+    jobids = get_opt(argv, ["-j", "--jobs"], ",".join(jobs.keys())).split(",")
+    fmt = get_opt(argv, ["-o", "--format"], "%i|%T")
+    lines = []
+    for jobid in jobids:
+        job = jobs.get(jobid)
+        if job is not None and job.get("in_queue", True):
+            line = fmt.replace("%i", jobid).replace("%T", job["state"])
+            line = line.replace("%S", job.get("start", "N/A")).replace("%e", job.get("end", "N/A"))
+            lines.append(line)
+
+    if len(jobids) == 1 and not lines:
+        sys.stderr.write("slurm_load_jobs error: Invalid job id specified\n")
+        sys.exit(1)
+    for line in lines:
+        sys.stdout.write(line + "\n")
+
+
+def sacct(argv):
+    log_call(["sacct"] + argv)
+    with locked_jobs() as jobs:
+        simulate(jobs)
+    jobids = get_opt(argv, ["-j", "--jobs"], ",".join(jobs.keys())).split(",")
+    fields = get_opt(argv, ["-o", "--format"], "JobID,State,ExitCode").split(",")
+    values = {"JobID": lambda jobid, job: jobid,
+              "State": lambda jobid, job: job["state"],
+              "Start": lambda jobid, job: job.get("start", "Unknown"),
+              "End": lambda jobid, job: job.get("end", "Unknown"),
+              "ExitCode": lambda jobid, job: "0:0"}
+    for jobid in jobids:
+        job = jobs.get(jobid)
+        if job is not None:
+            sys.stdout.write("|".join(values[field](jobid, job) for field in fields) + "\n")
+
+
+def next_jobid():
+    path = os.path.join(state_dir(), "next_jobid")
+    jobid = 1
+    if os.path.exists(path):
+        with open(path) as f:
+            jobid = int(f.read())
+    with open(path, 'w') as f:
+        f.write(str(jobid + 1))
+    return jobid
+
+
+def sbatch(argv):
+    log_call(["sbatch"] + argv)
+    if "--version" in argv:
+        sys.stdout.write("slurm 15.08.7 (fake)\n")
+        return
+
+    record = {"state": "PENDING", "name": get_opt(argv, ["-J", "--job-name"], ""),
+              "dependency": get_opt(argv, ["--dependency"], ""), "script": argv[-1]}
+    if simulation() is not None:
+        record["submitted"] = time.time()
+        begin = get_opt(argv, ["--begin"])
+        if begin and begin.startswith("now+"):
+            record["begin"] = record["submitted"] + int(begin[len("now+"):])
+
+    array = get_opt(argv, ["--array"])
+    with locked_jobs() as jobs:
+        jobid = str(next_jobid())
+        if array:
+            first, last = array.split("-")
+            for idx in range(int(first), int(last) + 1):
+                jobs["{}_{}".format(jobid, idx)] = dict(record)
+        else:
+            jobs[jobid] = record
+
+    if "--parsable" in argv:
+        sys.stdout.write(jobid + "\n")
+    else:
+        sys.stdout.write("Submitted batch job {}\n".format(jobid))
+
+
+def scancel(argv):
+    log_call(["scancel"] + argv)
+    with locked_jobs() as jobs:
+        for jobid in argv:
+            if jobid in jobs and jobs[jobid]["state"] in ["PENDING", "RUNNING"]:
+                jobs[jobid]["state"] = "CANCELLED"
+                jobs[jobid]["in_queue"] = False
+
+
+def scontrol(argv):
+    log_call(["scontrol"] + argv)
+    if argv[:1] != ["update"]:
+        return
+    fields = dict(arg.split("=", 1) for arg in argv[1:])
+    with locked_jobs() as jobs:
+        job = jobs.get(fields.get("JobId"))
+        if job is None:
+            sys.stderr.write("Invalid job id specified\n")
+            sys.exit(1)
+        if "Dependency" in fields:
+            job["dependency"] = fields["Dependency"]
@@ -0,0 +1,103 @@
+"""
+Helpers for tests that run against the fake slurm commands in this directory
+"""
+import contextlib
+import os
+import tempfile
+import unittest
+
+import fakeslurm
+from pypedream.pipeline.pypedreampipeline import PypedreamPipeline
+from pypedream.tools.unix import Cat, Urandom
+
+fakeslurm_bin = os.path.dirname(os.path.abspath(__file__))
+
+
+def use_fakeslurm(slurmdir=None, **env):
+    """
+    Put the fake slurm commands first in PATH
+    :param slurmdir: directory to keep the fake slurm state in, a new temporary directory by default
+    :param env: more environment variables, such as FAKESLURM_RUNTIME="0.1"
+    :return: the state directory
+    """
+    slurmdir = slurmdir or tempfile.mkdtemp()
+    os.environ["PATH"] = fakeslurm_bin + os.pathsep + os.environ["PATH"]
+    os.environ["FAKESLURM_DIR"] = slurmdir
+    os.environ.update(env)
+    return slurmdir
+
+
+@contextlib.contextmanager
+def fakeslurm_env(slurmdir=None, **env):
+    """
+    Use the fake slurm commands in a with block, and restore the environment after it. See use_fakeslurm().
+    """
+    old_env = dict(os.environ)
+    try:
+        yield use_fakeslurm(slurmdir, **env)
+    finally:
+        os.environ.clear()
+        os.environ.update(old_env)
+
+
+class FakeslurmTestCase(unittest.TestCase):
+    """
+    Runs each test with the fake slurm commands first in PATH and their state in self.slurmdir. The environment is
+    restored after each test, so tests can set the FAKESLURM_* options freely.
+    """
+    slurmdir = None
+    old_env = None
+
+    def setUp(self):
+        self.old_env = dict(os.environ)
+        self.slurmdir = use_fakeslurm()
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.old_env)
+
+    def load_jobs(self):
+        return fakeslurm.load_jobs()
+
+    def save_jobs(self, jobs):
+        with fakeslurm.locked_jobs() as current:
+            current.clear()
+            current.update(jobs)
+
+    def set_state(self, jobid, state, in_queue=False):
+        with fakeslurm.locked_jobs() as jobs:
+            jobs[jobid].update({'state': state, 'in_queue': in_queue})
+
+    def calls(self, command):
+        """
+        :return: the calls of a command so far, such as "scancel 3"
+        """
+        with open(self.slurmdir + "/calls.log") as f:
+            return [line.strip() for line in f if line.startswith(command)]
+
+
+class ChainPipeline(PypedreamPipeline):
+    """
+    urandom -> cat -> cat, or urandom followed by the given tools, with an optional second consumer of the first
+    output
+    """
+    def __init__(self, outdir, tools=None, branch=False, **kwargs):
+        PypedreamPipeline.__init__(self, outdir, **kwargs)
+        job = Urandom()
+        job.output = outdir + "/chain0"
+        job.jobname = "chain0"
+        self.add(job)
+        self.chain = [job]
+        for i, tool in enumerate(tools or [Cat, Cat]):
+            cat = tool()
+            cat.input = [self.chain[-1].output]
+            cat.output = "{}/chain{}".format(outdir, i + 1)
+            cat.jobname = "chain{}".format(i + 1)
+            self.add(cat)
+            self.chain.append(cat)
+        if branch:
+            cat = Cat()
+            cat.input = [self.chain[0].output]
+            cat.output = outdir + "/branch"
+            cat.jobname = "branch"
+            self.add(cat)
@@ -0,0 +1,80 @@
+import json
+import os
+import tempfile
+import unittest
+
+from pypedream import accounting
+from pypedream.jobdb import SqliteJobdb
+from pypedream.pipeline.dummy_pipeline import TestPipeline
+from pypedream.pipeline.pypedreampipeline import PypedreamPipeline
+from pypedream.runners.shellrunner import Shellrunner
+from pypedream.tools.unix import Ifail
+
+
+class FailingPipeline(PypedreamPipeline):
+    def __init__(self, outdir, **kwargs):
+        PypedreamPipeline.__init__(self, outdir, **kwargs)
+        fail = Ifail()
+        fail.output = outdir + "/failed"
+        self.add(fail)
+
+
+class TestAccounting(unittest.TestCase):
+    outdir = None
+
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+
+    def test_run_records_usage_and_exit_code(self):
+        stats_file = self.outdir + "/stats.json"
+        cmd = ["sh", "-c", "head -c 100000 /dev/urandom > {}/out; exit 3".format(self.outdir)]
+        self.assertEqual(accounting.run(stats_file, cmd), 3)
+
+        with open(stats_file) as f:
+            stats = json.load(f)
+        self.assertEqual(stats['returncode'], 3)
+        for key in ['walltime', 'user', 'sys', 'maxrss_kb']:
+            self.assertGreaterEqual(stats[key], 0)
+        if os.path.exists("/proc/self/io"):
+            self.assertIsNotNone(stats['write_bytes'])
+
+    def test_resources_are_in_jobdb(self):
+        jobdb = self.outdir + "/jobs.sqlite"
+        p = TestPipeline(self.outdir, "first", "second", "third", runner=Shellrunner(), jobdb=jobdb)
+        p.start()
+        p.join()
+        self.assertEqual(p.exitcode, 0)
+
+        jobs = SqliteJobdb(jobdb).load()['jobs']
+        self.assertEqual(len(jobs), 3)
+        for job in jobs:
+            self.assertEqual(job['resources']['returncode'], 0)
+            self.assertGreater(job['resources']['maxrss_kb'], 0)
+
+    def test_failed_job_is_accounted(self):
+        jobdb = self.outdir + "/jobs.json"
+        p = FailingPipeline(self.outdir, runner=Shellrunner(), jobdb=jobdb)
+        p.start()
+        p.join()
+        self.assertNotEqual(p.exitcode, 0)
+
+        with open(jobdb) as f:
+            job = json.load(f)['jobs'][0]
+        self.assertEqual(job['status'], "FAILED")
+        self.assertEqual(job['resources']['returncode'], 127)
+
+    def test_accounting_can_be_turned_off(self):
+        fail = Ifail()
+        fail.output = self.outdir + "/failed"
+        fail.accounting = False
+        self.assertNotIn("PYPEDREAM_ACCOUNTING", "".join(self.script_lines(fail)))
+
+        fail.accounting = True
+        self.assertIn("PYPEDREAM_ACCOUNTING", "".join(self.script_lines(fail)))
+
+    def script_lines(self, job):
+        p = PypedreamPipeline(self.outdir)
+        p.add(job)
+        job.write_script(self.outdir, p)
+        with open(job.script) as f:
+            return f.readlines()
@@ -0,0 +1,58 @@
+import hashlib
+import os
+import tempfile
+import time
+import unittest
+
+from pypedream.checksum import ChecksumIndex, file_digest
+
+
+class TestChecksumIndex(unittest.TestCase):
+    tmpdir = None
+    files = None
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.files = []
+        for i in range(5):
+            fname = os.path.join(self.tmpdir, "file{}".format(i))
+            with open(fname, 'w') as f:
+                f.write("contents of file {}\n".format(i))
+            self.files.append(fname)
+
+    def test_file_digest(self):
+        self.assertEqual(file_digest(self.files[0]), hashlib.sha256("contents of file 0\n").hexdigest())
+        self.assertEqual(file_digest(self.files[0], blocksize=3), file_digest(self.files[0]))
+
+    def test_files_are_hashed_once(self):
+        index = ChecksumIndex(threads=3)
+        digests = index.digests(self.files)
+        self.assertEqual(digests, dict((f, file_digest(f)) for f in self.files))
+        self.assertEqual(index.hashed, 5)
+
+        index.digests(self.files)
+        index.digest(self.files[0])
+        self.assertEqual(index.hashed, 5)
+
+    def test_changed_file_is_hashed_again(self):
+        index = ChecksumIndex()
+        before = index.digest(self.files[0])
+        with open(self.files[0], 'w') as f:
+            f.write("new contents\n")
+        later = time.time() + 10
+        os.utime(self.files[0], (later, later))
+
+        self.assertNotEqual(index.digest(self.files[0]), before)
+        self.assertEqual(index.hashed, 2)
+
+    def test_index_is_kept_between_runs(self):
+        path = os.path.join(self.tmpdir, "index", "checksums.json")
+        index = ChecksumIndex(path)
+        index.digests(self.files)
+        os.remove(self.files[4])
+        index.save()
+
+        index = ChecksumIndex(path)
+        self.assertEqual(index.digests(self.files[:4]), dict((f, file_digest(f)) for f in self.files[:4]))
+        self.assertEqual(index.hashed, 0)
+        self.assertEqual(len(index._index), 4)
@@ -0,0 +1,78 @@
+import json
+import tempfile
+import unittest
+
+from pypedream.pipeline.pypedreampipeline import PypedreamPipeline, seconds_between
+from pypedream.runners.scheduler import JobScheduler, critical_path_lengths, prioritized_order
+from pypedream.tools.unix import Cat, Urandom
+
+
+class ChainAndShortsPipeline(PypedreamPipeline):
+    """
+    Three independent short jobs added first, then a chain of three jobs
+    """
+    def __init__(self, outdir, **kwargs):
+        PypedreamPipeline.__init__(self, outdir, **kwargs)
+        for i in range(3):
+            short = Urandom()
+            short.output = "{}/short{}".format(outdir, i)
+            short.jobname = "short{}".format(i)
+            self.add(short)
+
+        job = Urandom()
+        job.output = outdir + "/chain0"
+        job.jobname = "chain0"
+        self.add(job)
+        for i in range(1, 3):
+            cat = Cat()
+            cat.input = [job.output]
+            cat.output = "{}/chain{}".format(outdir, i)
+            cat.jobname = "chain{}".format(i)
+            self.add(cat)
+            job = cat
+
+
+class TestCriticalPath(unittest.TestCase):
+    outdir = None
+
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+
+    def get_pipeline(self, **kwargs):
+        p = ChainAndShortsPipeline(self.outdir, **kwargs)
+        p._add_edges()
+        return p
+
+    def test_depth_is_used_without_history(self):
+        p = self.get_pipeline()
+        lengths = critical_path_lengths(p, p._get_ordered_jobs())
+        self.assertEqual(sorted((j.get_name(), l) for j, l in lengths.items()),
+                         [("chain0", 3), ("chain1", 2), ("chain2", 1), ("short0", 1), ("short1", 1), ("short2", 1)])
+
+    def test_longest_chain_starts_first(self):
+        p = self.get_pipeline()
+        scheduler = JobScheduler(p, p._get_ordered_jobs(), threads=1)
+        self.assertEqual(scheduler.next_job().get_name(), "chain0")
+        self.assertEqual([j.get_name() for j in prioritized_order(p, p._get_ordered_jobs())],
+                         ["chain0", "chain1", "short0", "short1", "short2", "chain2"])
+
+    def test_runtimes_from_jobdb(self):
+        jobdb = self.outdir + "/jobs.json"
+        p = self.get_pipeline(jobdb=jobdb)
+        jobs = []
+        for job in p._get_ordered_jobs():
+            runtime = 100 if job.get_name() == "short2" else 1
+            jobs.append({'jobname': job.get_name(), 'status': "COMPLETED", 'outputs': job.get_output_dict(),
+                         'starttime': "2016-04-11T07:00:00", 'endtime': "2016-04-11T07:00:{:02d}".format(runtime % 60),
+                         'resources': {'walltime': runtime} if runtime > 1 else None})
+        with open(jobdb, 'w') as f:
+            json.dump({'jobs': jobs}, f)
+
+        p._load_previous_run()
+        self.assertEqual(p._get_expected_runtime(p._get_ordered_jobs()[0]), 1)
+        self.assertEqual(prioritized_order(p, p._get_ordered_jobs())[0].get_name(), "short2")
+
+    def test_seconds_between(self):
+        self.assertEqual(seconds_between("2016-04-11T07:49:56", "2016-04-11T07:50:01"), 5)
+        self.assertEqual(seconds_between("2016-04-11T07:49:56.500000", "2016-04-11T07:49:57"), 0.5)
+        self.assertIsNone(seconds_between(None, "2016-04-11T07:49:57"))
@@ -0,0 +1,107 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from fakeslurm.helpers import FakeslurmTestCase
+from pypedream.job import Job, required
+from pypedream.pipeline.dummy_pipeline import TestPipeline
+from pypedream.pipeline.dummy_pipeline_that_fails import FailingPipeline
+from pypedream.pipeline.pypedreampipeline import PypedreamPipeline
+from pypedream.runners.eventrunner import Eventrunner, LocalBackend, SlurmBackend
+
+
+class Sleep(Job):
+    def __init__(self):
+        Job.__init__(self)
+        self.output = None
+        self.jobname = "sleep"
+
+    def command(self):
+        return "sleep 60 && touch " + required("", self.output)
+
+
+class BrokenSlurmBackend(SlurmBackend):
+    def _poll(self):
+        raise OSError("squeue not found")
+
+
+class SleepPipeline(PypedreamPipeline):
+    def __init__(self, outdir, **kwargs):
+        PypedreamPipeline.__init__(self, outdir, **kwargs)
+        sleep = Sleep()
+        sleep.output = outdir + "/slept"
+        self.add(sleep)
+
+
+class TestDummyPipeline(unittest.TestCase):
+    p = None
+    outdir = None
+
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+        self.p = TestPipeline(self.outdir, "first-event", "second-event", "third-event",
+                              runner=Eventrunner(LocalBackend(threads=2)), jobdb="{}/jobs.json".format(self.outdir))
+
+        self.p.start()
+        self.p.join()
+
+    def test_output_exists(self):
+        self.assertEqual(self.p.exitcode, 0)
+        self.assertTrue(os.path.exists(self.outdir + "/third-event"))
+        self.assertTrue(os.path.exists(self.outdir + "/.third-event.done"))
+
+    def test_intermediate_is_deleted(self):
+        self.assertTrue(not os.path.exists(self.outdir + "/second-event"))
+
+    def test_starttime_and_endtimes_are_set(self):
+        jobdb = json.load(open("{}/jobs.json".format(self.outdir)))
+        for job in jobdb['jobs']:
+            self.assertIsNotNone(job['starttime'])
+            self.assertIsNotNone(job['endtime'])
+
+
+class TestDummyPipelineThatFails(unittest.TestCase):
+    def test_fail_file_exists(self):
+        outdir = tempfile.mkdtemp()
+        p = FailingPipeline(outdir, "first", "second", "third", runner=Eventrunner(LocalBackend(threads=2)))
+
+        p.start()
+        p.join()
+
+        self.assertEqual(p.exitcode, 127)
+        self.assertTrue(os.path.exists(os.path.join(outdir, ".second.fail")))
+        self.assertFalse(os.path.exists(os.path.join(outdir, "third")))
+
+
+class TestStop(unittest.TestCase):
+    def test_stop_cancels_running_jobs(self):
+        outdir = tempfile.mkdtemp()
+        p = SleepPipeline(outdir, runner=Eventrunner(), jobdb="{}/jobs.json".format(outdir))
+
+        p.start()
+        time.sleep(1)
+        stopped_at = time.time()
+        p.stop()
+        p.join(30)
+
+        self.assertLess(time.time() - stopped_at, 10)
+        self.assertNotEqual(p.exitcode, 0)
+        jobdb = json.load(open("{}/jobs.json".format(outdir)))
+        self.assertEqual(jobdb['jobs'][0]['status'], "CANCELLED")
+
+
+class TestBackendFailure(FakeslurmTestCase):
+    def test_failing_poll_stops_the_run(self):
+        outdir = tempfile.mkdtemp()
+        p = SleepPipeline(outdir, runner=Eventrunner(BrokenSlurmBackend(interval=0.1, max_poll_errors=2)),
+                          jobdb="{}/jobs.json".format(outdir))
+
+        p.start()
+        p.join(30)
+
+        self.assertFalse(p.is_alive())
+        self.assertNotEqual(p.exitcode, 0)
+        jobdb = json.load(open("{}/jobs.json".format(outdir)))
+        self.assertEqual(jobdb['jobs'][0]['status'], "CANCELLED")
@@ -0,0 +1,46 @@
+import json
+import os
+import subprocess
+import tempfile
+
+from fakeslurm.helpers import FakeslurmTestCase
+from pypedream.pipeline.dummy_pipeline import TestPipeline
+from pypedream.pypedreamstatus import PypedreamStatus
+from pypedream.runners.slurmrunner import Slurmrunner
+
+
+class TestDummyPipelineWithFakeslurm(FakeslurmTestCase):
+    """
+    Run the dummy pipeline end to end with Slurmrunner against the simulated fake slurm
+    """
+    outdir = None
+
+    def setUp(self):
+        FakeslurmTestCase.setUp(self)
+        self.outdir = tempfile.mkdtemp()
+        os.environ["FAKESLURM_QUEUE_DELAY"] = "0.2"
+        os.environ["FAKESLURM_RUNTIME"] = "0.1"
+
+    def test_dummy_pipeline(self):
+        p = TestPipeline(self.outdir, "first", "second", "third", runner=Slurmrunner(interval=0.2),
+                         jobdb=self.outdir + "/jobs.json")
+        p.start()
+        p.join()
+        self.assertEqual(p.exitcode, 0)
+
+        with open(self.outdir + "/jobs.json") as f:
+            jobs = json.load(f)['jobs']
+        self.assertEqual([j['status'] for j in jobs], [PypedreamStatus.COMPLETED] * 3)
+        cat = [j for j in jobs if j['jobname'] == "cat1-third"][0]
+        first = [j for j in jobs if j['jobname'] == "urandom-first"][0]
+        self.assertGreaterEqual(cat['starttime'], first['endtime'])
+
+    def test_concurrent_calls_keep_all_jobs(self):
+        procs = [subprocess.Popen(["sbatch", "--parsable", "script.sh"], stdout=subprocess.PIPE) for _ in range(20)]
+        procs += [subprocess.Popen(["squeue"], stdout=subprocess.PIPE) for _ in range(5)]
+        jobids = [proc.communicate()[0].strip() for proc in procs[:20]]
+        for proc in procs[20:]:
+            proc.communicate()
+
+        self.assertEqual(len(set(jobids)), 20)
+        self.assertEqual(len(self.load_jobs()), 20)
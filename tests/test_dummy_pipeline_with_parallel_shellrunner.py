@@ -0,0 +1,50 @@
+import json
+import os
+import tempfile
+import unittest
+
+from pypedream.pipeline.dummy_pipeline import TestPipeline
+from pypedream.pipeline.dummy_pipeline_that_fails import FailingPipeline
+from pypedream.runners.shellrunner import Shellrunner
+
+
+class TestDummyPipeline(unittest.TestCase):
+    p = None
+    outdir = None
+
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+        self.p = TestPipeline(self.outdir, "first-parallel", "second-parallel", "third-parallel",
+                              runner=Shellrunner(threads=4), jobdb="{}/jobs.json".format(self.outdir))
+
+        self.p.start()
+        self.p.join()
+
+    def test_output_exists(self):
+        self.assertEqual(self.p.exitcode, 0)
+        self.assertTrue(os.path.exists(self.outdir + "/third-parallel"))
+        self.assertTrue(os.path.exists(self.outdir + "/.third-parallel.done"))
+
+    def test_intermediate_is_deleted(self):
+        self.assertTrue(not os.path.exists(self.outdir + "/second-parallel"))
+
+    def test_starttime_and_endtimes_are_set(self):
+        jobdb = json.load(open("{}/jobs.json".format(self.outdir)))
+        for job in jobdb['jobs']:
+            self.assertIsNotNone(job['starttime'])
+            self.assertIsNotNone(job['endtime'])
+
+
+class TestDummyPipelineThatFails(unittest.TestCase):
+    def test_fail_file_exists(self):
+        outdir = tempfile.mkdtemp()
+        p = FailingPipeline(outdir, "first", "second", "third", runner=Shellrunner(threads=4))
+
+        p.start()
+        p.join()
+
+        self.assertEqual(p.exitcode, 127,
+                         'Pipeline exitcode should be 127 with this error(got {})'.format(p.exitcode))
+        self.assertTrue(os.path.exists(os.path.join(outdir, ".second.fail")))
+        self.assertTrue(os.path.exists(os.path.join(outdir, ".first.done")))
+        self.assertFalse(os.path.exists(os.path.join(outdir, "third")))
@@ -0,0 +1,196 @@
+import json
+import os
+import tempfile
+import unittest
+
+from fakeslurm.helpers import ChainPipeline, FakeslurmTestCase, fakeslurm_env
+from pypedream.fusion import FusedJob, find_chains, format_walltime, walltime_seconds
+from pypedream.pypedreamstatus import PypedreamStatus
+from pypedream.runners.scheduler import JobScheduler
+from pypedream.runners.shellrunner import Shellrunner
+from pypedream.runners.slurmrunner import Slurmrunner
+from pypedream.tools.unix import Cat
+
+
+class CatThenFail(Cat):
+    def command(self):
+        return Cat.command(self) + " && false"
+
+
+# urandom -> cat -> cat -> cat
+three_cats = [Cat, Cat, Cat]
+
+
+class TestFusion(unittest.TestCase):
+    outdir = None
+
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+
+    def donefile(self, name):
+        return "{}/.{}.done".format(self.outdir, name)
+
+    def test_chain_is_fused(self):
+        p = ChainPipeline(self.outdir, three_cats, fuse=True)
+        jobs = p.plan()
+        self.assertEqual(len(jobs), 1)
+        self.assertIsInstance(jobs[0], FusedJob)
+        self.assertEqual(jobs[0].members, p.chain)
+        self.assertEqual(jobs[0].get_name(), "chain0+..+chain3")
+        self.assertEqual(jobs[0].get_inputs(), [])
+
+    def test_nothing_is_fused_by_default(self):
+        p = ChainPipeline(self.outdir, three_cats)
+        self.assertEqual(p.plan(), p.chain)
+
+    def test_fan_out_is_not_fused(self):
+        p = ChainPipeline(self.outdir, three_cats, branch=True)
+        p._prepare()
+        chains = find_chains(p, p._get_ordered_jobs_to_run())
+        self.assertEqual(chains, [p.chain[1:]])
+
+    def test_different_resources_are_not_fused(self):
+        p = ChainPipeline(self.outdir, three_cats)
+        p.chain[2].memory = 8000
+        p._prepare()
+        chains = find_chains(p, p._get_ordered_jobs_to_run())
+        self.assertEqual(chains, [p.chain[:2]])
+
+    def test_dependencies_of_fused_jobs(self):
+        p = ChainPipeline(self.outdir, three_cats, branch=True, fuse=True)
+        p._prepare()
+        p._fuse()
+        jobs = p._get_ordered_jobs_to_run()
+        self.assertEqual([j.get_name() for j in jobs], ["chain0", "chain1+chain2+chain3", "branch"])
+        self.assertEqual(p._get_dependencies(jobs[1]), [jobs[0]])
+        self.assertEqual(sorted(j.get_name() for j in p._get_dependents(jobs[0])), ["branch", "chain1+chain2+chain3"])
+
+        scheduler = JobScheduler(p, jobs)
+        self.assertEqual(scheduler.next_job(), jobs[0])
+        self.assertIsNone(scheduler.next_job())
+        scheduler.job_finished(jobs[0], True)
+        self.assertEqual(scheduler.next_job(), jobs[1])
+
+    def test_status_is_passed_on_to_members(self):
+        p = ChainPipeline(self.outdir, three_cats, fuse=True)
+        p._prepare()
+        p._fuse()
+        unit = p._get_ordered_jobs_to_run()[0]
+        unit.jobid = "42"
+        unit.status = PypedreamStatus.RUNNING
+        self.assertEqual([j.jobid for j in p.chain], ["42"] * 4)
+        self.assertEqual(set(j.status for j in p.chain), set([PypedreamStatus.RUNNING]))
+        self.assertIs(p._get_job_with_id("42"), unit)
+
+    def test_run_fused_chain(self):
+        jobdb = self.outdir + "/jobs.json"
+        p = ChainPipeline(self.outdir, three_cats, fuse=True, runner=Shellrunner(), jobdb=jobdb)
+        p.start()
+        p.join()
+        self.assertEqual(p.exitcode, 0)
+
+        for job in p.chain:
+            self.assertTrue(os.path.exists(job.output))
+            self.assertTrue(os.path.exists(self.donefile(job.get_name())))
+            self.assertTrue(os.path.exists(job.log))
+        with open(jobdb) as f:
+            statuses = [job['status'] for job in json.load(f)['jobs']]
+        self.assertEqual(statuses, [PypedreamStatus.COMPLETED] * 4)
+
+    def test_fused_chain_is_submitted_once(self):
+        with fakeslurm_env(FAKESLURM_QUEUE_DELAY="0.1") as slurmdir:
+            p = ChainPipeline(self.outdir, three_cats, fuse=True, runner=Slurmrunner(interval=0.1),
+                              jobdb=self.outdir + "/jobs.json")
+            p.start()
+            p.join()
+            with open(slurmdir + "/jobs.json") as f:
+                n_submitted = len(json.load(f))
+        self.assertEqual(p.exitcode, 0)
+        self.assertEqual(n_submitted, 1)
+
+        with open(self.outdir + "/jobs.json") as f:
+            jobs = json.load(f)['jobs']
+        self.assertEqual([j['status'] for j in jobs], [PypedreamStatus.COMPLETED] * 4)
+        self.assertEqual(len(set(j['jobid'] for j in jobs)), 1)
+
+    def test_failure_keeps_completed_members(self):
+        p = ChainPipeline(self.outdir, tools=[Cat, CatThenFail, Cat], fuse=True, runner=Shellrunner())
+        p.start()
+        p.join()
+        self.assertNotEqual(p.exitcode, 0)
+
+        self.assertTrue(os.path.exists(self.donefile("chain0")))
+        self.assertTrue(os.path.exists(self.donefile("chain1")))
+        self.assertFalse(os.path.exists(self.donefile("chain2")))
+        self.assertTrue(os.path.exists("{}/.chain2.fail".format(self.outdir)))
+        self.assertFalse(os.path.exists(self.donefile("chain3")))
+
+        # a new run only runs what is left
+        p = ChainPipeline(self.outdir, three_cats, fuse=True)
+        self.assertEqual([j.get_name() for j in p.plan()], ["chain2+chain3"])
+
+    def test_walltime(self):
+        self.assertEqual(walltime_seconds("1-02:03:04"), 93784)
+        self.assertEqual(walltime_seconds("10:00"), 600)
+        self.assertEqual(walltime_seconds("30"), 1800)
+        self.assertEqual(walltime_seconds("2:03:04"), 7384)
+        self.assertEqual(walltime_seconds("1-12"), 129600)
+        self.assertEqual(walltime_seconds("1-12:30"), 131400)
+        for walltime in ["infinite", "1:2:3:4", "1-2:3:4:5", "1h"]:
+            self.assertRaises(ValueError, walltime_seconds, walltime)
+        self.assertIsNone(walltime_seconds(None))
+        self.assertEqual(format_walltime(93784), "26:03:04")
+
+
+class TestFusedJobStatuses(FakeslurmTestCase):
+    """
+    Statuses and done files of the members when Slurmrunner finds that a fused job has finished
+    """
+    outdir = None
+
+    def setUp(self):
+        FakeslurmTestCase.setUp(self)
+        self.outdir = tempfile.mkdtemp()
+
+    def submit(self):
+        p = ChainPipeline(self.outdir, three_cats, fuse=True)
+        p._prepare()
+        p._fuse()
+        p._write_scripts()
+        runner = Slurmrunner()
+        runner.pipeline = p
+        runner.ordered_jobs = p._get_ordered_jobs_to_run()
+        runner._jobs_to_run = set(runner.ordered_jobs)
+        for job in runner.ordered_jobs:
+            runner.submit(job)
+        return p, runner
+
+    def finish(self, runner, state):
+        self.set_state(runner.ordered_jobs[0].jobid, state)
+        runner.poll()
+        runner._update_statuses()
+
+    def test_completed_members_get_signatures(self):
+        p, runner = self.submit()
+        for job in p.chain:
+            open(job.output, 'w').close()
+            open(job.donefiles()[0], 'w').close()
+        self.finish(runner, "COMPLETED")
+
+        self.assertEqual([job.status for job in p.chain], [PypedreamStatus.COMPLETED] * 4)
+        for job in p.chain:
+            with open(job.donefiles()[0]) as f:
+                self.assertEqual(json.load(f), job.signature())
+
+    def test_members_after_the_failure_are_cancelled(self):
+        p, runner = self.submit()
+        open(p.chain[0].output, 'w').close()
+        open(p.chain[0].donefiles()[0], 'w').close()
+        open(p.chain[1].failfiles()[0], 'w').close()
+        self.finish(runner, "FAILED")
+
+        self.assertEqual([job.status for job in p.chain],
+                         [PypedreamStatus.COMPLETED, PypedreamStatus.FAILED,
+                          PypedreamStatus.CANCELLED, PypedreamStatus.CANCELLED])
+        with open(p.chain[0].donefiles()[0]) as f:
+            self.assertEqual(json.load(f), p.chain[0].signature())
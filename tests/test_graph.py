@@ -0,0 +1,66 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from pypedream.graph import Graph
+from pypedream.pipeline.dummy_pipeline import TestPipeline
+
+
+class TestGraph(unittest.TestCase):
+    def test_nodes_and_edges(self):
+        g = Graph()
+        g.add_node("a")
+        g.add_node("a")
+        g.add_edges_from([("a", "b"), ("a", "b")], filename="f")
+        g.add_edge("b", "c")
+
+        self.assertEqual(g.nodes(), ["a", "b", "c"])
+        self.assertEqual(len(g), 3)
+        self.assertIn("c", g)
+        self.assertEqual(g.number_of_edges(), 3)
+        self.assertEqual(g.edges(data=True), [("a", "b", {'filename': "f"}), ("a", "b", {'filename': "f"}),
+                                              ("b", "c", {})])
+        self.assertEqual(g.successors("a"), ["b"])
+        self.assertEqual(g.predecessors("c"), ["b"])
+
+    def test_topological_sort(self):
+        g = Graph()
+        for n in ["d", "c", "b", "a"]:
+            g.add_node(n)
+        g.add_edge("a", "d")
+        g.add_edge("b", "c")
+        self.assertEqual(g.topological_sort(), ["b", "a", "c", "d"])
+        self.assertTrue(g.is_directed_acyclic_graph())
+
+    def test_cycle(self):
+        g = Graph()
+        g.add_edges_from([("a", "b"), ("b", "c"), ("c", "a")])
+        self.assertFalse(g.is_directed_acyclic_graph())
+        with self.assertRaises(ValueError):
+            g.topological_sort()
+
+    def test_to_networkx(self):
+        g = Graph()
+        g.add_edges_from([("a", "b"), ("a", "b")], filename="f")
+        nxg = g.to_networkx()
+        self.assertEqual(sorted(nxg.nodes()), ["a", "b"])
+        self.assertEqual(nxg.number_of_edges(), 2)
+
+    def test_pipeline_import_does_not_load_networkx(self):
+        # localq uses networkx, so it must not be imported either, whether it is installed or not
+        code = "import sys; import pypedream.pipeline.pypedreampipeline; import pypedream.runners; " \
+               "print(sorted(m for m in ['networkx', 'localq'] if m in sys.modules))"
+        out = subprocess.check_output([sys.executable, "-c", code], env=os.environ)
+        self.assertEqual(out.strip(), "[]")
+
+    def test_cyclic_pipeline(self):
+        outdir = tempfile.mkdtemp()
+        p = TestPipeline(outdir, "first", "second", "third")
+        p._add_edges()
+        cat = [j for j in p.graph.nodes() if j.get_name() == "cat1-third"][0]
+        p.graph.add_edge(cat, p.graph.predecessors(cat)[0])
+        p._invalidate_order()
+        with self.assertRaises(ValueError):
+            p._get_ordered_jobs()
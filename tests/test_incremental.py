@@ -0,0 +1,147 @@
+import glob
+import hashlib
+import os
+import tempfile
+import time
+import unittest
+
+from pypedream.job import Job, required
+from pypedream.pipeline.pypedreampipeline import PypedreamPipeline
+from pypedream.runners.shellrunner import Shellrunner
+from pypedream.tools.unix import Cat
+
+
+class Head(Job):
+    """
+    Get the first lines of a file
+    """
+    def __init__(self, lines=1):
+        Job.__init__(self)
+        self.input = None
+        self.output = None
+        self.lines = lines
+        self.jobname = "head"
+
+    def command(self):
+        return "head -n {} ".format(self.lines) + required("", self.input) + " > " + required("", self.output)
+
+
+class Grep(Head):
+    """
+    Get the lines of a file that contain a pattern
+    """
+    def __init__(self, pattern):
+        Head.__init__(self)
+        self.pattern = pattern
+
+    def command(self):
+        return u"grep '{}' ".format(self.pattern) + required("", self.input) + " > " + required("", self.output)
+
+
+class BranchedPipeline(PypedreamPipeline):
+    """
+    input_a -> head -> a1 (intermediate) -> cat -> a2
+    input_b -> cat -> b1
+    """
+    def __init__(self, outdir, lines=1, **kwargs):
+        PypedreamPipeline.__init__(self, outdir, **kwargs)
+
+        head = Head(lines)
+        head.input = outdir + "/input_a"
+        head.output = outdir + "/a1"
+        head.is_intermediate = True
+        self.add(head)
+
+        cat_a = Cat()
+        cat_a.input = [head.output]
+        cat_a.output = outdir + "/a2"
+        self.add(cat_a)
+
+        cat_b = Cat()
+        cat_b.input = [outdir + "/input_b"]
+        cat_b.output = outdir + "/b1"
+        self.add(cat_b)
+
+
+class TestIncremental(unittest.TestCase):
+    outdir = None
+
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+        for name in ["input_a", "input_b"]:
+            with open(os.path.join(self.outdir, name), 'w') as f:
+                f.write("first line\nsecond line\n")
+        self.run_pipeline()
+        self.assertFalse(os.path.exists(self.outdir + "/a1"))
+
+    def run_pipeline(self, lines=1, incremental=True):
+        """
+        Run the pipeline in self.outdir
+        :return: names of the outputs of the jobs that ran
+        """
+        for log in glob.glob(self.outdir + "/*.out"):
+            os.remove(log)
+        p = BranchedPipeline(self.outdir, lines=lines, runner=Shellrunner(), incremental=incremental)
+        p.start()
+        p.join()
+        self.assertEqual(p.exitcode, 0)
+        return sorted(os.path.basename(log)[:-len(".out")] for log in glob.glob(self.outdir + "/*.out"))
+
+    def make_newer(self, fname):
+        future = time.time() + 10
+        os.utime(os.path.join(self.outdir, fname), (future, future))
+
+    def test_nothing_reruns_when_nothing_changed(self):
+        self.assertEqual(self.run_pipeline(), [])
+
+    def test_newer_input_reruns_its_branch(self):
+        self.make_newer("input_b")
+        self.assertEqual(self.run_pipeline(), ["b1"])
+
+    def test_newer_input_reruns_deleted_intermediate_and_downstream(self):
+        self.make_newer("input_a")
+        self.assertEqual(self.run_pipeline(), ["a1", "a2"])
+        self.assertFalse(os.path.exists(self.outdir + "/a1"))
+
+    def test_changed_command_reruns_job_and_downstream(self):
+        self.assertEqual(self.run_pipeline(lines=2), ["a1", "a2"])
+        with open(self.outdir + "/a2") as f:
+            self.assertEqual(f.read(), "first line\nsecond line\n")
+
+    def test_changed_output_size_reruns_job(self):
+        with open(self.outdir + "/b1", 'a') as f:
+            f.write("edited\n")
+        self.assertEqual(self.run_pipeline(), ["b1"])
+
+    def test_missing_output_reruns_job(self):
+        os.remove(self.outdir + "/b1")
+        self.assertEqual(self.run_pipeline(), ["b1"])
+
+    def test_empty_donefiles_skip_command_check(self):
+        for donefile in glob.glob(self.outdir + "/.*.done"):
+            open(donefile, 'w').close()
+            os.utime(donefile, (time.time() + 5, time.time() + 5))
+        self.assertEqual(self.run_pipeline(lines=2), [])
+
+    def test_signature_of_non_ascii_command(self):
+        grep = Grep(u"\u00e9t\u00e9")
+        grep.input = self.outdir + "/input_a"
+        grep.output = self.outdir + "/grepped"
+        self.assertEqual(grep.signature()['command'], hashlib.sha256(grep.command().encode('utf-8')).hexdigest())
+
+    def test_changes_are_ignored_when_not_incremental(self):
+        self.make_newer("input_a")
+        self.assertEqual(self.run_pipeline(lines=2, incremental=False), [])
+
+    def test_plan_leaves_the_pipeline_as_it_was(self):
+        self.make_newer("input_b")
+        p = BranchedPipeline(self.outdir, runner=Shellrunner(), incremental=True)
+        statuses = [job.status for job in p.graph.nodes()]
+        self.assertEqual([os.path.basename(job.output) for job in p.plan()], ["b1"])
+        self.assertEqual([job.status for job in p.graph.nodes()], statuses)
+
+        p.plan()
+        p._prepare()
+        self.assertEqual(p.graph.number_of_edges(), 1)
+        # the stale job was found again, and its done file removed
+        self.assertFalse(os.path.exists(self.outdir + "/.b1.done"))
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+
+from pypedream.job import Job, required
+from pypedream.pipeline.pypedreampipeline import PypedreamPipeline
+from pypedream.runners.eventrunner import Eventrunner
+from pypedream.runners.shellrunner import Shellrunner
+from pypedream.tools.unix import Cat, Urandom
+
+
+class CatIfMissing(Job):
+    """
+    Concatenate files, but fail if another file still exists
+    """
+    def __init__(self):
+        Job.__init__(self)
+        self.input = None
+        self.output = None
+        self.missing = None
+        self.jobname = "cat-if-missing"
+
+    def command(self):
+        return "test ! -e " + required("", self.missing) + " && cat " + required("", self.input) + \
+               " > " + required("", self.output)
+
+
+class IntermediatePipeline(PypedreamPipeline):
+    def __init__(self, outdir, **kwargs):
+        PypedreamPipeline.__init__(self, outdir, **kwargs)
+
+        rnd = Urandom()
+        rnd.output = outdir + "/random"
+        rnd.is_intermediate = True
+        self.add(rnd)
+
+        cat = Cat()
+        cat.input = [rnd.output]
+        cat.output = outdir + "/cat"
+        self.add(cat)
+
+        check = CatIfMissing()
+        check.input = cat.output
+        check.missing = rnd.output
+        check.output = outdir + "/checked"
+        self.add(check)
+
+
+class TestIntermediateFiles(unittest.TestCase):
+    def run_pipeline(self, runner):
+        outdir = tempfile.mkdtemp()
+        p = IntermediatePipeline(outdir, runner=runner)
+        p.start()
+        p.join()
+
+        self.assertEqual(p.exitcode, 0)
+        self.assertTrue(os.path.exists(outdir + "/checked"))
+        self.assertFalse(os.path.exists(outdir + "/random"))
+
+    def test_intermediate_is_deleted_when_last_consumer_completes_with_shellrunner(self):
+        self.run_pipeline(Shellrunner())
+
+    def test_intermediate_is_deleted_when_last_consumer_completes_with_eventrunner(self):
+        self.run_pipeline(Eventrunner())
+
+    def test_unfinished_consumers_are_counted(self):
+        outdir = tempfile.mkdtemp()
+        p = IntermediatePipeline(outdir)
+        p._count_unfinished_consumers()
+        self.assertEqual(p._unfinished_consumers, {outdir + "/random": 1})
@@ -1,5 +1,6 @@
 import unittest
 from pypedream import job
+from pypedream.tools.unix import Cat
 
 
 class TestCommandFunctions(unittest.TestCase):
@@ -70,3 +71,31 @@ class TestCommandFunctions(unittest.TestCase):
         res = job.stripsuffix("file.vcf", ".bam")
         self.assertEqual(res, "file.vcf")
 
+
+class TestJobPorts(unittest.TestCase):
+    def test_ports_follow_assignments(self):
+        cat = Cat()
+        cat.input = ["/tmp/a", "/tmp/b"]
+        cat.output = "/tmp/c"
+        self.assertEqual(cat.get_inputs(), ["/tmp/a", "/tmp/b"])
+        self.assertEqual(cat.get_outputs(), ["/tmp/c"])
+        self.assertEqual(cat.donefiles(), ["/tmp/.c.done"])
+        self.assertEqual(cat.failfiles(), ["/tmp/.c.fail"])
+        self.assertEqual(cat.get_input_dict(), {'input': ["/tmp/a", "/tmp/b"]})
+
+        old_hash = hash(cat)
+        self.assertEqual(hash(cat), old_hash)
+
+        cat.output = "/tmp/d"
+        self.assertEqual(cat.get_outputs(), ["/tmp/d"])
+        self.assertEqual(cat.donefiles(), ["/tmp/.d.done"])
+        self.assertNotEqual(hash(cat), old_hash)
+
+    def test_equal_ports_give_equal_hashes(self):
+        cat1 = Cat()
+        cat1.input = ["/tmp/a"]
+        cat1.output = "/tmp/c"
+        cat2 = Cat()
+        cat2.input = ["/tmp/a"]
+        cat2.output = "/tmp/c"
+        self.assertEqual(hash(cat1), hash(cat2))
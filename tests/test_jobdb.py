@@ -0,0 +1,81 @@
+import json
+import os
+import sqlite3
+import stat
+import tempfile
+import unittest
+
+from pypedream.jobdb import JsonJobdb, SqliteJobdb, open_jobdb, write_json_atomically
+from pypedream.pipeline.dummy_pipeline import TestPipeline
+from pypedream.runners.shellrunner import Shellrunner
+
+
+class TestSqliteJobdb(unittest.TestCase):
+    p = None
+    outdir = None
+
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+        self.p = TestPipeline(self.outdir, "first", "second", "third",
+                              runner=Shellrunner(), jobdb="{}/jobs.sqlite".format(self.outdir))
+
+        self.p.start()
+        self.p.join()
+
+    def test_open_jobdb(self):
+        self.assertIsInstance(open_jobdb(self.outdir + "/jobs.sqlite"), SqliteJobdb)
+        self.assertIsInstance(open_jobdb(self.outdir + "/jobs.json"), JsonJobdb)
+
+    def test_jobs_and_summary(self):
+        jobdb = SqliteJobdb("{}/jobs.sqlite".format(self.outdir))
+        self.assertEqual(jobdb.summary(), {"COMPLETED": 3})
+
+        d = jobdb.load()
+        self.assertEqual(d['status'], "COMPLETED")
+        self.assertEqual(d['exitcode'], 0)
+        self.assertEqual(len(d['jobs']), 3)
+        cat = [j for j in d['jobs'] if j['jobname'] == "cat1-third"][0]
+        self.assertEqual(cat['outputs'], {'output': self.outdir + "/third"})
+        self.assertIsNotNone(cat['starttime'])
+        self.assertIsNotNone(cat['endtime'])
+
+    def test_status_is_indexed(self):
+        conn = sqlite3.connect("{}/jobs.sqlite".format(self.outdir))
+        plan = conn.execute("EXPLAIN QUERY PLAN SELECT * FROM jobs WHERE status = 'FAILED'").fetchall()
+        self.assertIn("jobs_status", str(plan))
+
+
+class TestJsonJobdb(unittest.TestCase):
+    def test_only_changes_are_written(self):
+        outdir = tempfile.mkdtemp()
+        p = TestPipeline(outdir, "first", "second", "third", jobdb="{}/jobs.json".format(outdir))
+        p._write_jobdb()
+        os.remove("{}/jobs.json".format(outdir))
+
+        p._write_jobdb()
+        self.assertFalse(os.path.exists("{}/jobs.json".format(outdir)))
+
+        p.status = "RUNNING"
+        p._write_jobdb()
+        self.assertEqual(json.load(open("{}/jobs.json".format(outdir)))['status'], "RUNNING")
+        self.assertEqual([f for f in os.listdir(outdir) if f.startswith(".jobs.json")], [])
+
+    def test_export_json(self):
+        outdir = tempfile.mkdtemp()
+        p = TestPipeline(outdir, "first", "second", "third")
+        p.export_jobdb_json("{}/export.json".format(outdir))
+        d = json.load(open("{}/export.json".format(outdir)))
+        self.assertEqual(len(d['jobs']), 3)
+
+    def test_file_mode_follows_umask_and_existing_file(self):
+        outdir = tempfile.mkdtemp()
+        path = "{}/jobs.json".format(outdir)
+        umask = os.umask(0o022)
+        try:
+            write_json_atomically({}, path)
+            self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o644)
+            os.chmod(path, 0o664)
+            write_json_atomically({'a': 1}, path)
+            self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o664)
+        finally:
+            os.umask(umask)
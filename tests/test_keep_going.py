@@ -0,0 +1,143 @@
+import json
+import os
+import tempfile
+import unittest
+
+from fakeslurm.helpers import FakeslurmTestCase
+from pypedream.pipeline.pypedreampipeline import PypedreamPipeline
+from pypedream.pypedreamstatus import PypedreamStatus
+from pypedream.runners.eventrunner import Eventrunner
+from pypedream.runners.shellrunner import Shellrunner
+from pypedream.runners.slurmrunner import Slurmrunner
+from pypedream.tools.unix import Cat, Urandom
+
+
+class FailingUrandom(Urandom):
+    def command(self):
+        return "false"
+
+
+class BranchPipeline(PypedreamPipeline):
+    """
+    failing -> broken1 -> broken2, and an independent urandom -> cat
+    """
+    def __init__(self, outdir, first=FailingUrandom, **kwargs):
+        PypedreamPipeline.__init__(self, outdir, **kwargs)
+        job = first()
+        job.output = outdir + "/broken0"
+        job.jobname = "broken0"
+        self.add(job)
+        for i in range(1, 3):
+            cat = Cat()
+            cat.input = [job.output]
+            cat.output = "{}/broken{}".format(outdir, i)
+            cat.jobname = "broken{}".format(i)
+            self.add(cat)
+            job = cat
+
+        urandom = Urandom()
+        urandom.output = outdir + "/other0"
+        urandom.jobname = "other0"
+        self.add(urandom)
+        cat = Cat()
+        cat.input = [urandom.output]
+        cat.output = outdir + "/other1"
+        cat.jobname = "other1"
+        self.add(cat)
+
+
+class TestKeepGoing(unittest.TestCase):
+    outdir = None
+
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+
+    def done(self, name):
+        return os.path.exists("{}/.{}.done".format(self.outdir, name))
+
+    def statuses(self):
+        with open(self.outdir + "/jobs.json") as f:
+            return dict((j['jobname'], j['status']) for j in json.load(f)['jobs'])
+
+    def run_pipeline(self, runner):
+        p = BranchPipeline(self.outdir, runner=runner, jobdb=self.outdir + "/jobs.json")
+        p.start()
+        p.join()
+        return p
+
+    def assert_kept_going(self, p):
+        self.assertNotEqual(p.exitcode, 0)
+        self.assertTrue(self.done("other0"))
+        self.assertTrue(self.done("other1"))
+        self.assertFalse(self.done("broken1"))
+        self.assertFalse(os.path.exists(self.outdir + "/broken1"))
+
+        statuses = self.statuses()
+        self.assertEqual(statuses['broken0'], PypedreamStatus.FAILED)
+        self.assertEqual(statuses['broken1'], PypedreamStatus.CANCELLED)
+        self.assertEqual(statuses['broken2'], PypedreamStatus.CANCELLED)
+
+        # the next run only repeats the broken branch
+        p = BranchPipeline(self.outdir)
+        self.assertEqual([job.get_name() for job in p.plan()], ["broken0", "broken1", "broken2"])
+
+    def test_shellrunner_stops_by_default(self):
+        p = self.run_pipeline(Shellrunner())
+        self.assertNotEqual(p.exitcode, 0)
+        self.assertFalse(self.done("other1"))
+
+    def test_shellrunner(self):
+        self.assert_kept_going(self.run_pipeline(Shellrunner(keep_going=True)))
+
+    def test_eventrunner(self):
+        self.assert_kept_going(self.run_pipeline(Eventrunner(keep_going=True)))
+
+    def test_downstream_jobs(self):
+        p = BranchPipeline(self.outdir)
+        p._prepare()
+        jobs = p._get_ordered_jobs_to_run()
+        self.assertEqual([job.get_name() for job in p._get_downstream_jobs(jobs[0], jobs)], ["broken1", "broken2"])
+        self.assertEqual(p._get_downstream_jobs(jobs[-1], jobs), [])
+
+
+class TestSlurmKeepGoing(FakeslurmTestCase):
+    outdir = None
+
+    def setUp(self):
+        FakeslurmTestCase.setUp(self)
+        self.outdir = tempfile.mkdtemp()
+
+    def submit(self, **kwargs):
+        p = BranchPipeline(self.outdir, first=Urandom)
+        p._prepare()
+        p._write_scripts()
+        runner = Slurmrunner(**kwargs)
+        runner.pipeline = p
+        runner.ordered_jobs = p._get_ordered_jobs_to_run()
+        runner._jobs_to_run = set(runner.ordered_jobs)
+        for job in runner.ordered_jobs:
+            runner.submit(job)
+        return runner
+
+    def fail_first_job(self, runner):
+        self.set_state(runner.ordered_jobs[0].jobid, "FAILED")
+        runner.poll()
+        runner._update_statuses()
+
+    def scancelled(self):
+        return [line.split()[1:] for line in self.calls("scancel")]
+
+    def test_dependents_of_failed_job_are_cancelled(self):
+        runner = self.submit()
+        self.fail_first_job(runner)
+        broken = [job for job in runner.ordered_jobs if job.get_name().startswith("broken")]
+        self.assertEqual([job.status for job in broken],
+                         [PypedreamStatus.FAILED, PypedreamStatus.CANCELLED, PypedreamStatus.CANCELLED])
+        self.assertEqual(self.scancelled(), [[broken[1].jobid, broken[2].jobid]])
+        self.assertTrue(runner.get_runnable_jobs())
+
+    def test_everything_is_cancelled_without_keep_going(self):
+        runner = self.submit(keep_going=False)
+        self.fail_first_job(runner)
+        self.assertEqual(sorted(self.scancelled()[0]), sorted(job.jobid for job in runner.ordered_jobs[1:]))
+        self.assertEqual(set(job.status for job in runner.ordered_jobs[1:]), {PypedreamStatus.CANCELLED})
@@ -0,0 +1,65 @@
+import tempfile
+import unittest
+
+from fakeslurm.helpers import ChainPipeline
+from pypedream.pypedreamstatus import PypedreamStatus
+from pypedream.runners.localqrunner import Localqrunner
+
+
+class FakeLocalqJob(object):
+    def __init__(self, jobid):
+        self.jobid = jobid
+        self.state = PypedreamStatus.PENDING
+        self.start_time = None
+        self.end_time = None
+
+    def status(self):
+        return self.state
+
+
+class FakeLocalqServer(object):
+    """
+    Stands in for the localq server, whose job statuses the tests set themselves
+    """
+    def __init__(self, jobids):
+        self.jobs = [FakeLocalqJob(jobid) for jobid in jobids]
+
+    def get_ordered_jobs(self):
+        return self.jobs
+
+    def _stop_all_jobs(self):
+        pass
+
+
+class TestLocalqJobStatus(unittest.TestCase):
+    """
+    How Localqrunner.update_job_status() takes over the statuses of the localq jobs
+    """
+    def setUp(self):
+        self.p = ChainPipeline(tempfile.mkdtemp())
+        self.p._prepare()
+        self.runner = Localqrunner()
+        self.runner.pipeline = self.p
+        self.runner.ordered_jobs = self.p._get_ordered_jobs()
+        self.runner._jobs_to_run = self.p._get_ordered_jobs_to_run()
+        for idx, job in enumerate(self.runner.ordered_jobs):
+            job.jobid = idx + 1
+        self.runner.server = FakeLocalqServer([job.jobid for job in self.runner.ordered_jobs])
+
+    def test_jobs_are_completed_once(self):
+        completed = []
+        job = self.runner.ordered_jobs[0]
+        job.complete = lambda: completed.append(job)
+        self.runner.server.jobs[0].state = PypedreamStatus.COMPLETED
+
+        self.runner.update_job_status()
+        self.runner.update_job_status()
+        self.assertEqual(job.status, PypedreamStatus.COMPLETED)
+        self.assertEqual(completed, [job])
+
+    def test_jobs_downstream_of_a_failure_are_cancelled(self):
+        self.runner.server.jobs[0].state = PypedreamStatus.FAILED
+        self.runner.update_job_status()
+        self.runner.update_job_status()
+        self.assertEqual([job.status for job in self.runner.ordered_jobs],
+                         [PypedreamStatus.FAILED, PypedreamStatus.CANCELLED, PypedreamStatus.CANCELLED])
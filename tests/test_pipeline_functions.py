@@ -0,0 +1,61 @@
+import tempfile
+import unittest
+
+from pypedream.pipeline.dummy_pipeline import TestPipeline
+
+
+class TestPipelineFunctions(unittest.TestCase):
+    p = None
+    outdir = None
+
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+        self.p = TestPipeline(self.outdir, "first", "second", "third")
+
+    def get_job(self, name):
+        return [j for j in self.p.graph.nodes() if j.get_name() == name][0]
+
+    def test_nodes_with_input_and_output(self):
+        cat = self.get_job("cat1-third")
+        rnd = self.get_job("urandom-second")
+
+        self.assertEqual(self.p._get_nodes_with_input(self.outdir + "/second"), [cat])
+        self.assertEqual(self.p._get_nodes_with_output(self.outdir + "/second"), [rnd])
+        self.assertEqual(self.p._get_nodes_with_input(self.outdir + "/third"), [])
+        self.assertEqual(self.p._get_nodes_with_output(self.outdir + "/not-a-file"), [])
+
+    def test_all_files(self):
+        expected = [self.outdir + "/" + f for f in ["first", "second", "third"]]
+        self.assertEqual(sorted(self.p._get_all_files()), sorted(expected))
+
+    def test_dependencies(self):
+        cat = self.get_job("cat1-third")
+        deps = self.p._get_dependencies(cat)
+        self.assertEqual(sorted([j.get_name() for j in deps]), ["urandom-first", "urandom-second"])
+        self.assertEqual(self.p._get_dependencies(self.get_job("urandom-first")), [])
+
+    def test_edges(self):
+        self.p._add_edges()
+        cat = self.get_job("cat1-third")
+        predecessors = self.p.graph.predecessors(cat)
+        self.assertEqual(sorted([j.get_name() for j in predecessors]), ["urandom-first", "urandom-second"])
+
+    def test_job_with_id(self):
+        cat = self.get_job("cat1-third")
+        self.assertIsNone(self.p._get_job_with_id("42"))
+        cat.jobid = "42"
+        self.assertEqual(self.p._get_job_with_id("42"), cat)
+
+    def test_ordered_jobs_are_cached_until_graph_changes(self):
+        self.p._add_edges()
+        ordered = self.p._get_ordered_jobs()
+        self.assertEqual(ordered[-1].get_name(), "cat1-third")
+        self.assertEqual([self.p._get_job_index(j) for j in ordered], range(len(ordered)))
+
+        cached = self.p._ordered_jobs
+        self.p._get_ordered_jobs()
+        self.assertIs(self.p._ordered_jobs, cached)
+
+        self.p.add(TestPipeline(self.outdir, "fourth", "fifth", "sixth").graph.nodes()[0])
+        self.assertIsNone(self.p._ordered_jobs)
+        self.assertEqual(len(self.p._get_ordered_jobs()), 4)
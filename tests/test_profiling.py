@@ -0,0 +1,93 @@
+import json
+import tempfile
+import unittest
+
+from fakeslurm.helpers import fakeslurm_env
+from pypedream.pipeline.dummy_pipeline import TestPipeline
+from pypedream.profiling import Profiler, profiler, timed
+from pypedream.runners.shellrunner import Shellrunner
+from pypedream.runners.slurmrunner import SlurmPoller
+
+
+class TestProfiler(unittest.TestCase):
+    def test_disabled_profiler_records_nothing(self):
+        p = Profiler()
+        with p.timer("a"):
+            pass
+        p.count("b")
+        self.assertEqual(p.summary(), {'timers': {}, 'counters': {}})
+
+    def test_timers_and_counters(self):
+        p = Profiler(enabled=True)
+        for _ in range(3):
+            with p.timer("a"):
+                pass
+        p.count("b")
+        p.count("b", 41)
+
+        d = p.summary()
+        self.assertEqual(d['timers']['a']['calls'], 3)
+        self.assertGreaterEqual(d['timers']['a']['total'], d['timers']['a']['max'])
+        self.assertEqual(d['counters'], {'b': 42})
+        self.assertEqual(len(p.format_summary()), 4)
+
+        p.reset()
+        self.assertEqual(p.summary(), {'timers': {}, 'counters': {}})
+
+
+class TestPipelineProfiling(unittest.TestCase):
+    def setUp(self):
+        profiler.reset()
+
+    def tearDown(self):
+        profiler.disable()
+        profiler.reset()
+
+    def test_timed_is_switchable_at_runtime(self):
+        @timed("f")
+        def f():
+            return 42
+
+        self.assertEqual(f(), 42)
+        self.assertEqual(profiler.summary()['timers'], {})
+        profiler.enable()
+        self.assertEqual(f(), 42)
+        self.assertEqual(profiler.summary()['timers']['f']['calls'], 1)
+
+    def test_pipeline_writes_profile(self):
+        outdir = tempfile.mkdtemp()
+        p = TestPipeline(outdir, "first", "second", "third", runner=Shellrunner(), jobdb=outdir + "/jobs.json",
+                         profile=True)
+        p.start()
+        p.join()
+        self.assertEqual(p.exitcode, 0)
+
+        with open(outdir + "/.pypedream/profile.json") as f:
+            d = json.load(f)
+        self.assertEqual(d['timers']['shellrunner.start_job']['calls'], 3)
+        for name in ["pipeline.add_edges", "pipeline.write_scripts", "pipeline.write_jobdb",
+                     "pipeline.runner"]:
+            self.assertIn(name, d['timers'])
+        self.assertGreater(d['counters']['jobdb.bytes_written'], 0)
+        self.assertGreater(d['counters']['jobs.walltime_seconds'], 0)
+
+    def test_profiler_is_only_on_during_run(self):
+        TestPipeline(tempfile.mkdtemp(), "first", "second", "third", runner=Shellrunner(), profile=True)
+        self.assertFalse(profiler.enabled)
+        TestPipeline(tempfile.mkdtemp(), "first", "second", "third", runner=Shellrunner())
+        self.assertEqual(profiler.summary()['timers'], {})
+
+        p = TestPipeline(tempfile.mkdtemp(), "first", "second", "third", runner=Shellrunner(), profile=True)
+        with self.assertRaises(SystemExit):
+            p.run()
+        self.assertFalse(profiler.enabled)
+        self.assertIn("pipeline.runner", profiler.summary()['timers'])
+
+    def test_slurm_subprocess_calls_are_counted(self):
+        with fakeslurm_env():
+            profiler.enable()
+            SlurmPoller().poll(["1", "2"])
+
+        d = profiler.summary()
+        self.assertEqual(d['timers']['slurm.poll']['calls'], 1)
+        self.assertEqual(d['counters']['slurm.subprocess_calls'], 2)
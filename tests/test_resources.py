@@ -0,0 +1,105 @@
+import json
+import os
+import tempfile
+import unittest
+
+from fakeslurm.helpers import fakeslurm_env
+from pypedream.pipeline.pypedreampipeline import PypedreamPipeline
+from pypedream.runners.scheduler import JobScheduler
+from pypedream.runners.shellrunner import Shellrunner
+from pypedream.runners.slurmrunner import Slurmrunner, resource_options
+from pypedream.tools.unix import Urandom
+
+
+class MemoryPipeline(PypedreamPipeline):
+    """
+    Independent jobs with the given memory requests, in MB
+    """
+    def __init__(self, outdir, memory, **kwargs):
+        PypedreamPipeline.__init__(self, outdir, **kwargs)
+        for i, mem in enumerate(memory):
+            job = Urandom()
+            job.output = "{}/out{}".format(outdir, i)
+            job.jobname = "job{}".format(i)
+            job.memory = mem
+            self.add(job)
+
+
+class TestResources(unittest.TestCase):
+    outdir = None
+
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+
+    def get_scheduler(self, requests, **kwargs):
+        p = MemoryPipeline(self.outdir, requests)
+        p._add_edges()
+        return JobScheduler(p, p._get_ordered_jobs(), **kwargs)
+
+    def test_memory_budget(self):
+        scheduler = self.get_scheduler([3000, 3000, 3000], threads=8, memory=7000)
+        self.assertEqual(scheduler.next_job().get_name(), "job0")
+        self.assertEqual(scheduler.next_job().get_name(), "job1")
+        self.assertIsNone(scheduler.next_job())
+
+        scheduler.job_finished([j for j in scheduler.running][0], True)
+        self.assertEqual(scheduler.next_job().get_name(), "job2")
+        self.assertEqual(scheduler.memory_used, 6000)
+
+    def test_smaller_job_is_started_when_first_in_line_does_not_fit(self):
+        scheduler = self.get_scheduler([6000, 6000, None, 1000], threads=8, memory=8000)
+        self.assertEqual(scheduler.next_job().get_name(), "job0")
+        self.assertEqual(scheduler.next_job().get_name(), "job2")
+        self.assertEqual(scheduler.next_job().get_name(), "job3")
+        self.assertIsNone(scheduler.next_job())
+
+    def test_first_in_line_is_skipped_at_most_max_skips_times(self):
+        scheduler = self.get_scheduler([4000, 6000, 1000, 1000, 1000], threads=8, memory=8000, max_skips=1)
+        self.assertEqual(scheduler.next_job().get_name(), "job0")
+        self.assertEqual(scheduler.next_job().get_name(), "job2")
+        self.assertIsNone(scheduler.next_job())
+
+        scheduler.job_finished([j for j in scheduler.running if j.get_name() == "job2"][0], True)
+        self.assertIsNone(scheduler.next_job())
+        scheduler.job_finished([j for j in scheduler.running if j.get_name() == "job0"][0], True)
+        self.assertEqual(scheduler.next_job().get_name(), "job1")
+        self.assertEqual(scheduler.next_job().get_name(), "job3")
+
+    def test_job_larger_than_budget_runs_alone(self):
+        scheduler = self.get_scheduler([16000, 1000], memory=8000)
+        self.assertEqual(scheduler.next_job().get_name(), "job0")
+        self.assertIsNone(scheduler.next_job())
+
+    def test_shellrunner_with_memory_budget(self):
+        p = MemoryPipeline(self.outdir, [3000, 3000, 3000], runner=Shellrunner(threads=4, memory=4000))
+        p.start()
+        p.join()
+        self.assertEqual(p.exitcode, 0)
+
+    def test_sbatch_options(self):
+        job = Urandom()
+        self.assertEqual(resource_options(job), ["-t", "24:00:00", "-n", "1"])
+        job.threads = 4
+        job.memory = 8000
+        job.walltime = "2:00:00"
+        job.disk = 50000
+        self.assertEqual(resource_options(job), ["-t", "2:00:00", "-n", "4", "--mem=8000M", "--tmp=50000M"])
+
+    def test_slurm_submit_requests_memory(self):
+        with fakeslurm_env(self.outdir):
+            p = MemoryPipeline(self.outdir, [2000, 2000, 4000])
+            p._add_edges()
+            p._write_scripts()
+            runner = Slurmrunner(job_arrays=True)
+            runner.pipeline = p
+            runner.ordered_jobs = p._get_ordered_jobs_to_run()
+            runner._jobs_to_run = set(runner.ordered_jobs)
+
+            groups = runner._get_array_groups()
+            self.assertEqual(len(set(id(g) for g in groups.values())), 2)
+            runner.submit(runner.ordered_jobs[2])
+
+        with open(os.path.join(self.outdir, "calls.log")) as f:
+            self.assertIn("--mem=4000M", f.read())
+        with open(os.path.join(self.outdir, "jobs.json")) as f:
+            self.assertEqual(len(json.load(f)), 1)
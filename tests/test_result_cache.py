@@ -0,0 +1,146 @@
+import os
+import tempfile
+import time
+import unittest
+
+from pypedream.cache import ResultCache
+from pypedream.pipeline.pypedreampipeline import PypedreamPipeline
+from pypedream.runners.shellrunner import Shellrunner
+from pypedream.tools.unix import Cat
+
+
+class CatPipeline(PypedreamPipeline):
+    def __init__(self, outdir, **kwargs):
+        PypedreamPipeline.__init__(self, outdir, **kwargs)
+
+        with open(outdir + "/input", 'w') as f:
+            f.write("some input\n")
+
+        cat1 = Cat()
+        cat1.input = [outdir + "/input"]
+        cat1.output = outdir + "/first"
+        cat1.is_intermediate = True
+        self.add(cat1)
+
+        cat2 = Cat()
+        cat2.input = [cat1.output, outdir + "/input"]
+        cat2.output = outdir + "/second"
+        self.add(cat2)
+
+
+class NonAsciiCat(Cat):
+    def command(self):
+        return Cat.command(self) + u" # caf\u00e9"
+
+
+class TestResultCache(unittest.TestCase):
+    cachedir = None
+
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp()
+
+    def run_pipeline(self):
+        outdir = tempfile.mkdtemp()
+        p = CatPipeline(outdir, runner=Shellrunner(), cache_dir=self.cachedir)
+        p.start()
+        p.join()
+        self.assertEqual(p.exitcode, 0)
+        return outdir
+
+    def test_outputs_are_reused_across_output_directories(self):
+        first_outdir = self.run_pipeline()
+        self.assertTrue(os.path.exists(first_outdir + "/second.out"))
+        second_outdir = self.run_pipeline()
+
+        with open(second_outdir + "/second") as f:
+            self.assertEqual(f.read(), "some input\nsome input\n")
+        self.assertTrue(os.path.exists(second_outdir + "/.second.done"))
+        self.assertFalse(os.path.exists(second_outdir + "/first"))
+        # nothing ran, so no logs were written
+        self.assertFalse(os.path.exists(second_outdir + "/second.out"))
+        self.assertTrue(os.path.exists(second_outdir + "/.pypedream/checksums.json"))
+
+    def test_no_checksums_without_cache(self):
+        outdir = tempfile.mkdtemp()
+        p = CatPipeline(outdir, runner=Shellrunner())
+        self.assertIsNone(p.checksums)
+        p.start()
+        p.join()
+        self.assertEqual(p.exitcode, 0)
+        self.assertFalse(os.path.exists(outdir + "/.pypedream/checksums.json"))
+
+    def test_key_depends_on_input_contents_not_paths(self):
+        cache = ResultCache(self.cachedir)
+        dirs = [tempfile.mkdtemp() for _ in range(3)]
+        contents = ["a", "a", "b"]
+        keys = []
+        for d, content in zip(dirs, contents):
+            with open(d + "/in", 'w') as f:
+                f.write(content)
+            cat = Cat()
+            cat.input = [d + "/in"]
+            cat.output = d + "/out"
+            keys.append(cache.key(cat))
+
+        self.assertEqual(keys[0], keys[1])
+        self.assertNotEqual(keys[0], keys[2])
+
+    def test_key_of_non_ascii_command(self):
+        d = tempfile.mkdtemp()
+        with open(d + "/in", 'w') as f:
+            f.write("a")
+        cat = NonAsciiCat()
+        cat.input = [d + "/in"]
+        cat.output = d + "/out"
+        self.assertEqual(len(ResultCache(self.cachedir).key(cat)), 64)
+
+    def test_directory_inputs_and_outputs_are_not_cached(self):
+        d = tempfile.mkdtemp()
+        os.mkdir(d + "/indir")
+        cat = Cat()
+        cat.input = [d + "/indir"]
+        cat.output = d + "/out"
+        cache = ResultCache(self.cachedir)
+        self.assertIsNone(cache.key(cat))
+
+        with open(d + "/in", 'w') as f:
+            f.write("a")
+        cat.input = [d + "/in"]
+        cat.output = d + "/outdir"
+        os.mkdir(cat.output)
+        cache.store(cat, cache.key(cat))
+        self.assertEqual(os.listdir(self.cachedir), [])
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = ResultCache(self.cachedir, max_size=2)
+        jobs = []
+        for i in range(3):
+            d = tempfile.mkdtemp()
+            with open(d + "/in", 'w') as f:
+                f.write(str(i))
+            cat = Cat()
+            cat.input = [d + "/in"]
+            cat.output = d + "/out"
+            with open(cat.output, 'w') as f:
+                f.write(str(i))
+            jobs.append(cat)
+
+        keys = [cache.key(job) for job in jobs]
+        cache.store(jobs[0], keys[0])
+        cache.store(jobs[1], keys[1])
+        time.sleep(1.1)
+        self.assertTrue(cache.restore(jobs[0], keys[0]))  # 0 is now more recently used than 1
+        cache.store(jobs[2], keys[2])
+
+        self.assertTrue(os.path.exists(os.path.join(self.cachedir, keys[0])))
+        self.assertFalse(os.path.exists(os.path.join(self.cachedir, keys[1])))
+        self.assertTrue(os.path.exists(os.path.join(self.cachedir, keys[2])))
+
+    def test_entries_do_not_share_files_with_outputs(self):
+        outdir = self.run_pipeline()
+        with open(outdir + "/second", 'a') as f:
+            f.write("appended\n")
+
+        second_outdir = self.run_pipeline()
+        with open(second_outdir + "/second") as f:
+            self.assertEqual(f.read(), "some input\nsome input\n")
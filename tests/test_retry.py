@@ -0,0 +1,134 @@
+import os
+import tempfile
+import unittest
+
+from fakeslurm.helpers import ChainPipeline, FakeslurmTestCase
+from pypedream.pypedreamstatus import PypedreamStatus
+from pypedream.retry import RetryPolicy
+from pypedream.runners.slurmrunner import Slurmrunner
+from pypedream.tools.unix import Urandom
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_transient_failures_are_retried(self):
+        policy = RetryPolicy(max_attempts=2)
+        job = Urandom()
+        self.assertTrue(policy.retries(job, "NODE_FAIL", 1))
+        self.assertTrue(policy.retries(job, "PREEMPTED", 1))
+        self.assertFalse(policy.retries(job, "NODE_FAIL", 2))
+        self.assertFalse(policy.retries(job, "FAILED", 1))
+        self.assertFalse(policy.retries(job, "TIMEOUT", 1))
+
+    def test_escalation(self):
+        policy = RetryPolicy(walltime_factor=2, memory_factor=1.5)
+        job = Urandom()
+        self.assertTrue(policy.retries(job, "TIMEOUT", 1))
+        self.assertFalse(policy.retries(job, "OUT_OF_MEMORY", 1))
+
+        policy.escalate(job, "TIMEOUT", "24:00:00")
+        self.assertEqual(job.walltime, "48:00:00")
+        job.memory = 4000
+        policy.escalate(job, "OUT_OF_MEMORY", "24:00:00")
+        self.assertEqual(job.memory, 6000)
+        self.assertEqual(job.walltime, "48:00:00")
+
+    def test_backoff(self):
+        policy = RetryPolicy(backoff=30, backoff_factor=2)
+        self.assertEqual([policy.delay(attempt) for attempt in [1, 2, 3]], [30, 60, 120])
+
+
+class TestSlurmRetry(FakeslurmTestCase):
+    outdir = None
+
+    def setUp(self):
+        FakeslurmTestCase.setUp(self)
+        self.outdir = tempfile.mkdtemp()
+
+    def submit(self, **kwargs):
+        p = ChainPipeline(self.outdir, **kwargs)
+        p._prepare()
+        p._fuse()
+        p._write_scripts()
+        runner = Slurmrunner()
+        runner.pipeline = p
+        runner.ordered_jobs = p._get_ordered_jobs_to_run()
+        runner._jobs_to_run = set(runner.ordered_jobs)
+        for job in runner.ordered_jobs:
+            runner.submit(job)
+        return p, runner
+
+    def update(self, runner):
+        runner.poll()
+        runner._update_statuses()
+
+    def test_node_failure_is_retried(self):
+        p, runner = self.submit(retry_policy=RetryPolicy(backoff=30))
+        first = runner.ordered_jobs[0]
+        self.set_state("1", "NODE_FAIL")
+        self.update(runner)
+
+        self.assertEqual(first.jobid, "4")
+        self.assertEqual(first.status, PypedreamStatus.PENDING)
+        self.assertEqual([a['jobid'] for a in first.attempts], ["1"])
+        self.assertEqual(first.attempts[0]['state'], "NODE_FAIL")
+        self.assertIn("--begin=now+30", self.calls("sbatch")[-1])
+        self.assertFalse(os.path.exists(first.failfiles()[0]))
+
+        # the job that waited for the failed one now waits for the new one, the one after it is unchanged
+        self.assertEqual(self.calls("scontrol"), ["scontrol update JobId=2 Dependency=afterok:4"])
+        self.assertEqual(p._get_jobdb_dict()['jobs'][0]['attempts'][0]['jobid'], "1")
+
+        # the next attempt is held twice as long
+        self.set_state("4", "PREEMPTED")
+        self.update(runner)
+        self.assertEqual(first.jobid, "5")
+        self.assertIn("--begin=now+60", self.calls("sbatch")[-1])
+
+        # the third attempt was the last
+        self.set_state("5", "NODE_FAIL")
+        self.update(runner)
+        self.assertEqual(first.status, PypedreamStatus.FAILED)
+        self.assertEqual(len(first.attempts), 2)
+
+    def test_cancelled_dependents_are_submitted_again(self):
+        p, runner = self.submit(retry_policy=RetryPolicy())
+        self.set_state("1", "NODE_FAIL")
+        self.set_state("2", "CANCELLED")
+        self.update(runner)
+        self.assertEqual([job.jobid for job in runner.ordered_jobs], ["4", "5", "3"])
+        self.assertIn("afterok:4", self.calls("sbatch")[-1])
+        self.assertEqual(self.calls("scontrol"), ["scontrol update JobId=3 Dependency=afterok:5"])
+
+    def test_timeout_is_retried_with_more_time(self):
+        p, runner = self.submit(retry_policy=RetryPolicy(walltime_factor=2))
+        self.set_state("1", "TIMEOUT")
+        self.update(runner)
+        self.assertIn("-t 48:00:00", self.calls("sbatch")[-1])
+
+    def test_no_retries_by_default(self):
+        p, runner = self.submit()
+        self.set_state("1", "NODE_FAIL")
+        self.update(runner)
+        self.assertEqual(runner.ordered_jobs[0].status, PypedreamStatus.FAILED)
+        self.assertEqual(len(self.calls("sbatch")), 3)
+
+    def test_job_errors_are_not_retried(self):
+        p, runner = self.submit(retry_policy=RetryPolicy())
+        self.set_state("1", "FAILED")
+        self.update(runner)
+        self.assertEqual(runner.ordered_jobs[0].status, PypedreamStatus.FAILED)
+        self.assertTrue(os.path.exists(runner.ordered_jobs[0].failfiles()[0]))
+
+    def test_fused_job_attempts_are_recorded_on_the_members(self):
+        p, runner = self.submit(fuse=True, retry_policy=RetryPolicy(walltime_factor=2))
+        fused = runner.ordered_jobs[0]
+        self.assertEqual(len(fused.members), 3)
+        fused.members[1].status = PypedreamStatus.FAILED
+        self.set_state("1", "TIMEOUT")
+        self.update(runner)
+
+        jobs = p._get_jobdb_dict()['jobs']
+        self.assertEqual([[a['jobid'] for a in j['attempts']] for j in jobs], [["1"]] * 3)
+        self.assertEqual([j['walltime'] for j in jobs], ["48:00:00"] * 3)
+        self.assertEqual([j['status'] for j in jobs], [PypedreamStatus.PENDING] * 3)
+        self.assertEqual(fused.walltime, "48:00:00")
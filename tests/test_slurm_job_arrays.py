@@ -0,0 +1,69 @@
+import tempfile
+
+from fakeslurm.helpers import FakeslurmTestCase
+from pypedream.pipeline.pypedreampipeline import PypedreamPipeline
+from pypedream.runners.slurmrunner import Slurmrunner
+from pypedream.tools.unix import Cat, Urandom
+
+
+class FanOutPipeline(PypedreamPipeline):
+    def __init__(self, outdir, n, **kwargs):
+        PypedreamPipeline.__init__(self, outdir, **kwargs)
+
+        cat = Cat()
+        cat.input = []
+        cat.output = outdir + "/all"
+        for i in range(n):
+            rnd = Urandom()
+            rnd.jobname = "urandom-{}".format(i)
+            rnd.output = outdir + "/random-{}".format(i)
+            self.add(rnd)
+            cat.input = cat.input + [rnd.output]
+        self.add(cat)
+
+
+class TestSlurmJobArrays(FakeslurmTestCase):
+    p = None
+    runner = None
+    outdir = None
+
+    def setUp(self):
+        FakeslurmTestCase.setUp(self)
+        self.outdir = tempfile.mkdtemp()
+
+        self.runner = Slurmrunner(interval=1, job_arrays=True)
+        self.p = FanOutPipeline(self.outdir, 3, runner=self.runner)
+        self.p._add_edges()
+        self.p._write_scripts()
+        self.runner.pipeline = self.p
+        self.runner.ordered_jobs = self.p._get_ordered_jobs_to_run()
+        self.runner._jobs_to_run = set(self.runner.ordered_jobs)
+
+    def test_siblings_are_grouped(self):
+        groups = self.runner._get_array_groups()
+        urandoms = [j for j in self.runner.ordered_jobs if j.get_name().startswith("urandom")]
+        cat = [j for j in self.runner.ordered_jobs if j.get_name() == "cat"][0]
+
+        self.assertEqual(len(groups[urandoms[0]]), 3)
+        self.assertEqual(set(groups[urandoms[0]]), set(urandoms))
+        self.assertEqual(groups[cat], [cat])
+
+    def test_array_tasks_map_to_jobs(self):
+        groups = self.runner._get_array_groups()
+        urandoms = [j for j in self.runner.ordered_jobs if j.get_name().startswith("urandom")]
+        cat = [j for j in self.runner.ordered_jobs if j.get_name() == "cat"][0]
+
+        self.runner.submit_array(groups[urandoms[0]])
+        self.runner.submit(cat)
+
+        self.assertEqual([j.jobid for j in groups[urandoms[0]]], ["1_0", "1_1", "1_2"])
+        self.assertEqual(cat.jobid, "2")
+
+        jobs = self.load_jobs()
+        self.assertEqual(sorted(jobs.keys()), ["1_0", "1_1", "1_2", "2"])
+        self.assertEqual(sorted(jobs["2"]["dependency"].split(":")), ["1_0", "1_1", "1_2", "afterok"])
+
+        with open(jobs["1_1"]["script"]) as f:
+            script = f.read()
+        self.assertIn("1) exec bash {} > {} 2>&1 ;;".format(groups[urandoms[0]][1].script,
+                                                            groups[urandoms[0]][1].log), script)
@@ -0,0 +1,39 @@
+from fakeslurm.helpers import FakeslurmTestCase
+from pypedream.runners.slurmrunner import SlurmPoller
+
+
+class TestSlurmPoller(FakeslurmTestCase):
+    def setUp(self):
+        FakeslurmTestCase.setUp(self)
+
+        jobs = {"1": {"state": "COMPLETED", "start": "2016-04-11T07:49:56", "end": "2016-04-11T07:50:01",
+                      "in_queue": False},
+                "2": {"state": "RUNNING", "start": "2016-04-11T07:50:02", "end": "2016-04-12T07:50:02"},
+                "3": {"state": "PENDING", "start": "2016-04-11T08:00:00", "end": "2016-04-12T08:00:00"}}
+        self.save_jobs(jobs)
+
+    def get_calls(self):
+        return [line.split()[0] for line in self.calls("")]
+
+    def test_one_squeue_and_one_sacct_call_per_poll(self):
+        poller = SlurmPoller()
+        poller.poll(["1", "2", "3", "4"])
+        self.assertEqual(self.get_calls(), ["squeue", "sacct"])
+
+    def test_states_and_times(self):
+        poller = SlurmPoller()
+        poller.poll(["1", "2", "3"])
+
+        self.assertEqual(poller.get("1"), {'status': "COMPLETED", 'starttime': "2016-04-11T07:49:56",
+                                           'endtime': "2016-04-11T07:50:01"})
+        # end time of a running job is its time limit, and start time of a pending job is an estimate
+        self.assertEqual(poller.get("2"), {'status': "RUNNING", 'starttime': "2016-04-11T07:50:02",
+                                           'endtime': None})
+        self.assertEqual(poller.get("3"), {'status': "PENDING", 'starttime': None, 'endtime': None})
+        self.assertEqual(poller.get("4"), {'status': None, 'starttime': None, 'endtime': None})
+
+    def test_no_sacct_call_when_all_jobs_are_queued(self):
+        poller = SlurmPoller()
+        poller.poll(["2", "3"])
+        poller.poll([])
+        self.assertEqual(self.get_calls(), ["squeue"])
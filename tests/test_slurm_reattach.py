@@ -0,0 +1,99 @@
+import json
+import os
+import tempfile
+import time
+
+from fakeslurm.helpers import ChainPipeline, FakeslurmTestCase
+from pypedream.pypedreamstatus import PypedreamStatus
+from pypedream.runners.slurmrunner import Slurmrunner
+
+
+class TestSlurmReattach(FakeslurmTestCase):
+    """
+    A previous run submitted the jobs as 1, 2 and 3 and died. The jobdb and fake slurm are set up to match.
+    """
+    outdir = None
+
+    def setUp(self):
+        FakeslurmTestCase.setUp(self)
+        self.outdir = tempfile.mkdtemp()
+        self.jobdb = self.outdir + "/jobs.json"
+
+    def write_previous_run(self, slurm_states, statuses=None):
+        p = ChainPipeline(self.outdir)
+        jobs = []
+        for i, job in enumerate(p._get_ordered_jobs()):
+            jobs.append({'jobname': job.get_name(), 'jobid': str(i + 1), 'outputs': job.get_output_dict(),
+                         'status': statuses[i] if statuses else PypedreamStatus.RUNNING,
+                         'starttime': None, 'endtime': None})
+        with open(self.jobdb, 'w') as f:
+            json.dump({'jobs': jobs}, f)
+
+        fakeslurm_jobs = {}
+        for i, state in enumerate(slurm_states):
+            if state is not None:
+                fakeslurm_jobs[str(i + 1)] = {'state': state, 'in_queue': state in ["PENDING", "RUNNING"],
+                                              'dependency': "afterok:{}".format(i) if i else ""}
+        self.save_jobs(fakeslurm_jobs)
+        with open(self.slurmdir + "/next_jobid", 'w') as f:
+            f.write("10")
+
+    def reattach(self):
+        p = ChainPipeline(self.outdir, jobdb=self.jobdb)
+        p._load_previous_run()
+        p._prepare()
+        runner = Slurmrunner()
+        runner.pipeline = p
+        runner.ordered_jobs = p._get_ordered_jobs_to_run()
+        runner._jobs_to_run = set(runner.ordered_jobs)
+        return sorted(job.get_name() for job in runner._reattach())
+
+    def test_running_and_pending_jobs_are_adopted(self):
+        self.write_previous_run(["RUNNING", "PENDING", "PENDING"])
+        self.assertEqual(self.reattach(), ["chain0", "chain1", "chain2"])
+        self.assertEqual(len(self.calls("squeue")), 1)
+
+    def test_gone_and_failed_jobs_are_submitted_again(self):
+        self.write_previous_run(["RUNNING", "FAILED", "PENDING"])
+        self.assertEqual(self.reattach(), ["chain0"])
+        # chain2 waits for the failed job, it would never start
+        self.assertEqual(self.calls("scancel"), ["scancel 3"])
+
+        self.write_previous_run([None, "PENDING", "PENDING"])
+        self.assertEqual(self.reattach(), [])
+
+    def test_completed_jobs_are_adopted_if_their_outputs_exist(self):
+        self.write_previous_run(["COMPLETED", "RUNNING", "PENDING"])
+        self.assertEqual(self.reattach(), ["chain1", "chain2"])
+
+        with open(self.outdir + "/chain0", 'w') as f:
+            f.write("data\n")
+        self.assertEqual(self.reattach(), ["chain0", "chain1", "chain2"])
+
+    def test_finished_jobs_in_the_jobdb_are_not_adopted(self):
+        # done files deleted by hand after a completed run must make the job run again
+        self.write_previous_run(["RUNNING", "RUNNING", "RUNNING"], statuses=[PypedreamStatus.COMPLETED] * 3)
+        self.assertEqual(self.reattach(), [])
+
+    def test_restarted_pipeline_only_submits_what_is_gone(self):
+        self.write_previous_run(["RUNNING", "PENDING", None])
+        fakeslurm_jobs = self.load_jobs()
+        # the adopted jobs complete a second after the restart
+        for jobid, job in fakeslurm_jobs.items():
+            job['submitted'] = time.time()
+            job['started'] = time.time() + 1
+        self.save_jobs(fakeslurm_jobs)
+        os.environ["FAKESLURM_RUNTIME"] = "0.2"
+
+        p = ChainPipeline(self.outdir, runner=Slurmrunner(interval=0.1), jobdb=self.jobdb)
+        p.start()
+        p.join()
+        self.assertEqual(p.exitcode, 0)
+
+        sbatch = [line for line in self.calls("sbatch") if "--version" not in line]
+        self.assertEqual(len(sbatch), 1)
+        self.assertIn("afterok:2", sbatch[0])
+        with open(self.jobdb) as f:
+            jobs = json.load(f)['jobs']
+        self.assertEqual([j['jobid'] for j in jobs], ["1", "2", "10"])
+        self.assertEqual([j['status'] for j in jobs], [PypedreamStatus.COMPLETED] * 3)
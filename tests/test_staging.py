@@ -0,0 +1,145 @@
+import os
+import tempfile
+import unittest
+
+from pypedream.pipeline.pypedreampipeline import PypedreamPipeline
+from pypedream.runners.shellrunner import Shellrunner
+from pypedream.job import repeat, required
+from pypedream.tools.unix import Cat, Urandom
+
+
+class AppendCat(Cat):
+    def command(self):
+        return "cat" + repeat("", self.input) + ">>" + required("", self.output)
+
+
+class CopyPipeline(PypedreamPipeline):
+    """
+    Cats of an existing input file, and a chain urandom -> cat
+    """
+    def __init__(self, outdir, infile, names, tool=Cat, **kwargs):
+        PypedreamPipeline.__init__(self, outdir, **kwargs)
+        for name in names:
+            cat = tool()
+            cat.input = [infile]
+            cat.output = "{}/{}".format(outdir, name)
+            cat.jobname = name
+            self.add(cat)
+
+        self.urandom = Urandom()
+        self.urandom.output = outdir + "/random"
+        self.add(self.urandom)
+        cat = Cat()
+        cat.input = [self.urandom.output]
+        cat.output = outdir + "/random-copy"
+        self.add(cat)
+
+
+class TestStaging(unittest.TestCase):
+    outdir = None
+
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+        self.scratch = tempfile.mkdtemp()
+        self.infile = tempfile.mkdtemp() + "/input.txt"
+        with open(self.infile, 'w') as f:
+            f.write("some data\n")
+
+    def test_staged_command(self):
+        job = Cat()
+        job.input = [self.infile]
+        job.output = self.outdir + "/out"
+        job.scratch = self.scratch
+        staged_input = self.scratch + "/pypedream-staging" + self.infile
+        self.assertEqual(job.staged_path(self.infile), staged_input)
+        self.assertIn(staged_input, job.staged_command())
+        self.assertNotIn(" " + self.infile, job.staged_command())
+
+        # the inputs and outputs of the job itself are unchanged
+        self.assertEqual(job.input, [self.infile])
+        self.assertEqual(job.get_outputs(), [self.outdir + "/out"])
+
+    def test_run_staged(self):
+        p = CopyPipeline(self.outdir, self.infile, ["copy1"], scratch=self.scratch, stage=True, runner=Shellrunner())
+        p.start()
+        p.join()
+        self.assertEqual(p.exitcode, 0)
+
+        with open(self.outdir + "/copy1") as f:
+            self.assertEqual(f.read(), "some data\n")
+        self.assertTrue(os.path.exists(self.outdir + "/.copy1.done"))
+        self.assertTrue(os.path.exists(self.scratch + "/pypedream-staging" + self.infile))
+        self.assertFalse(os.path.exists(self.scratch + "/pypedream-staging" + self.outdir + "/copy1"))
+        with open(self.outdir + "/random") as f1, open(self.outdir + "/random-copy") as f2:
+            self.assertEqual(f1.read(), f2.read())
+        self.assertEqual(os.listdir(self.outdir).count("copy1.staging"), 0)
+
+    def test_inputs_are_staged_once(self):
+        p = CopyPipeline(self.outdir, self.infile, ["copy1"], scratch=self.scratch, stage=True, runner=Shellrunner())
+        p.start()
+        p.join()
+        staged_input = self.scratch + "/pypedream-staging" + self.infile
+        inode = os.stat(staged_input).st_ino
+
+        p = CopyPipeline(self.outdir, self.infile, ["copy2"], scratch=self.scratch, stage=True, runner=Shellrunner())
+        p.start()
+        p.join()
+        self.assertEqual(p.exitcode, 0)
+        self.assertEqual(os.stat(staged_input).st_ino, inode)
+
+        # a changed input is staged again
+        with open(self.infile, 'w') as f:
+            f.write("other data\n")
+        p = CopyPipeline(self.outdir, self.infile, ["copy3"], scratch=self.scratch, stage=True, runner=Shellrunner())
+        p.start()
+        p.join()
+        with open(self.outdir + "/copy3") as f:
+            self.assertEqual(f.read(), "other data\n")
+
+    def test_old_staged_outputs_are_not_reused(self):
+        # a copy left behind by an earlier run, for example one that died before staging out
+        staged_output = self.scratch + "/pypedream-staging" + self.outdir + "/copy1"
+        os.makedirs(os.path.dirname(staged_output))
+        with open(staged_output, 'w') as f:
+            f.write("left behind\n")
+
+        p = CopyPipeline(self.outdir, self.infile, ["copy1"], tool=AppendCat, scratch=self.scratch, stage=True,
+                         runner=Shellrunner())
+        p.start()
+        p.join()
+        self.assertEqual(p.exitcode, 0)
+        with open(self.outdir + "/copy1") as f:
+            self.assertEqual(f.read(), "some data\n")
+        self.assertFalse(os.path.exists(staged_output))
+
+    def test_unused_staged_copies_are_evicted(self):
+        stray = self.scratch + "/pypedream-staging/old/input.txt"
+        os.makedirs(os.path.dirname(stray))
+        open(stray, 'w').close()
+
+        p = CopyPipeline(self.outdir, self.infile, ["copy1"], scratch=self.scratch, stage=True, runner=Shellrunner())
+        for job in p._get_ordered_jobs():
+            job.stage_keep = 0
+        p.start()
+        p.join()
+        self.assertEqual(p.exitcode, 0)
+        self.assertFalse(os.path.exists(stray))
+        with open(self.outdir + "/copy1") as f:
+            self.assertEqual(f.read(), "some data\n")
+
+    def test_staging_is_off_by_default(self):
+        p = CopyPipeline(self.outdir, self.infile, ["copy1"], scratch=self.scratch)
+        p._prepare()
+        p._write_scripts()
+        for job in p._get_ordered_jobs():
+            self.assertFalse(job.stage)
+            self.assertEqual(job.scratch, self.scratch)
+            with open(job.script) as f:
+                self.assertNotIn("pypedream-staging", f.read())
+
+    def test_job_can_opt_out(self):
+        p = CopyPipeline(self.outdir, self.infile, ["copy1"], scratch=self.scratch, stage=True)
+        p.urandom.stage = False
+        p._prepare()
+        self.assertEqual([job.stage for job in p._get_ordered_jobs() if job is not p.urandom], [True, True])
+        self.assertFalse(p.urandom.stage)
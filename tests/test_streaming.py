@@ -0,0 +1,150 @@
+import os
+import tempfile
+import unittest
+
+from pypedream.fusion import StreamJob
+from pypedream.pipeline.pypedreampipeline import PypedreamPipeline
+from pypedream.runners.shellrunner import Shellrunner
+from pypedream.tools.unix import Cat, Urandom
+
+
+class UrandomThenFail(Urandom):
+    def command(self):
+        return Urandom.command(self) + " && false"
+
+
+class CatThenFail(Cat):
+    def command(self):
+        return Cat.command(self) + " && false"
+
+
+class FailWithoutReading(Cat):
+    def command(self):
+        return "false"
+
+
+class SlowUrandom(Urandom):
+    def command(self):
+        return "sleep 1 && " + Urandom.command(self)
+
+
+class StreamPipeline(PypedreamPipeline):
+    """
+    urandom -> cat -> cat, where the output of urandom is streamed to the first cat
+    """
+    def __init__(self, outdir, producer=Urandom, consumer=Cat, **kwargs):
+        PypedreamPipeline.__init__(self, outdir, **kwargs)
+        self.producer = producer()
+        self.producer.output = outdir + "/random"
+        self.producer.jobname = "producer"
+        self.add(self.producer)
+
+        self.consumer = consumer()
+        self.consumer.input = [self.producer.output]
+        self.consumer.output = outdir + "/copy"
+        self.consumer.jobname = "consumer"
+        self.add(self.consumer)
+
+        self.last = Cat()
+        self.last.input = [self.consumer.output]
+        self.last.output = outdir + "/copy2"
+        self.last.jobname = "last"
+        self.add(self.last)
+
+        self.stream(self.producer.output)
+
+
+class TestStreaming(unittest.TestCase):
+    outdir = None
+
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+
+    def exists(self, fname):
+        return os.path.exists(os.path.join(self.outdir, fname))
+
+    def test_streamed_jobs_are_scheduled_together(self):
+        p = StreamPipeline(self.outdir, fuse=True)
+        p._prepare()
+        p._fuse()
+        jobs = p._get_ordered_jobs_to_run()
+        self.assertEqual(len(jobs), 2)
+        self.assertIsInstance(jobs[0], StreamJob)
+        self.assertEqual(jobs[0].members, [p.producer, p.consumer])
+        self.assertEqual(jobs[0].threads, 2)
+        self.assertEqual(p._get_dependencies(jobs[1]), [jobs[0]])
+
+    def test_only_single_consumer_files_can_be_streamed(self):
+        p = StreamPipeline(self.outdir)
+        cat = Cat()
+        cat.input = [p.producer.output]
+        cat.output = self.outdir + "/other"
+        p.add(cat)
+        self.assertRaises(ValueError, p.stream, p.producer.output)
+
+    def test_run_streamed(self):
+        p = StreamPipeline(self.outdir, runner=Shellrunner(threads=2))
+        p.start()
+        p.join()
+        self.assertEqual(p.exitcode, 0)
+
+        self.assertFalse(self.exists("random"))
+        self.assertGreater(os.path.getsize(self.outdir + "/copy2"), 0)
+        for name in ["random", "copy", "copy2"]:
+            self.assertTrue(self.exists(".{}.done".format(name)))
+        self.assertTrue(os.path.exists(p.producer.log))
+
+        # the streamed file is not a reason to run again
+        p = StreamPipeline(self.outdir, incremental=True)
+        self.assertEqual(p.plan(), [])
+
+    def test_plan_then_run(self):
+        scratch = tempfile.mkdtemp()
+        p = StreamPipeline(self.outdir, scratch=scratch, stage=True, runner=Shellrunner(threads=2))
+        p.plan()
+        self.assertEqual([job.stage for job in p.graph.nodes()], [None] * 3)
+        self.assertEqual(p._units, {})
+
+        p.start()
+        p.join()
+        self.assertEqual(p.exitcode, 0)
+        self.assertTrue(self.exists(".copy2.done"))
+        # the streamed jobs ran unstaged, the last one staged as usual
+        self.assertTrue(os.path.exists(scratch + "/pypedream-staging" + p.consumer.output))
+        self.assertFalse(os.path.exists(scratch + "/pypedream-staging" + p.producer.output))
+
+    def test_failed_producer(self):
+        p = StreamPipeline(self.outdir, producer=UrandomThenFail, runner=Shellrunner(threads=2))
+        p.start()
+        p.join()
+        self.assertNotEqual(p.exitcode, 0)
+
+        self.assertTrue(self.exists(".random.fail"))
+        self.assertFalse(self.exists(".random.done"))
+        self.assertFalse(self.exists(".copy.done"))
+        self.assertFalse(self.exists(".copy2.done"))
+        self.assertFalse(self.exists("random"))
+
+    def test_failed_consumer(self):
+        p = StreamPipeline(self.outdir, consumer=CatThenFail, runner=Shellrunner(threads=2))
+        p.start()
+        p.join()
+        self.assertNotEqual(p.exitcode, 0)
+
+        self.assertTrue(self.exists(".copy.fail"))
+        self.assertFalse(self.exists(".random.done"))
+        self.assertFalse(self.exists(".copy.done"))
+
+        # both are run again
+        p = StreamPipeline(self.outdir)
+        self.assertEqual([job.get_name() for job in p.plan()], ["producer+consumer", "last"])
+
+    def test_consumer_that_fails_before_reading(self):
+        # the producer opens the pipe after the consumer has exited, and must not wait for a reader forever
+        p = StreamPipeline(self.outdir, producer=SlowUrandom, consumer=FailWithoutReading,
+                           runner=Shellrunner(threads=2))
+        p.start()
+        p.join()
+        self.assertNotEqual(p.exitcode, 0)
+        self.assertTrue(self.exists(".copy.fail"))
+        self.assertFalse(self.exists(".random.done"))
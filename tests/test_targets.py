@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+
+from pypedream.pipeline.pypedreampipeline import PypedreamPipeline
+from pypedream.runners.shellrunner import Shellrunner
+from pypedream.tools.unix import Cat, Urandom
+
+
+class TwoBranchPipeline(PypedreamPipeline):
+    """
+    urandom -> a (intermediate) -> cat -> a_report
+    urandom -> b -> cat -> b_report
+    """
+    def __init__(self, outdir, **kwargs):
+        PypedreamPipeline.__init__(self, outdir, **kwargs)
+
+        for branch in ["a", "b"]:
+            rnd = Urandom()
+            rnd.output = "{}/{}".format(outdir, branch)
+            rnd.jobname = "urandom-" + branch
+            rnd.is_intermediate = branch == "a"
+            self.add(rnd)
+
+            cat = Cat()
+            cat.input = [rnd.output]
+            cat.output = "{}/{}_report".format(outdir, branch)
+            cat.jobname = "cat-" + branch
+            self.add(cat)
+
+
+class TestTargets(unittest.TestCase):
+    outdir = None
+
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+
+    def plan(self, targets):
+        p = TwoBranchPipeline(self.outdir, targets=targets)
+        return sorted(j.get_name() for j in p.plan())
+
+    def run_pipeline(self, targets):
+        p = TwoBranchPipeline(self.outdir, runner=Shellrunner(), targets=targets)
+        p.start()
+        p.join()
+        self.assertEqual(p.exitcode, 0)
+
+    def test_plan_includes_ancestors_of_targets_only(self):
+        self.assertEqual(self.plan([self.outdir + "/b_report"]), ["cat-b", "urandom-b"])
+        self.assertEqual(self.plan([self.outdir + "/b"]), ["urandom-b"])
+        self.assertEqual(self.plan(None), ["cat-a", "cat-b", "urandom-a", "urandom-b"])
+        self.assertFalse(os.path.exists(self.outdir + "/.pypedream/scripts"))
+
+    def test_only_needed_jobs_run(self):
+        self.run_pipeline([self.outdir + "/b_report"])
+        self.assertTrue(os.path.exists(self.outdir + "/b_report"))
+        self.assertFalse(os.path.exists(self.outdir + "/a"))
+        self.assertFalse(os.path.exists(self.outdir + "/a_report"))
+        self.assertEqual(self.plan([self.outdir + "/b_report"]), [])
+
+    def test_intermediate_target_is_kept_until_its_consumers_run(self):
+        self.run_pipeline([self.outdir + "/a"])
+        self.assertTrue(os.path.exists(self.outdir + "/a"))
+        self.assertEqual(self.plan(None), ["cat-a", "cat-b", "urandom-b"])
+
+    def test_deleted_intermediate_is_made_again(self):
+        self.run_pipeline(None)
+        self.assertFalse(os.path.exists(self.outdir + "/a"))
+        self.assertEqual(self.plan([self.outdir + "/a_report"]), [])
+
+        os.remove(self.outdir + "/a_report")
+        os.remove(self.outdir + "/.a_report.done")
+        self.assertEqual(self.plan([self.outdir + "/a_report"]), ["cat-a", "urandom-a"])
+
+    def test_unknown_target(self):
+        with self.assertRaises(ValueError):
+            self.plan([self.outdir + "/not-an-output"])